@@ -0,0 +1,166 @@
+"""
+API HTTP local de análisis: carga libros con DataRepository, los mantiene en memoria y sirve los
+mismos análisis que el tablero en JSON o Arrow, con resultados cacheados por dataset y parámetros.
+
+Endpoints:
+  GET  /health                                   estado y estadísticas de caches
+  GET  /analyses                                 análisis disponibles y sus parámetros
+  GET  /datasets                                 datasets cargados
+  POST /datasets?nombre=archivo.xlsx             cuerpo: el libro; o JSON {"storage_key": ...} para traerlo de Supabase
+  GET  /datasets/<huella>                        filas, columnas y meses
+  GET  /datasets/<huella>/<análisis>?n=10&format=arrow
+  POST /datasets/<huella>/batch                  cuerpo: {"queries": [{"analysis": ..., "params": {...}}, ...]}
+
+Uso: python api.py [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+from functions import analysis_service as service
+from functions.analysis_service import JSON, Payload, ServiceError
+from functions.dataset_registry import dataset_registry
+from functions.result_cache import result_cache
+from utils.settings import get_setting
+
+DEFAULT_PORT = 8765
+# Tamaño máximo de un libro subido (MB)
+DEFAULT_MAX_UPLOAD_MB = 200
+
+
+def _json(data) -> Payload:
+    return Payload(json.dumps(data, ensure_ascii=False, default=str).encode('utf-8'), JSON)
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # conexiones keep-alive: los clientes reutilizan el socket
+    # Cabeceras y cuerpo salen en escrituras separadas: con Nagle, cada respuesta esperaba ~40 ms el ACK
+    disable_nagle_algorithm = True
+    max_upload_bytes = DEFAULT_MAX_UPLOAD_MB * 1024 * 1024
+    quiet = False
+
+    def _send(self, payload: Payload, status: int = 200) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", payload.content_type)
+        self.send_header("Content-Length", str(len(payload.body)))
+        self.end_headers()
+        self.wfile.write(payload.body)
+
+    def _read_body(self) -> bytes:
+        try:
+            largo = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            largo = -1
+        if largo < 0:
+            # Sin un largo válido no se sabe dónde termina el cuerpo
+            self.close_connection = True
+            raise ServiceError(400, "Content-Length inválido")
+        if largo > self.max_upload_bytes:
+            # El cuerpo no se lee: la conexión no se puede reutilizar
+            self.close_connection = True
+            raise ServiceError(413, f"El cuerpo supera el máximo de {self.max_upload_bytes // 2**20} MB")
+        return self.rfile.read(largo) if largo else b""
+
+    def _body(self) -> bytes:
+        return self._cuerpo
+
+    def _handle(self, method: str) -> None:
+        url = urlsplit(self.path)
+        partes = [p for p in url.path.split("/") if p]
+        query = dict(parse_qsl(url.query))
+        try:
+            # El cuerpo se lee siempre antes de responder, así la conexión keep-alive queda limpia
+            self._cuerpo = self._read_body()
+            self._send(*self._route(method, partes, query))
+        except ServiceError as e:
+            self._send(_json({'error': str(e)}), e.status)
+        except Exception as e:
+            self._send(_json({'error': f"{type(e).__name__}: {e}"}), 500)
+
+    def _route(self, method: str, partes: list, query: dict):
+        if method == "GET" and partes == ["health"]:
+            return _json({'status': 'ok', 'datasets': dataset_registry.stats(), 'resultados': result_cache.stats()}), 200
+        if method == "GET" and partes == ["analyses"]:
+            return _json(service.describe()), 200
+        if partes[:1] != ["datasets"]:
+            raise ServiceError(404, f"Ruta desconocida: {self.path}")
+
+        if len(partes) == 1 and method == "GET":
+            return _json({'datasets': service.loaded()}), 200
+        if len(partes) == 1 and method == "POST":
+            return _json(self._load(query)), 201
+        clave = partes[1]
+        if len(partes) == 2 and method == "GET":
+            return _json({'dataset': clave, **service.info(clave)}), 200
+        if len(partes) == 3 and partes[2] == "batch" and method == "POST":
+            try:
+                pedido = json.loads(self._body() or b"{}")
+            except ValueError:
+                raise ServiceError(400, "El lote no es JSON válido")
+            return service.run_batch(clave, pedido.get('queries') if isinstance(pedido, dict) else None), 200
+        if len(partes) == 3 and method == "GET":
+            fmt = query.pop('format', 'json')
+            return service.run(clave, partes[2], query, fmt), 200
+        raise ServiceError(404 if method == "GET" else 405, f"Ruta desconocida: {method} {self.path}")
+
+    def _load(self, query: dict) -> dict:
+        content = self._body()
+        if self.headers.get("Content-Type", "").startswith(JSON):
+            # Archivo ya guardado en Supabase
+            from services.storage_supabase import download_excel
+            try:
+                storage_key = json.loads(content)['storage_key']
+            except (ValueError, KeyError, TypeError):
+                raise ServiceError(400, "Se esperaba {\"storage_key\": ...}")
+            content = download_excel(storage_key)
+            if content is None:
+                raise ServiceError(502, f"No se pudo descargar {storage_key} de Supabase")
+            return service.load_dataset(query.get('nombre') or storage_key, content)
+        if not content:
+            raise ServiceError(400, "Falta el libro en el cuerpo del pedido")
+        return service.load_dataset(query.get('nombre', 'archivo.xlsx'), content)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host: str = "127.0.0.1", port: Optional[int] = None, quiet: bool = False) -> ThreadingHTTPServer:
+    """Servidor listo para serve_forever(), un hilo por conexión (con port=0 el sistema elige el puerto)."""
+    port = DEFAULT_PORT if port is None else port
+    handler = type("Handler", (AnalysisHandler,), {
+        'quiet': quiet,
+        'max_upload_bytes': int(get_setting("api", "max_upload_mb", DEFAULT_MAX_UPLOAD_MB)) * 1024 * 1024,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default=str(get_setting("api", "host", "127.0.0.1")))
+    parser.add_argument('--port', type=int, default=int(get_setting("api", "port", DEFAULT_PORT)))
+    parser.add_argument('--quiet', action='store_true', help="No registrar cada pedido")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.quiet)
+    print(f"API de análisis en http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
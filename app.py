@@ -1,23 +1,45 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
-import plotly.express as px
 from functions.data_loader import load_and_clean_data
 from functions.product_analysis import top_selling_product_by_month, top_selling_products
-from functions.client_analysis import products_bought_by_client, client_share_of_sales, client_returns_count
-from functions.typology_analysis import add_typology_column, top_selling_typologies, get_special_categories_summary, get_sales_by_gender
+from functions.client_analysis import products_bought_by_client, client_share_of_sales, client_returns_count, build_client_article_matrix, similar_clients, co_purchased_articles, client_reach
+from functions.typology_analysis import top_selling_typologies, get_special_categories_summary, get_sales_by_gender
 
 # 👇 nuevos imports
+import functools
 import io
-from services.storage_supabase import upload_excel, insert_meta, list_files, download_excel, signed_url
+from utils.settings import get_setting
+if get_setting("storage", "backend", "supabase") == "local":
+    # Almacenamiento en disco: desarrollo sin Supabase y pruebas de carga
+    from services.storage_local import upload_excel, insert_meta, list_files, download_excel, signed_url
+else:
+    from services.storage_supabase import upload_excel, insert_meta, list_files, download_excel, signed_url
+from utils import charts, metrics, tables, tracing
 from utils.format_detect import detect_format, detect_format_smart, detect_from_filename
 from collections import OrderedDict
-from functions.data_repo import DataRepository
+from functions.data_repo import DataRepository, load_prepared
+from functions.dataset_registry import dataset_registry
+from functions.precompute import precomputer
+from functions.result_cache import content_fingerprint, get_fingerprint, set_fingerprint, derive_fingerprint, normalize_filters, result_cache, dataset_key
+from functions.backends import analysis_functions, selected_backend
+from functions.trend_analysis import build_month_index, month_over_month
+from functions import arrow_store, dedup, excel_export, sketches
+from functions.locale_comparison import latest_per_locale, load_concurrently, compare_locale_datasets
 
 st.set_page_config(page_title="Análisis de Ventas", layout="wide")
+# Endpoint de métricas Prometheus del proceso, si el despliegue configuró metrics.port
+metrics.maybe_start_server()
 st.title("📊 Análisis de Datos de Ventas")
 
 # Flag para mostrar mensajes de carga (debug)
 show_debug = st.sidebar.checkbox("Mostrar mensajes de carga", value=False)
+# En modo debug se traza cada rerun (lectura, parseo, análisis, gráficos); sin traza activa los spans no miden nada
+if show_debug:
+    medir_memoria = st.sidebar.checkbox("Medir memoria por etapa (más lento)", value=False, key="medir_memoria")
+    tracing.start_trace("rerun", memoria=medir_memoria)
+else:
+    tracing.finish_trace()
 
 # Constantes de UI (definidas temprano para evitar NameError)
 TIPO_ARCHIVO_LABELS = OrderedDict({
@@ -26,37 +48,150 @@ TIPO_ARCHIVO_LABELS = OrderedDict({
     "locales": "Artículos vendidos por locales",
 })
 LOCALES_OPCIONES = ["Centenario", "55", "49", "5"]
+DIMENSIONES_ALCANCE = OrderedDict({
+    "tipologia": "Tipología",
+    "articulo": "Artículo",
+    "genero": "Género",
+    "localidad": "Localidad",
+    "tipologia_localidad": "Tipología por localidad",
+})
+
+# Funciones de análisis del backend elegido para el despliegue (pandas o polars)
+ANALISIS = analysis_functions()
+
+
+def _session_id() -> str:
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+
+def _activar_dataset(clave: str, nombre: str, origen: str, cargar) -> dict:
+    """
+    Deja en session_state el dataset con esa huella. Solo se llama a `cargar` (descarga/parseo)
+    si ninguna sesión del proceso lo tiene ya en el registro compartido.
+    """
+    anterior = st.session_state.get('dataset')
+    preparado = dataset_registry.acquire(clave, _session_id(), lambda: load_prepared(clave, cargar))
+    if anterior is not None and anterior['clave'] != clave:
+        dataset_registry.release(anterior['clave'], _session_id())
+    dataset = dict(preparado, nombre=nombre, origen=origen, clave=clave)
+    st.session_state['dataset'] = dataset
+    return dataset
+
+
+def _descartar_dataset(origen: str) -> None:
+    # Si el usuario quitó el archivo (o la selección) del que viene el dataset activo, se descarta
+    dataset = st.session_state.get('dataset')
+    if dataset is not None and dataset['origen'] == origen:
+        dataset_registry.release(dataset['clave'], _session_id())
+        precomputer.cancel(_session_id())
+        del st.session_state['dataset']
+
+
+def _mostrar_traza(traza, destino) -> None:
+    """Cascada de etapas de la traza, con su exportación a JSON, en el contenedor indicado."""
+    destino.dataframe(
+        pd.DataFrame(tracing.waterfall(traza)),
+        hide_index=True,
+        column_config={
+            'etapa': st.column_config.TextColumn("Etapa"),
+            'inicio_ms': st.column_config.NumberColumn("Inicio (ms)", format="%.0f"),
+            'duracion_ms': st.column_config.ProgressColumn(
+                "Duración (ms)", format="%.1f", min_value=0, max_value=max(traza.total_ms, 1.0)
+            ),
+            'cpu_ms': st.column_config.NumberColumn("CPU (ms)", format="%.1f"),
+            'pico_mb': st.column_config.NumberColumn("Pico (MB)", format="%.2f"),
+        },
+    )
+    destino.download_button(
+        "Exportar traza (JSON)",
+        data=traza.to_json(),
+        file_name=f"traza_{int(traza.creada)}.json",
+        mime="application/json",
+        on_click="ignore",
+        key=f"exportar_traza_{traza.nombre}",
+    )
+
+
+def _fragment_trazado(func):
+    """
+    st.fragment que en modo debug traza sus propios reruns. Un rerun de fragment no ejecuta el
+    script completo (ni su traza), así que el fragment que se reejecuta abre la suya, la cierra
+    al terminar y muestra la cascada debajo (un fragment no puede escribir en la barra lateral).
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ctx = get_script_run_ctx()
+        # En el rerun completo ya hay traza; en un rerun de fragment la abre el que se reejecuta
+        # y los fragments anidados quedan como spans dentro de ella
+        if not (show_debug and ctx is not None and ctx.fragment_ids_this_run and tracing.current_trace() is None):
+            return func(*args, **kwargs)
+        tracing.start_trace(func.__name__.lstrip('_'), memoria=st.session_state.get('medir_memoria', False))
+        try:
+            resultado = func(*args, **kwargs)
+        finally:
+            traza = tracing.finish_trace()
+        if traza is not None and traza.spans:
+            with st.expander(f"Etapas de este rerun del fragment ({traza.total_ms:,.0f} ms)"):
+                _mostrar_traza(traza, st)
+        return resultado
+
+    return st.fragment(wrapper)
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _archivos_guardados(file_type=None) -> list:
+    """
+    Listado de archivos guardados, cacheado unos segundos: las pestañas lo piden en cada rerun y
+    cada pedido es una consulta a Supabase. Al subir un archivo se invalida (ver tab1).
+    """
+    return list_files(file_type=file_type)
+
 
 # =============================
 # BLOQUE NUEVO: gestor de archivos persistentes
 # =============================
 st.header("0. Gestor de archivos de análisis")
 
-tab1, tab2 = st.tabs(["Subir nuevo", "Abrir guardado"])
+tab1, tab2, tab3, tab4 = st.tabs(["Subir nuevo", "Abrir guardado", "Ranking entre archivos", "Comparar locales"])
 
-df = None
 repo = DataRepository()
 
 with tab1:
     up = st.file_uploader("Subí tu Excel (temporada o locales)", type=["xlsx","xls"])
     if up is not None:
-        df = repo.load_from_upload(up)
-        # Preferir tipo por nombre si existe (incluye sublocal)
-        file_type = detect_from_filename(getattr(up, 'name', '')) or detect_format(df)
-        if file_type == "desconocido":
-            st.error("No reconozco el formato (temporada/locales). Revisá columnas.")
-        else:
-            key = upload_excel(up.getvalue(), up.name)
-            if key:
-                insert_meta(file_type, up.name, key)
-                st.success(f"Guardado como '{file_type}'.")
-                url = signed_url(key)
-                if url:
-                    st.write("Enlace temporal:", url)
-                else:
-                    st.info("Archivo guardado, pero no se pudo generar enlace temporal.")
+        clave = content_fingerprint(up.getvalue())
+        # Solo se parsea y se sube a Supabase la primera vez que aparece este archivo
+        if st.session_state.get('_upload_clave') != clave:
+            dataset = _activar_dataset(clave, up.name, "upload", lambda: repo.load_from_upload(up))
+            mensajes = []
+            # Preferir tipo por nombre si existe (incluye sublocal)
+            file_type = detect_from_filename(getattr(up, 'name', ''))
+            if not file_type:
+                file_type = detect_format(dataset['df']) if dataset['df'] is not None else "desconocido"
+            if file_type == "desconocido":
+                mensajes.append(("error", "No reconozco el formato (temporada/locales). Revisá columnas."))
             else:
-                st.info("No se subió a Supabase (¿secrets no configurados o error de red?). Continuás igual con el archivo local.")
+                key = upload_excel(up.getvalue(), up.name)
+                if key:
+                    insert_meta(file_type, up.name, key)
+                    _archivos_guardados.clear()
+                    sketches.remember_source(key, clave)
+                    mensajes.append(("success", f"Guardado como '{file_type}'."))
+                    url = signed_url(key)
+                    if url:
+                        mensajes.append(("write", f"Enlace temporal: {url}"))
+                    else:
+                        mensajes.append(("info", "Archivo guardado, pero no se pudo generar enlace temporal."))
+                else:
+                    mensajes.append(("info", "No se subió a Supabase (¿secrets no configurados o error de red?). Continuás igual con el archivo local."))
+            st.session_state['_upload_clave'] = clave
+            st.session_state['_upload_mensajes'] = mensajes
+        for nivel, texto in st.session_state.get('_upload_mensajes', []):
+            getattr(st, nivel)(texto)
+    else:
+        st.session_state.pop('_upload_clave', None)
+        _descartar_dataset("upload")
 
 with tab2:
     # Controles de selección intuitivos
@@ -77,7 +212,8 @@ with tab2:
     tipo_map_inv = {v: k for k, v in TIPO_ARCHIVO_LABELS.items()}
     tipo_key = tipo_map_inv.get(tipo_label, "temporada")
 
-    rows = list_files(file_type=tipo_key if tipo_key != "locales" else None)
+    selected = None
+    rows = _archivos_guardados(file_type=tipo_key if tipo_key != "locales" else None)
     if not rows:
         st.info("No hay archivos guardados o Supabase no está configurado.")
     else:
@@ -109,43 +245,679 @@ with tab2:
                 placeholder="Seleccioná un archivo"
             )
             if selected is not None:
-                content = download_excel(selected.get("storage_key",""))
-                if content is None:
-                    st.error("No se pudo descargar el archivo (Supabase no disponible).")
+                storage_key = selected.get("storage_key","")
+                # Solo se descarga y parsea cuando cambia el archivo elegido
+                if st.session_state.get('_guardado_clave') != storage_key:
+                    content = download_excel(storage_key)
+                    if content is None:
+                        st.session_state['_guardado_error'] = "No se pudo descargar el archivo (Supabase no disponible)."
+                        _descartar_dataset("guardado")
+                    else:
+                        st.session_state['_guardado_error'] = None
+                        original_name = selected.get("original_name","archivo.xlsx")
+                        clave = content_fingerprint(content)
+                        sketches.remember_source(storage_key, clave)
+                        _activar_dataset(
+                            clave, selected['original_name'], "guardado",
+                            lambda: repo.load_from_supabase_bytes(original_name, content)
+                        )
+                    st.session_state['_guardado_clave'] = storage_key
+                if st.session_state.get('_guardado_error'):
+                    st.error(st.session_state['_guardado_error'])
                 else:
-                    df = repo.load_from_supabase_bytes(selected.get("original_name","archivo.xlsx"), content)
                     st.success(f"Archivo abierto: {selected['original_name']}")
-                    if show_debug:
-                        st.write("Vista previa:", df.head())
+                    dataset = st.session_state.get('dataset')
+                    if show_debug and dataset is not None and dataset['df'] is not None and dataset['origen'] == "guardado":
+                        st.write("Vista previa:", dataset['df'].head())
+    if selected is None:
+        st.session_state.pop('_guardado_clave', None)
+        _descartar_dataset("guardado")
 
-# Paso 1: Preprocesar solo si hay df
-if df is not None:
-    if show_debug:
-        st.success("✅ Archivo listo para análisis. Filas: {}".format(len(df)))
+
+def _resumenes_de(row: dict):
+    """Resúmenes de un archivo guardado; solo se descarga si nunca se ingirió en este host."""
+    storage_key = row.get("storage_key", "")
+    clave = sketches.fingerprint_for(storage_key)
+    resumenes = sketches.load_sketches(clave) if clave else None
+    if resumenes is None:
+        content = download_excel(storage_key)
+        if content is None:
+            return None
+        clave = content_fingerprint(content)
+        sketches.remember_source(storage_key, clave)
+        if repo.load_prepared_bytes(row.get("original_name", "archivo.xlsx"), content)['df'] is None:
+            return None
+        resumenes = sketches.load_sketches(clave)
+    return resumenes
+
+
+def _dataset_de(row: dict, content: bytes = None):
+    """
+    Dataset preparado de un archivo guardado, compartido entre sesiones por dataset_registry (y
+    abierto del almacén Arrow si ya se ingirió en este host). `content` evita volver a descargarlo.
+    Se usa dentro de una ejecución (rankings, consolidado, comparación): no toma referencia de la
+    sesión, así no queda retenido hasta el vencimiento por inactividad.
+    """
+    storage_key = row.get("storage_key", "")
+    clave = sketches.fingerprint_for(storage_key)
+    if clave is None:
+        content = content if content is not None else download_excel(storage_key)
+        if content is None:
+            return None
+        clave = content_fingerprint(content)
+        sketches.remember_source(storage_key, clave)
+
+    def parsear():
+        datos = content if content is not None else download_excel(storage_key)
+        if datos is None:
+            raise OSError(f"No se pudo descargar {storage_key}")
+        return repo.load_from_supabase_bytes(row.get("original_name", "archivo.xlsx"), datos)
+
+    try:
+        return dataset_registry.acquire(clave, None, lambda: load_prepared(clave, parsear))['df']
+    except OSError:
+        return None
+
+
+def _descargar_local(row: dict):
+    """(huella, contenido) del archivo para load_concurrently; sin descargar si ya está en el almacén."""
+    storage_key = row.get("storage_key", "")
+    clave = sketches.fingerprint_for(storage_key)
+    if clave is not None and (dataset_registry.get(clave) is not None or arrow_store.has_dataset(clave)):
+        return clave, None
+    content = download_excel(storage_key)
+    if content is None:
+        return None
+    clave = content_fingerprint(content)
+    sketches.remember_source(storage_key, clave)
+    return clave, content
+
+
+def _consolidado_de(rows: list):
+    """
+    Une los archivos elegidos sin filas repetidas (exportaciones subidas más de una vez o con
+    fechas superpuestas). Devuelve (clave, dataset, estadísticas) o None si no se pudo leer ninguno.
+    """
+    fuentes = []
+    for r in rows:
+        clave = sketches.fingerprint_for(r.get("storage_key", ""))
+        if clave is None:
+            # Nunca se ingirió en este host: al cargarlo queda registrada su huella
+            if _dataset_de(r) is None:
+                continue
+            clave = sketches.fingerprint_for(r.get("storage_key", ""))
+        ambito = dedup.source_scope(r.get("file_type"), r.get("original_name"), clave)
+        fuentes.append((clave, ambito, lambda r=r: _dataset_de(r)))
+    if not fuentes:
+        return None
+    clave, df, stats = dedup.consolidate(fuentes)
+    if stats['archivos'] == 0:
+        return None
+    set_fingerprint(df, clave)
+    return clave, df, stats
+
+
+with tab3:
+    st.caption("Más vendidos combinando varios archivos guardados (temporadas, meses o locales) sin volver a procesarlos.")
+    rows_todos = _archivos_guardados()
+    if not rows_todos:
+        st.info("No hay archivos guardados o Supabase no está configurado.")
+    else:
+        etiqueta_archivo = lambda r: f"{r.get('file_type','?')} · {r.get('original_name','?')} · {r.get('uploaded_at','')}"
+        elegidos = st.multiselect("Archivos a combinar", rows_todos, format_func=etiqueta_archivo, key="ranking_archivos")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            tipo_ranking = st.radio("Ranking de", ["Artículos", "Clientes", "Alcance de clientes"], horizontal=True, key="ranking_tipo")
+        with col2:
+            n_ranking = st.slider("¿Cuántos mostrar?", 5, 50, 10, key="ranking_n")
+        with col3:
+            exacto = st.checkbox("Modo exacto (validación)", value=False, key="ranking_exacto",
+                                 help="Carga los archivos completos y calcula el ranking exacto para compararlo. Suma todas las filas, "
+                                      "igual que los resúmenes; para quitar las repetidas usá 'Abrir consolidado'.")
+
+        if elegidos and tipo_ranking == "Alcance de clientes":
+            dimension = st.selectbox("Clientes distintos por", list(DIMENSIONES_ALCANCE),
+                                     format_func=DIMENSIONES_ALCANCE.get, key="ranking_dimension")
+            with st.spinner("Combinando resúmenes..."):
+                claves = [sketches.fingerprint_for(r.get("storage_key", "")) for r in elegidos]
+                alcance = [sketches.load_reach_sketches(c) if c else None for c in claves]
+                # Archivos que nunca se ingirieron en este host: se cargan una vez (eso guarda sus resúmenes)
+                for i, r in enumerate(elegidos):
+                    if alcance[i] is None:
+                        df_archivo = _dataset_de(r)
+                        if df_archivo is not None:
+                            alcance[i] = sketches.ensure_reach_sketches(sketches.fingerprint_for(r.get("storage_key", "")), df_archivo)
+            faltantes = [r.get('original_name', '?') for r, a in zip(elegidos, alcance) if a is None]
+            if faltantes:
+                st.warning(f"No se pudieron leer: {', '.join(faltantes)}")
+            alcance = [a for a in alcance if a is not None]
+            if alcance:
+                if exacto:
+                    with st.spinner("Calculando alcance exacto..."):
+                        # Validación de los resúmenes: mismas filas que ellos (sin quitar repetidas)
+                        dfs = [df for df in (_dataset_de(r) for r in elegidos) if df is not None]
+                        st.dataframe(sketches.exact_reach(dfs, dimension).head(n_ranking))
+                else:
+                    st.dataframe(sketches.approximate_reach(alcance, dimension).head(n_ranking))
+                    st.caption("Clientes distintos estimados con HyperLogLog (un cliente que compró en varios archivos cuenta una vez); 'margen' es el error típico (±).")
+        elif elegidos:
+            kind = 'articulos' if tipo_ranking == "Artículos" else 'clientes'
+            with st.spinner("Combinando resúmenes..."):
+                resumenes = [_resumenes_de(r) for r in elegidos]
+            faltantes = [r.get('original_name', '?') for r, s in zip(elegidos, resumenes) if s is None]
+            if faltantes:
+                st.warning(f"No se pudieron leer: {', '.join(faltantes)}")
+            resumenes = [s for s in resumenes if s is not None]
+            if resumenes:
+                aproximado = sketches.approximate_top_across(resumenes, kind, n_ranking)
+                st.dataframe(aproximado['top'])
+                if aproximado['exacto_garantizado']:
+                    st.success(f"Top {n_ranking} garantizado exacto ({aproximado['archivos']} archivos).")
+                else:
+                    st.info(
+                        f"Ranking aproximado de {aproximado['archivos']} archivos: cada total real está entre "
+                        f"'cota_inferior' y 'cantidad_vendida' (error máximo ±{aproximado['error_maximo']:,.0f} unidades)."
+                    )
+
+                if exacto:
+                    with st.spinner("Calculando ranking exacto..."):
+                        # Validación de los resúmenes: mismas filas que ellos (sin quitar repetidas)
+                        dfs = [df for df in (_dataset_de(r) for r in elegidos) if df is not None]
+                        exacto_top = sketches.exact_top_across(dfs, kind, n_ranking)
+                    st.subheader("Ranking exacto")
+                    st.dataframe(exacto_top)
+                    clave_col = sketches.SKETCH_KINDS[kind][0]
+                    if list(exacto_top[clave_col]) == list(aproximado['top'][clave_col]):
+                        st.success("El ranking aproximado coincide con el exacto.")
+                    else:
+                        st.warning("El ranking aproximado difiere del exacto (ver cotas de error).")
+
+        if elegidos and st.button("Abrir consolidado (sin filas repetidas)", key="abrir_consolidado",
+                                  help="Une los archivos elegidos en un solo dataset para los análisis, sin contar dos veces las ventas repetidas."):
+            with st.spinner("Consolidando archivos..."):
+                consolidado = _consolidado_de(elegidos)
+            if consolidado is None:
+                st.error("❌ No se pudo leer ningún archivo")
+            else:
+                clave_consolidado, df_consolidado, stats = consolidado
+                _activar_dataset(clave_consolidado, f"Consolidado ({stats['archivos']} archivos)", "consolidado",
+                                 lambda: df_consolidado)
+                st.success(
+                    f"Consolidado abierto: {stats['filas']:,} filas de {stats['archivos']} archivos; "
+                    f"se quitaron {stats['duplicadas']:,} filas repetidas."
+                )
+                if stats['archivos'] < len(elegidos):
+                    st.warning(f"Se consolidaron {stats['archivos']} de {len(elegidos)} archivos: el resto no se pudo leer.")
+
+
+@_fragment_trazado
+def _seccion_comparar_locales():
+    """Comparación entre locales. Corre como fragment: sus widgets no rerunean el resto de la app."""
+    st.caption("Último archivo de cada local, cargados en paralelo y comparados lado a lado.")
+    locales_comparar = st.multiselect("Locales a comparar", LOCALES_OPCIONES, default=[], key="comparar_locales")
+    if len(locales_comparar) >= 2:
+        archivos_local = latest_per_locale(_archivos_guardados(), locales_comparar)
+        sin_archivo = [local for local, r in archivos_local.items() if r is None]
+        if sin_archivo:
+            st.warning(f"Sin archivos guardados para: {', '.join(sin_archivo)}")
+        archivos_local = {local: r for local, r in archivos_local.items() if r is not None}
+        if archivos_local:
+            n_comparar = st.slider("Productos por local", 5, 30, 10, key="comparar_n")
+            with st.spinner(f"Cargando {len(archivos_local)} locales..."):
+                datasets_local = load_concurrently(archivos_local, _descargar_local, _dataset_de)
+            fallidos = [local for local, df in datasets_local.items() if df is None]
+            if fallidos:
+                st.warning(f"No se pudieron leer: {', '.join(fallidos)}")
+            if len(fallidos) < len(datasets_local):
+                comparacion = compare_locale_datasets(datasets_local, n_comparar)
+                st.dataframe(comparacion['resumen'], hide_index=True)
+                charts.show(charts.bar(comparacion['resumen'], 'local', 'unidades_vendidas', 'Unidades vendidas por local'), show_debug)
+
+                st.subheader("Productos más vendidos")
+                productos = comparacion['productos']
+                columnas = st.columns(len(comparacion['resumen']))
+                for col, local in zip(columnas, comparacion['resumen']['local']):
+                    with col:
+                        st.markdown(f"**{local}**")
+                        st.dataframe(productos[productos['local'] == local].drop(columns='local'), hide_index=True)
+
+                st.subheader("Tipologías por local")
+                st.dataframe(comparacion['tipologias'])
+    elif locales_comparar:
+        st.info("Elegí al menos dos locales.")
+
+
+with tab4:
+    _seccion_comparar_locales()
+
+
+@tracing.traced("filtrar")
+def _aplicar_filtros(df: pd.DataFrame, cliente_input: str, producto_input: str, tipologia_sel: str) -> pd.DataFrame:
+    """Filtra el dataset; sin filtros devuelve el mismo objeto (sin copiar)."""
+    df_filt = df
     
-    # Verificar columnas críticas (si faltan, mostrar error siempre)
-    # Para locales solo necesitamos cantidad_vendida, para temporada necesitamos más
-    required_columns = ['cantidad_vendida']  # Mínimo requerido
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    if missing_columns:
-        st.error(f"❌ Columnas críticas faltantes: {missing_columns}")
-        st.stop()
+    # Filtro por cliente (busca tanto en código como en nombre)
+    if cliente_input.strip():
+        cliente_mask = (
+            df_filt['cliente'].astype(str).str.contains(cliente_input, case=False, na=False) |
+            df_filt['nombre_cliente'].astype(str).str.contains(cliente_input, case=False, na=False)
+        )
+        df_filt = df_filt[cliente_mask]
+    
+    # Filtro por producto (busca tanto en código como en descripción)
+    if producto_input.strip():
+        producto_mask = (
+            df_filt['codigo_del_articulo'].astype(str).str.contains(producto_input, case=False, na=False) |
+            df_filt['descripcion_del_producto'].astype(str).str.contains(producto_input, case=False, na=False)
+        )
+        df_filt = df_filt[producto_mask]
+    
+    # Filtro por tipología
+    if tipologia_sel != "Todas":
+        df_filt = df_filt[df_filt['tipologia'] == tipologia_sel]
+    
+    if not isinstance(df_filt, pd.DataFrame):
+        df_filt = pd.DataFrame(df_filt)
+
+    # Huella del subconjunto filtrado: los análisis se memoizan por dataset + filtros normalizados
+    if df_filt is not df and get_fingerprint(df):
+        set_fingerprint(df_filt, derive_fingerprint(
+            get_fingerprint(df),
+            normalize_filters(cliente=cliente_input, producto=producto_input, tipologia=tipologia_sel)
+        ))
+    return df_filt
+
+
+# Paso 4: vistas de resultados (cada una corre como fragment independiente)
+
+@_fragment_trazado
+def _view_productos_por_cliente(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    cliente_analisis = st.text_input("Ingresa el cliente a analizar (código o nombre)", placeholder="Ej: 12345 o Juan Pérez")
+    
+    if cliente_analisis.strip():
+        # Buscar cliente por código o nombre
+        cliente_mask = (
+            df_filt['cliente'].astype(str).str.contains(cliente_analisis, case=False, na=False) |
+            df_filt['nombre_cliente'].astype(str).str.contains(cliente_analisis, case=False, na=False)
+        )
+        df_cliente = df_filt[cliente_mask]
+        
+        if not df_cliente.empty:
+            result = df_cliente.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
+            result = result.sort_values('cantidad_vendida', ascending=False).head(10)
+            
+            st.dataframe(result)
+            if not result.empty:
+                fig = charts.bar(result, 'descripcion_del_producto', 'cantidad_vendida',
+                                 f'Productos más comprados por cliente que contiene "{cliente_analisis}"')
+                charts.show(fig, show_debug)
+        else:
+            st.warning("No se encontraron clientes que coincidan con la búsqueda.")
     else:
-        if show_debug:
-            st.success("✅ Todas las columnas críticas están presentes")
+        st.info("👆 Ingresa un cliente para ver sus productos más comprados.")
 
-    # Preprocesar tipología solo si las columnas están disponibles
-    try:
-        df = add_typology_column(df)
-        if show_debug:
-            st.success("✅ Tipologías procesadas correctamente")
-    except Exception as e:
-        st.error(f"❌ Error al procesar tipologías: {str(e)}")
-        st.stop()
 
-    # Paso 2: Seleccionar tipo de análisis
-    st.header("1. Seleccionar tipo de análisis")
+@_fragment_trazado
+def _view_tipologias(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    # No se muestran filtros para este análisis
+    
+    # Tabla 1: Todos los artículos
+    st.subheader("📊 Todos los artículos")
+    result_todos = ANALISIS['top_selling_typologies'](df)  # ya cuenta solo ventas normales
+    st.dataframe(result_todos)
+    if not result_todos.empty:
+        fig1 = charts.pie(result_todos, 'tipologia', 'cantidad_vendida', 'Tipologías más vendidas - Todos los artículos',
+                          key=charts.chart_key(df, 'tipologias'))
+        charts.show(fig1, show_debug)
+    
+    st.divider()
     
+    # Tabla 2: Solo básicos
+    st.subheader("🔹 Solo básicos")
+    df_basicos = df[(df['cuenta_ventas'] == True) & (df['codigo_del_articulo'].str.startswith("B"))]
+
+    if not df_basicos.empty:
+        result_basicos = df_basicos.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
+        result_basicos = result_basicos.sort_values('cantidad_vendida', ascending=False).head(10)
+        result_basicos = result_basicos.rename(columns={
+            'codigo_del_articulo': 'Código', 
+            'descripcion_del_producto': 'Descripción', 
+            'cantidad_vendida': 'Cantidad vendida'
+        })
+        st.dataframe(result_basicos)
+        
+        fig2 = charts.bar(result_basicos, 'Descripción', 'Cantidad vendida', 'Top 10 productos básicos más vendidos',
+                          key=charts.chart_key(df, 'basicos'), tickangle=45)
+        charts.show(fig2, show_debug)
+    else:
+        st.info("No se encontraron productos básicos en los datos.")
+
+
+@_fragment_trazado
+def _view_top_productos(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    # No se muestran filtros para este análisis
+    n = st.slider("¿Cuántos productos mostrar?", 5, 20, 10)
+    result = ANALISIS['top_selling_products'](df, n)
+    
+    # Agregar ranking
+    if not result.empty:
+        result = result.reset_index(drop=True)
+        result.insert(0, 'Ranking', range(1, len(result) + 1))
+    
+    st.dataframe(result)
+    if not result.empty:
+        # Determinar qué columna usar para el eje X
+        x_col = 'descripcion_del_producto' if 'descripcion_del_producto' in result.columns else 'codigo_del_articulo'
+        fig = charts.bar(result, x_col, 'cantidad_vendida', 'Top productos más vendidos',
+                         key=charts.chart_key(df, 'top_productos', n), tickangle=45)
+        charts.show(fig, show_debug)
+
+
+@_fragment_trazado
+def _view_peso_clientes(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    result = ANALISIS['client_share_of_sales'](df_filt)
+    # Calcular total solo de ventas normales (excluir categorías especiales)
+    total_unidades = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
+    
+    # Si hay filtro por cliente o producto, mostrar información específica
+    if cliente_input.strip() or producto_input.strip():
+        col1, col2 = st.columns([2,1])
+        
+        with col1:
+            if cliente_input.strip():
+                st.subheader(f"📊 Análisis para cliente: '{cliente_input}'")
+                # Calcular peso del cliente filtrado vs total general (solo ventas normales)
+                cliente_unidades = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
+                total_general = df[df['cuenta_ventas'] == True]['cantidad_vendida'].sum()
+                porcentaje_cliente = (cliente_unidades / total_general) * 100 if total_general > 0 else 0
+                
+                st.metric("Unidades del cliente (ventas normales)", int(cliente_unidades))
+                st.metric("% del total general", f"{porcentaje_cliente:.1f}%")
+                
+                # Mostrar breakdown por cliente específico
+                tables.paged_table(result, "tabla_peso_cliente", file_name="peso_clientes.csv")
+                
+            if producto_input.strip():
+                st.subheader(f"📦 Análisis para producto: '{producto_input}'")
+                # Calcular peso del producto filtrado vs total de ese producto específico (solo ventas normales)
+                producto_unidades = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
+                
+                # Buscar el total vendido de ese producto específico en toda la base (solo ventas normales)
+                producto_mask_total = (
+                    df['codigo_del_articulo'].astype(str).str.contains(producto_input, case=False, na=False) |
+                    df['descripcion_del_producto'].astype(str).str.contains(producto_input, case=False, na=False)
+                )
+                df_producto_total = df[producto_mask_total & (df['cuenta_ventas'] == True)]
+                total_producto_especifico = df_producto_total['cantidad_vendida'].sum()
+                porcentaje_producto = (producto_unidades / total_producto_especifico) * 100 if total_producto_especifico > 0 else 0
+                
+                st.metric("Unidades del cliente para este producto", int(producto_unidades))
+                st.metric("% del total de este producto", f"{porcentaje_producto:.1f}%")
+                st.metric("Total vendido de este producto (ventas normales)", int(total_producto_especifico))
+                
+                # Mostrar quién compra más este producto
+                agg_dict = {'cantidad_vendida': 'sum'}
+                if 'nombre_cliente' in df_filt.columns:
+                    agg_dict['nombre_cliente'] = 'first'
+                if 'localidad' in df_filt.columns:
+                    agg_dict['localidad'] = 'first'
+                
+                cliente_producto = df_filt.groupby('cliente').agg(agg_dict).reset_index()
+                cliente_producto = cliente_producto.sort_values('cantidad_vendida', ascending=False)
+                
+                # Agregar ranking
+                cliente_producto.insert(0, 'Ranking', range(1, len(cliente_producto) + 1))
+                
+                st.subheader("Top clientes que compran este producto:")
+                st.dataframe(cliente_producto.head(10))
+                
+        with col2:
+            st.metric("Total filtrado", int(total_unidades))
+            st.metric("Total general", int(df[df['cuenta_ventas'] == True]['cantidad_vendida'].sum()))
+            
+            # Gráfico de comparación
+            if cliente_input.strip():
+                fig_data = pd.DataFrame({
+                    'Categoría': ['Cliente seleccionado', 'Resto'],
+                    'Unidades': [cliente_unidades, total_general - cliente_unidades]
+                })
+                fig = charts.pie(fig_data, 'Categoría', 'Unidades', f'Peso del cliente "{cliente_input}" vs Total')
+                charts.show(fig, show_debug)
+            elif producto_input.strip():
+                # Calcular el total del producto específico para el gráfico
+                producto_mask_total = (
+                    df['codigo_del_articulo'].astype(str).str.contains(producto_input, case=False, na=False) |
+                    df['descripcion_del_producto'].astype(str).str.contains(producto_input, case=False, na=False)
+                )
+                total_producto_especifico = df[producto_mask_total & (df['cuenta_ventas'] == True)]['cantidad_vendida'].sum()
+                
+                fig_data = pd.DataFrame({
+                    'Categoría': ['Cliente seleccionado', 'Otros clientes'],
+                    'Unidades': [producto_unidades, total_producto_especifico - producto_unidades]
+                })
+                fig = charts.pie(fig_data, 'Categoría', 'Unidades', f'Participación del cliente en producto "{producto_input}"')
+                charts.show(fig, show_debug)
+    else:
+        # Vista general sin filtros
+        col1, col2 = st.columns([2,1])
+        with col1:
+            tables.paged_table(result, "tabla_peso_clientes", dataset_key(df_filt, 'peso_clientes'), file_name="peso_clientes.csv")
+        with col2:
+            st.metric("Total neto de unidades", int(total_unidades))
+        
+        if not result.empty:
+            # Con miles de clientes la torta muestra los principales y agrupa el resto en "Otros"
+            fig = charts.pie(result, 'cliente', 'cantidad_vendida', 'Peso de cada cliente sobre el total de unidades',
+                             key=charts.chart_key(df_filt, 'peso_clientes'))
+            charts.show(fig, show_debug)
+
+
+@_fragment_trazado
+def _view_devoluciones(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    result = ANALISIS['client_returns_count'](df_filt)
+    total_devoluciones = df_filt.loc[df_filt['cantidad_vendida'] < 0, 'cantidad_vendida'].abs().sum()
+    col1, col2 = st.columns([2,1])
+    with col1:
+        tables.paged_table(result, "tabla_devoluciones", dataset_key(df_filt, 'devoluciones'), file_name="devoluciones.csv")
+    with col2:
+        st.metric("Total de devoluciones (unidades)", int(total_devoluciones))
+
+
+@_fragment_trazado
+def _view_clientes_similares(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    matriz = build_client_article_matrix(df)
+    cliente_ref = st.text_input("Cliente de referencia (código o nombre)", placeholder="Ej: 12345 o Juan Pérez")
+    n = st.slider("¿Cuántos clientes mostrar?", 5, 50, 10)
+
+    if cliente_ref.strip():
+        # Resolver el cliente: primero por código exacto, luego por nombre
+        candidatos = matriz.clientes[matriz.clientes.str.lower() == cliente_ref.strip().lower()].tolist()
+        if not candidatos and matriz.nombres_cliente is not None:
+            nombres = matriz.nombres_cliente.astype(str)
+            candidatos = nombres[nombres.str.contains(cliente_ref, case=False, na=False, regex=False)].index.tolist()
+
+        if candidatos:
+            cliente_sel = candidatos[0]
+            if len(candidatos) > 1:
+                cliente_sel = st.selectbox("Varios clientes coinciden, elegí uno", candidatos)
+            result = similar_clients(matriz, cliente_sel, n)
+            if not result.empty:
+                st.dataframe(result)
+                fig = charts.bar(result, 'cliente', 'similitud', f'Clientes que compran parecido a "{cliente_sel}"')
+                charts.show(fig, show_debug)
+            else:
+                st.info("Ese cliente no comparte artículos con otros clientes.")
+        else:
+            st.warning("No se encontraron clientes que coincidan con la búsqueda.")
+    else:
+        st.info("👆 Ingresa un cliente para ver quiénes compran de forma parecida.")
+
+
+@_fragment_trazado
+def _view_compras_conjuntas(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    matriz = build_client_article_matrix(df)
+    articulo_ref = st.text_input("Artículo de referencia (código)", placeholder="Ej: 2514001 o B1401")
+    n = st.slider("¿Cuántos artículos mostrar?", 5, 50, 10)
+
+    if articulo_ref.strip():
+        articulo = articulo_ref.strip().upper()
+        result = co_purchased_articles(matriz, articulo, n)
+        if articulo not in matriz.articulos:
+            st.warning("No se encontró ese artículo entre las ventas normales.")
+        elif result.empty:
+            st.info("Ningún cliente de ese artículo compró otros artículos.")
+        else:
+            st.dataframe(result)
+            x_col = 'descripcion_del_producto' if 'descripcion_del_producto' in result.columns else 'codigo_del_articulo'
+            fig = charts.bar(result, x_col, 'clientes_en_comun',
+                             f'Artículos comprados por los mismos clientes que "{articulo}"', tickangle=45)
+            charts.show(fig, show_debug)
+    else:
+        st.info("👆 Ingresa un artículo para ver con qué otros se compra.")
+
+
+@_fragment_trazado
+def _view_genero(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    result = ANALISIS['get_sales_by_gender'](df_filt)
+    st.dataframe(result)
+    if not result.empty:
+        fig = charts.pie(result, 'genero', 'cantidad_vendida', 'Ventas por género', key=charts.chart_key(df_filt, 'genero'))
+        charts.show(fig, show_debug)
+    
+    # Mostrar total de unidades que cuentan como ventas
+    ventas_normales = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
+    st.metric("Total unidades vendidas (excluye categorías especiales)", int(ventas_normales))
+
+
+@_fragment_trazado
+def _view_categorias_especiales(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    summary = get_special_categories_summary(df)  # Usar df original, no filtrado
+    
+    # Crear tabs para cada categoría (las categorías nuevas aparecen con su propio nombre)
+    categorias_ui = OrderedDict({
+        'cierres': ("Cierres", "🔒 Cierres", "No se encontraron registros de cierres en los datos."),
+        'ch': ("Cheques", "🏷️ Cheques", "No se encontraron registros de cheques en los datos."),
+        'sorteos': ("Sorteos", "🎲 Sorteos", "No se encontraron registros de sorteos en los datos."),
+        'perfuminas': ("Perfuminas", "🌸 Perfuminas", "No se encontraron registros de perfuminas en los datos."),
+        'otros_codigos': ("Otros Códigos", "❓ Otros Códigos", "No se encontraron otros códigos especiales en los datos."),
+    })
+    for key in summary:
+        if key not in categorias_ui:
+            nombre = key.replace('_', ' ').capitalize()
+            categorias_ui[key] = (nombre, f"⭐ {nombre}", f"No se encontraron registros de {nombre.lower()} en los datos.")
+
+    tabs = st.tabs([tab_label for tab_label, _, _ in categorias_ui.values()])
+    for tab, (key, (_, subheader, vacio)) in zip(tabs, categorias_ui.items()):
+        with tab:
+            st.subheader(subheader)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Cantidad de registros", summary[key]['cantidad'])
+            with col2:
+                st.metric("Total unidades", int(summary[key]['unidades']))
+
+            if not summary[key]['detalle'].empty:
+                tables.paged_table(summary[key]['detalle'], f"tabla_especiales_{key}", dataset_key(df, 'especiales', key),
+                                   file_name=f"{key}.csv")
+            else:
+                st.info(vacio)
+            
+    # Resumen general
+    # st.subheader("📊 Resumen general")
+    #total_especiales = (summary['cierres']['unidades'] + summary['ch']['unidades'] + 
+    #                  summary['sorteos']['unidades'] + summary['perfuminas']['unidades'] + 
+    #                  summary['otros_codigos']['unidades'])
+    #ventas_normales = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
+    #
+    #col1, col2, col3 = st.columns(3)
+    #with col1:
+    #    st.metric("Ventas normales", int(ventas_normales))
+    #with col2:
+    #    st.metric("Categorías especiales", int(total_especiales))
+    #with col3:
+    #    st.metric("Total general", int(ventas_normales + total_especiales)) 
+
+@_fragment_trazado
+def _view_tendencia_mensual(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    # Meses disponibles según el índice por mes armado al cargar el dataset
+    meses = build_month_index(df).periodos
+    opciones_por = OrderedDict()
+    if 'tipologia' in df.columns:
+        opciones_por['Tipologías'] = 'tipologia'
+    opciones_por['Artículos'] = 'codigo_del_articulo'
+
+    col1, col2 = st.columns(2)
+    with col1:
+        por = st.radio("Analizar por", list(opciones_por), horizontal=True)
+    with col2:
+        n = st.slider("¿Cuántos mostrar?", 3, 15, 5)
+    if len(meses) > 1:
+        desde, hasta = st.select_slider("Meses", options=meses, value=(meses[0], meses[-1]))
+    else:
+        desde = hasta = meses[0]
+
+    by = opciones_por[por]
+    result = month_over_month(df, by, desde, hasta, n)
+    if result.empty:
+        st.info("No hay ventas en el rango de meses elegido.")
+        return
+
+    etiqueta = 'descripcion_del_producto' if 'descripcion_del_producto' in result.columns else by
+    fig = charts.line(result, 'periodo', 'cantidad_vendida', f'Tendencia mes a mes - {por.lower()} más vendidos',
+                      color=etiqueta, key=charts.chart_key(df, 'tendencia', by, desde, hasta, n), markers=True)
+    charts.show(fig, show_debug)
+    st.dataframe(result.drop(columns=['variacion']))
+
+    st.divider()
+    st.subheader("🏆 Producto más vendido del mes")
+    mes = st.selectbox("Mes", meses[::-1])
+    anio, numero_mes = (int(x) for x in mes.split('-'))
+    top = top_selling_product_by_month(df, numero_mes, anio)
+    if top.empty:
+        st.info("No hay ventas de productos en ese mes.")
+    else:
+        st.dataframe(top.reset_index(drop=True))
+
+
+@_fragment_trazado
+def _view_alcance_clientes(df: pd.DataFrame, df_filt: pd.DataFrame, cliente_input: str, producto_input: str):
+    disponibles = [d for d in DIMENSIONES_ALCANCE if all(c in df.columns for c in sketches.REACH_DIMENSIONS[d])]
+    dimension = st.selectbox("Clientes distintos por", disponibles, format_func=DIMENSIONES_ALCANCE.get)
+    result = client_reach(df, dimension)
+    if result.empty:
+        st.info("No hay compras de clientes para calcular el alcance.")
+        return
+
+    if (result['Método'] == 'aproximado').any():
+        st.caption("Dataset grande: cantidades estimadas con HyperLogLog; 'margen' es el error típico (±).")
+    tables.paged_table(result, f"tabla_alcance_{dimension}", dataset_key(df, 'alcance', dimension), file_name=f"alcance_{dimension}.csv")
+    top = result.head(20)
+    x_col = sketches.REACH_DIMENSIONS[dimension][0]
+    color = sketches.REACH_DIMENSIONS[dimension][1] if len(sketches.REACH_DIMENSIONS[dimension]) > 1 else None
+    fig = charts.bar(top, x_col, 'clientes', f'Clientes distintos por {DIMENSIONES_ALCANCE[dimension].lower()}',
+                     key=charts.chart_key(df, 'alcance', dimension), tickangle=45,
+                     color=color, error_y='margen' if top['margen'].any() else None)
+    charts.show(fig, show_debug)
+
+
+VISTAS_ANALISIS = {
+    "Top productos más vendidos": _view_top_productos,
+    "Productos más comprados por cliente": _view_productos_por_cliente,
+    "Peso de cada cliente sobre el total de unidades": _view_peso_clientes,
+    "Cantidad de devoluciones por cliente": _view_devoluciones,
+    "Clientes con compras similares": _view_clientes_similares,
+    "Artículos que se compran juntos": _view_compras_conjuntas,
+    "Tipologías más vendidas": _view_tipologias,
+    "Análisis por género": _view_genero,
+    "Categorías especiales (Cierres, CH, Sorteos, etc.)": _view_categorias_especiales,
+    "Tendencia mensual (mes a mes)": _view_tendencia_mensual,
+    "Alcance de clientes": _view_alcance_clientes,
+}
+
+
+def _opciones_analisis(dataset: dict) -> list:
+    """Análisis disponibles según las columnas del dataset (en el orden del selector)."""
+    df = dataset['df']
     # Determinar qué análisis mostrar según el tipo de archivo
     has_cliente = 'cliente' in df.columns
     has_tipologia = 'tipologia' in df.columns
@@ -158,7 +930,10 @@ if df is not None:
         analysis_options.extend([
             "Productos más comprados por cliente",
             "Peso de cada cliente sobre el total de unidades",
-            "Cantidad de devoluciones por cliente"
+            "Cantidad de devoluciones por cliente",
+            "Clientes con compras similares",
+            "Artículos que se compran juntos",
+            "Alcance de clientes"
         ])
     
     if has_tipologia:
@@ -170,386 +945,160 @@ if df is not None:
     if has_tipologia:  # Solo si hay tipología podemos tener categorías especiales
         analysis_options.append("Categorías especiales (Cierres, CH, Sorteos, etc.)")
     
+    if dataset.get('meses') and 'codigo_del_articulo' in df.columns:  # Solo si el archivo trae fechas de venta
+        analysis_options.append("Tendencia mensual (mes a mes)")
+    return analysis_options
+
+
+def _tareas_precomputo(dataset: dict) -> OrderedDict:
+    """
+    Cálculo de cada análisis disponible con los valores por defecto de su vista (sin filtros),
+    para precalcularlo en segundo plano. Los que dependen de lo que escriba el usuario no se incluyen.
+    """
+    df = dataset['df']
+    meses = dataset.get('meses') or []
+    dimensiones = [d for d in DIMENSIONES_ALCANCE if all(c in df.columns for c in sketches.REACH_DIMENSIONS[d])]
+    tareas = {
+        "Top productos más vendidos": lambda: ANALISIS['top_selling_products'](df, 10),
+        "Peso de cada cliente sobre el total de unidades": lambda: ANALISIS['client_share_of_sales'](df),
+        "Cantidad de devoluciones por cliente": lambda: ANALISIS['client_returns_count'](df),
+        "Clientes con compras similares": lambda: build_client_article_matrix(df),
+        "Alcance de clientes": lambda: client_reach(df, dimensiones[0]) if dimensiones else None,
+        "Tipologías más vendidas": lambda: ANALISIS['top_selling_typologies'](df),
+        "Análisis por género": lambda: ANALISIS['get_sales_by_gender'](df),
+        "Categorías especiales (Cierres, CH, Sorteos, etc.)": lambda: get_special_categories_summary(df),
+        "Tendencia mensual (mes a mes)": lambda: month_over_month(
+            df, 'tipologia' if 'tipologia' in df.columns else 'codigo_del_articulo', meses[0], meses[-1], 5
+        ),
+    }
+    # "Artículos que se compran juntos" usa la misma matriz que "Clientes con compras similares"
+    return OrderedDict((nombre, tareas[nombre]) for nombre in _opciones_analisis(dataset) if nombre in tareas)
+
+
+@_fragment_trazado
+def _seccion_resultados(dataset: dict):
+    """
+    Selección de análisis, filtros y resultados. Corre como fragment: interactuar con estos
+    widgets no vuelve a ejecutar la carga de archivos ni el preprocesamiento.
+    """
+    df = dataset['df']
+    # Mantener viva la referencia de esta sesión en el registro compartido
+    dataset_registry.touch(dataset['clave'], _session_id())
+
+    # Paso 2: Seleccionar tipo de análisis
+    st.header("1. Seleccionar tipo de análisis")
+    
+    has_cliente = 'cliente' in df.columns
+    has_tipologia = 'tipologia' in df.columns
+    analysis_options = _opciones_analisis(dataset)
+    
     analysis_type = st.selectbox(
         "¿Qué análisis deseas realizar?",
         analysis_options,
         key="analysis_type"
     )
 
-    if analysis_type != "Selecciona una opción":
-        # Paso 3: Filtros (solo se muestran según el tipo de análisis y columnas disponibles)
-        # Determinar qué filtros mostrar según el análisis seleccionado
-        show_cliente_filter = has_cliente and analysis_type in ["Productos más comprados por cliente", "Peso de cada cliente sobre el total de unidades"]
-        show_producto_filter = analysis_type in ["Productos más comprados por cliente", "Peso de cada cliente sobre el total de unidades"]
-        show_tipologia_filter = has_tipologia and analysis_type in ["Productos más comprados por cliente", "Peso de cada cliente sobre el total de unidades", "Cantidad de devoluciones por cliente", "Análisis por género"]
-        
-        # Solo mostrar el header de filtros si hay al menos un filtro que mostrar
-        if show_cliente_filter or show_producto_filter or show_tipologia_filter:
-            st.header("3. Filtros")
-            
-            # Filtros dinámicos (solo si las columnas existen)
-            clientes = df['cliente'].dropna().unique().tolist() if has_cliente else []
-            productos = df['descripcion_del_producto'].dropna().unique().tolist() if 'descripcion_del_producto' in df.columns else []
-            tipologias = df['tipologia'].dropna().unique().tolist() if has_tipologia else []
-
-            # Crear columnas dinámicamente según los filtros que se muestren
-            filters_to_show = []
-            if show_cliente_filter:
-                filters_to_show.append("cliente")
-            if show_producto_filter:
-                filters_to_show.append("producto")
-            if show_tipologia_filter:
-                filters_to_show.append("tipologia")
-            
-            if len(filters_to_show) == 1:
-                col1 = st.columns(1)[0]
-                cols = [col1]
-            elif len(filters_to_show) == 2:
-                col1, col2 = st.columns(2)
-                cols = [col1, col2]
-            else:
-                col1, col2, col3 = st.columns(3)
-                cols = [col1, col2, col3]
-            
-            # Asignar filtros a columnas
-            filter_idx = 0
-            cliente_input = ""
-            producto_input = ""
-            tipologia_sel = "Todas"
-            
-            if show_cliente_filter:
-                with cols[filter_idx]:
-                    cliente_input = st.text_input("Filtrar por cliente (código o nombre)", placeholder="Ej: 12345 o Juan Pérez")
-                filter_idx += 1
-            
-            if show_producto_filter:
-                with cols[filter_idx]:
-                    producto_input = st.text_input("Filtrar por producto (código o nombre)", placeholder="Ej: ABC123 o Remera")
-                filter_idx += 1
-            
-            if show_tipologia_filter:
-                with cols[filter_idx]:
-                    tipologia_sel = st.selectbox("Filtrar por tipología", ["Todas"] + tipologias)
-        else:
-            # Si no se muestran filtros, inicializar variables vacías
-            cliente_input = ""
-            producto_input = ""
-            tipologia_sel = "Todas"
+    # El libro se genera recién al hacer clic (y queda cacheado por dataset); descargar no provoca un rerun
+    st.download_button(
+        "📥 Exportar todos los análisis (Excel)",
+        data=lambda: excel_export.build_report(df).data,
+        file_name=f"analisis_{dataset['nombre'].rsplit('.', 1)[0]}.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        on_click="ignore",
+        help="Un libro con una hoja por análisis: top de productos, peso de clientes, devoluciones, tipologías, género y categorías especiales",
+    )
 
-        # Aplicar filtros
-        df_filt = df.copy()
-        
-        # Filtro por cliente (busca tanto en código como en nombre)
-        if cliente_input.strip():
-            cliente_mask = (
-                df_filt['cliente'].astype(str).str.contains(cliente_input, case=False, na=False) |
-                df_filt['nombre_cliente'].astype(str).str.contains(cliente_input, case=False, na=False)
-            )
-            df_filt = df_filt[cliente_mask]
-        
-        # Filtro por producto (busca tanto en código como en descripción)
-        if producto_input.strip():
-            producto_mask = (
-                df_filt['codigo_del_articulo'].astype(str).str.contains(producto_input, case=False, na=False) |
-                df_filt['descripcion_del_producto'].astype(str).str.contains(producto_input, case=False, na=False)
-            )
-            df_filt = df_filt[producto_mask]
-        
-        # Filtro por tipología
-        if tipologia_sel != "Todas":
-            df_filt = df_filt[df_filt['tipologia'] == tipologia_sel]
-        
-        if not isinstance(df_filt, pd.DataFrame):
-            df_filt = pd.DataFrame(df_filt)
+    # Paso 3: Filtros (solo se muestran según el tipo de análisis y columnas disponibles)
+    # Determinar qué filtros mostrar según el análisis seleccionado
+    show_cliente_filter = has_cliente and analysis_type in ["Productos más comprados por cliente", "Peso de cada cliente sobre el total de unidades"]
+    show_producto_filter = analysis_type in ["Productos más comprados por cliente", "Peso de cada cliente sobre el total de unidades"]
+    show_tipologia_filter = has_tipologia and analysis_type in ["Productos más comprados por cliente", "Peso de cada cliente sobre el total de unidades", "Cantidad de devoluciones por cliente", "Análisis por género"]
+    
+    cliente_input = ""
+    producto_input = ""
+    tipologia_sel = "Todas"
 
-        # Paso 4: Mostrar resultados del análisis
-        st.header("4. Resultados del análisis")
+    # Solo mostrar el header de filtros si hay al menos un filtro que mostrar
+    if show_cliente_filter or show_producto_filter or show_tipologia_filter:
+        st.header("3. Filtros")
         
-        if analysis_type == "Productos más comprados por cliente":
-            cliente_analisis = st.text_input("Ingresa el cliente a analizar (código o nombre)", placeholder="Ej: 12345 o Juan Pérez")
-            
-            if cliente_analisis.strip():
-                # Buscar cliente por código o nombre
-                cliente_mask = (
-                    df_filt['cliente'].astype(str).str.contains(cliente_analisis, case=False, na=False) |
-                    df_filt['nombre_cliente'].astype(str).str.contains(cliente_analisis, case=False, na=False)
-                )
-                df_cliente = df_filt[cliente_mask]
-                
-                if not df_cliente.empty:
-                    result = df_cliente.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
-                    result = result.sort_values('cantidad_vendida', ascending=False).head(10)
-                    
-                    st.dataframe(result)
-                    if not result.empty:
-                        fig = px.bar(result, x='descripcion_del_producto', y='cantidad_vendida', 
-                                title=f'Productos más comprados por cliente que contiene "{cliente_analisis}"')
-                        st.plotly_chart(fig, use_container_width=True)
-                else:
-                    st.warning("No se encontraron clientes que coincidan con la búsqueda.")
-            else:
-                st.info("👆 Ingresa un cliente para ver sus productos más comprados.")
-        
-        elif analysis_type == "Tipologías más vendidas":
-            # No se muestran filtros para este análisis
-            
-            # Tabla 1: Todos los artículos
-            st.subheader("📊 Todos los artículos")
-            result_todos = top_selling_typologies(df[df['cuenta_ventas'] == True])
-            st.dataframe(result_todos)
-            if not result_todos.empty:
-                fig1 = px.pie(result_todos, names='tipologia', values='cantidad_vendida', 
-                             title='Tipologías más vendidas - Todos los artículos')
-                st.plotly_chart(fig1, use_container_width=True)
-            
-            st.divider()
-            
-            # Tabla 2: Solo básicos
-            st.subheader("🔹 Solo básicos")
-            df_basicos = df[(df['cuenta_ventas'] == True) & (df['codigo_del_articulo'].str.startswith("B"))]
-
-            if not df_basicos.empty:
-                result_basicos = df_basicos.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
-                result_basicos = result_basicos.sort_values('cantidad_vendida', ascending=False).head(10)
-                result_basicos = result_basicos.rename(columns={
-                    'codigo_del_articulo': 'Código', 
-                    'descripcion_del_producto': 'Descripción', 
-                    'cantidad_vendida': 'Cantidad vendida'
-                })
-                st.dataframe(result_basicos)
-                
-                fig2 = px.bar(result_basicos, x='Descripción', y='Cantidad vendida', 
-                            title='Top 10 productos básicos más vendidos')
-                fig2.update_xaxes(tickangle=45)
-                st.plotly_chart(fig2, use_container_width=True)
-            else:
-                st.info("No se encontraron productos básicos en los datos.")
-        
-        elif analysis_type == "Top productos más vendidos":
-            # No se muestran filtros para este análisis
-            n = st.slider("¿Cuántos productos mostrar?", 5, 20, 10)
-            result = top_selling_products(df, n)
-            
-            # Agregar ranking
-            if not result.empty:
-                result = result.reset_index(drop=True)
-                result.insert(0, 'Ranking', range(1, len(result) + 1))
-            
-            st.dataframe(result)
-            if not result.empty:
-                # Determinar qué columna usar para el eje X
-                x_col = 'descripcion_del_producto' if 'descripcion_del_producto' in result.columns else 'codigo_del_articulo'
-                fig = px.bar(result, x=x_col, y='cantidad_vendida', 
-                           title='Top productos más vendidos')
-                fig.update_xaxes(tickangle=45)
-                st.plotly_chart(fig, use_container_width=True)
+        # Crear columnas dinámicamente según los filtros que se muestren
+        filters_to_show = [show_cliente_filter, show_producto_filter, show_tipologia_filter].count(True)
+        cols = st.columns(filters_to_show)
+        filter_idx = 0
         
-        elif analysis_type == "Peso de cada cliente sobre el total de unidades":
-            result = client_share_of_sales(df_filt)
-            # Calcular total solo de ventas normales (excluir categorías especiales)
-            total_unidades = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
-            
-            # Si hay filtro por cliente o producto, mostrar información específica
-            if cliente_input.strip() or producto_input.strip():
-                col1, col2 = st.columns([2,1])
-                
-                with col1:
-                    if cliente_input.strip():
-                        st.subheader(f"📊 Análisis para cliente: '{cliente_input}'")
-                        # Calcular peso del cliente filtrado vs total general (solo ventas normales)
-                        cliente_unidades = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
-                        total_general = df[df['cuenta_ventas'] == True]['cantidad_vendida'].sum()
-                        porcentaje_cliente = (cliente_unidades / total_general) * 100 if total_general > 0 else 0
-                        
-                        st.metric("Unidades del cliente (ventas normales)", int(cliente_unidades))
-                        st.metric("% del total general", f"{porcentaje_cliente:.1f}%")
-                        
-                        # Mostrar breakdown por cliente específico
-                        st.dataframe(result)
-                        
-                    if producto_input.strip():
-                        st.subheader(f"📦 Análisis para producto: '{producto_input}'")
-                        # Calcular peso del producto filtrado vs total de ese producto específico (solo ventas normales)
-                        producto_unidades = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
-                        
-                        # Buscar el total vendido de ese producto específico en toda la base (solo ventas normales)
-                        producto_mask_total = (
-                            df['codigo_del_articulo'].astype(str).str.contains(producto_input, case=False, na=False) |
-                            df['descripcion_del_producto'].astype(str).str.contains(producto_input, case=False, na=False)
-                        )
-                        df_producto_total = df[producto_mask_total & (df['cuenta_ventas'] == True)]
-                        total_producto_especifico = df_producto_total['cantidad_vendida'].sum()
-                        porcentaje_producto = (producto_unidades / total_producto_especifico) * 100 if total_producto_especifico > 0 else 0
-                        
-                        st.metric("Unidades del cliente para este producto", int(producto_unidades))
-                        st.metric("% del total de este producto", f"{porcentaje_producto:.1f}%")
-                        st.metric("Total vendido de este producto (ventas normales)", int(total_producto_especifico))
-                        
-                        # Mostrar quién compra más este producto
-                        agg_dict = {'cantidad_vendida': 'sum'}
-                        if 'nombre_cliente' in df_filt.columns:
-                            agg_dict['nombre_cliente'] = 'first'
-                        if 'localidad' in df_filt.columns:
-                            agg_dict['localidad'] = 'first'
-                        
-                        cliente_producto = df_filt.groupby('cliente').agg(agg_dict).reset_index()
-                        cliente_producto = cliente_producto.sort_values('cantidad_vendida', ascending=False)
-                        
-                        # Agregar ranking
-                        cliente_producto.insert(0, 'Ranking', range(1, len(cliente_producto) + 1))
-                        
-                        st.subheader("Top clientes que compran este producto:")
-                        st.dataframe(cliente_producto.head(10))
-                        
-                with col2:
-                    st.metric("Total filtrado", int(total_unidades))
-                    st.metric("Total general", int(df[df['cuenta_ventas'] == True]['cantidad_vendida'].sum()))
-                    
-                    # Gráfico de comparación
-                    if cliente_input.strip():
-                        fig_data = pd.DataFrame({
-                            'Categoría': ['Cliente seleccionado', 'Resto'],
-                            'Unidades': [cliente_unidades, total_general - cliente_unidades]
-                        })
-                        fig = px.pie(fig_data, names='Categoría', values='Unidades', 
-                                title=f'Peso del cliente "{cliente_input}" vs Total')
-                        st.plotly_chart(fig, use_container_width=True)
-                    elif producto_input.strip():
-                        # Calcular el total del producto específico para el gráfico
-                        producto_mask_total = (
-                            df['codigo_del_articulo'].astype(str).str.contains(producto_input, case=False, na=False) |
-                            df['descripcion_del_producto'].astype(str).str.contains(producto_input, case=False, na=False)
-                        )
-                        total_producto_especifico = df[producto_mask_total & (df['cuenta_ventas'] == True)]['cantidad_vendida'].sum()
-                        
-                        fig_data = pd.DataFrame({
-                            'Categoría': ['Cliente seleccionado', 'Otros clientes'],
-                            'Unidades': [producto_unidades, total_producto_especifico - producto_unidades]
-                        })
-                        fig = px.pie(fig_data, names='Categoría', values='Unidades', 
-                                title=f'Participación del cliente en producto "{producto_input}"')
-                        st.plotly_chart(fig, use_container_width=True)
-            else:
-                # Vista general sin filtros
-                col1, col2 = st.columns([2,1])
-                with col1:
-                    st.dataframe(result)
-                with col2:
-                    st.metric("Total neto de unidades", int(total_unidades))
-                
-                if not result.empty:
-                    fig = px.pie(result, names='cliente', values='cantidad_vendida', 
-                            title='Peso de cada cliente sobre el total de unidades')
-                    st.plotly_chart(fig, use_container_width=True)
-
-        elif analysis_type == "Cantidad de devoluciones por cliente":
-            result = client_returns_count(df_filt)
-            total_devoluciones = df_filt.loc[df_filt['cantidad_vendida'] < 0, 'cantidad_vendida'].abs().sum()
-            col1, col2 = st.columns([2,1])
-            with col1:
-                st.dataframe(result)
-            with col2:
-                st.metric("Total de devoluciones (unidades)", int(total_devoluciones))
+        if show_cliente_filter:
+            with cols[filter_idx]:
+                cliente_input = st.text_input("Filtrar por cliente (código o nombre)", placeholder="Ej: 12345 o Juan Pérez").strip()
+            filter_idx += 1
         
-        elif analysis_type == "Análisis por género":
-            result = get_sales_by_gender(df_filt)
-            st.dataframe(result)
-            if not result.empty:
-                fig = px.pie(result, names='genero', values='cantidad_vendida', title='Ventas por género')
-                st.plotly_chart(fig, use_container_width=True)
-            
-            # Mostrar total de unidades que cuentan como ventas
-            ventas_normales = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
-            st.metric("Total unidades vendidas (excluye categorías especiales)", int(ventas_normales))
+        if show_producto_filter:
+            with cols[filter_idx]:
+                producto_input = st.text_input("Filtrar por producto (código o nombre)", placeholder="Ej: ABC123 o Remera").strip()
+            filter_idx += 1
         
-        elif analysis_type == "Categorías especiales (Cierres, CH, Sorteos, etc.)":
-            summary = get_special_categories_summary(df)  # Usar df original, no filtrado
-            
-            # Crear tabs para cada categoría
-            tab1, tab2, tab3, tab4, tab5 = st.tabs(["Cierres", "Cheques", "Sorteos", "Perfuminas", "Otros Códigos"])
-            
-            with tab1:
-                st.subheader("🔒 Cierres")
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Cantidad de registros", summary['cierres']['cantidad'])
-                with col2:
-                    st.metric("Total unidades", int(summary['cierres']['unidades']))
-                
-                if not summary['cierres']['detalle'].empty:
-                    st.dataframe(summary['cierres']['detalle'])
-                else:
-                    st.info("No se encontraron registros de cierres en los datos.")
-            
-            with tab2:
-                st.subheader("🏷️ Cheques")
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Cantidad de registros", summary['ch']['cantidad'])
-                with col2:
-                    st.metric("Total unidades", int(summary['ch']['unidades']))
-                
-                if not summary['ch']['detalle'].empty:
-                    st.dataframe(summary['ch']['detalle'])
-                else:
-                    st.info("No se encontraron registros de cheques en los datos.")
-            
-            with tab3:
-                st.subheader("🎲 Sorteos")
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Cantidad de registros", summary['sorteos']['cantidad'])
-                with col2:
-                    st.metric("Total unidades", int(summary['sorteos']['unidades']))
-                
-                if not summary['sorteos']['detalle'].empty:
-                    st.dataframe(summary['sorteos']['detalle'])
-                else:
-                    st.info("No se encontraron registros de sorteos en los datos.")
-            
-            with tab4:
-                st.subheader("🌸 Perfuminas")
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Cantidad de registros", summary['perfuminas']['cantidad'])
-                with col2:
-                    st.metric("Total unidades", int(summary['perfuminas']['unidades']))
-                
-                if not summary['perfuminas']['detalle'].empty:
-                    st.dataframe(summary['perfuminas']['detalle'])
-                else:
-                    st.info("No se encontraron registros de perfuminas en los datos.")
-            
-            with tab5:
-                st.subheader("❓ Otros Códigos")
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Cantidad de registros", summary['otros_codigos']['cantidad'])
-                with col2:
-                    st.metric("Total unidades", int(summary['otros_codigos']['unidades']))
-                
-                if not summary['otros_codigos']['detalle'].empty:
-                    st.dataframe(summary['otros_codigos']['detalle'])
-                else:
-                    st.info("No se encontraron otros códigos especiales en los datos.")
-                    
-            # Resumen general
-            # st.subheader("📊 Resumen general")
-            #total_especiales = (summary['cierres']['unidades'] + summary['ch']['unidades'] + 
-            #                  summary['sorteos']['unidades'] + summary['perfuminas']['unidades'] + 
-            #                  summary['otros_codigos']['unidades'])
-            #ventas_normales = df_filt[df_filt['cuenta_ventas'] == True]['cantidad_vendida'].sum()
-            #
-            #col1, col2, col3 = st.columns(3)
-            #with col1:
-            #    st.metric("Ventas normales", int(ventas_normales))
-            #with col2:
-            #    st.metric("Categorías especiales", int(total_especiales))
-            #with col3:
-            #    st.metric("Total general", int(ventas_normales + total_especiales)) 
+        if show_tipologia_filter:
+            with cols[filter_idx]:
+                # Opciones precalculadas al cargar el dataset
+                tipologia_sel = st.selectbox("Filtrar por tipología", ["Todas"] + dataset['tipologias'])
+
+    df_filt = _aplicar_filtros(df, cliente_input, producto_input, tipologia_sel)
+
+    # Paso 4: Mostrar resultados del análisis
+    st.header("4. Resultados del análisis")
+    # Cada vista es a su vez un fragment: sus widgets propios (slider, búsqueda) solo rerunean la vista
+    with tracing.span("vista", analisis=analysis_type):
+        VISTAS_ANALISIS[analysis_type](df, df_filt, cliente_input, producto_input)
+
+
+# Paso 1: Preprocesar solo si hay df
+dataset = st.session_state.get('dataset')
+if dataset is not None:
+    if dataset['error']:
+        st.error(dataset['error'])
+        st.stop()
+
+    if show_debug:
+        st.success("✅ Archivo listo para análisis. Filas: {}".format(dataset['filas']))
+        st.success("✅ Todas las columnas críticas están presentes")
+        st.success("✅ Tipologías procesadas correctamente")
+
+    # Precalcular en segundo plano el resto de los análisis (si cambia el dataset, el anterior se cancela)
+    precomputer.start(_session_id(), dataset['clave'], _tareas_precomputo(dataset))
+    _seccion_resultados(dataset)
 
 else:
     st.info("👆 Por favor, sube un archivo Excel para comenzar el análisis.")
 
+if show_debug:
+    st.sidebar.caption(f"Backend de análisis: {selected_backend()}")
+    stats = result_cache.stats()
+    st.sidebar.caption("Cache de resultados")
+    st.sidebar.write(
+        f"Entradas: {stats['entradas']} · {stats['bytes'] / 1e6:.1f} MB de {stats['max_bytes'] / 1e6:.0f} MB"
+    )
+    st.sidebar.write(
+        f"Hits: {stats['hits']} · Misses: {stats['misses']} · Hit rate: {stats['hit_rate']:.0%} · Evictions: {stats['evictions']}"
+    )
+    stats = dataset_registry.stats()
+    st.sidebar.caption("Datasets compartidos entre sesiones")
+    st.sidebar.write(
+        f"Entradas: {stats['entradas']} · {stats['bytes'] / 1e6:.1f} MB de {stats['max_bytes'] / 1e6:.0f} MB · Sesiones: {stats['referencias']}"
+    )
+    st.sidebar.write(
+        f"Hits: {stats['hits']} · Misses: {stats['misses']} · Evictions: {stats['evictions']}"
+    )
+    precalculo = precomputer.status(_session_id())
+    if precalculo is not None:
+        st.sidebar.caption("Precálculo en segundo plano")
+        estado = "cancelado" if precalculo['cancelado'] else ("listo" if precalculo['terminado'] else "en curso")
+        st.sidebar.write(f"{precalculo['hechos']}/{precalculo['total']} análisis · {estado}")
+        for nombre, segundos in precalculo['tiempos'].items():
+            st.sidebar.write(f"{nombre}: {segundos * 1000:.0f} ms" + (" (error)" if nombre in precalculo['errores'] else ""))
+    traza = tracing.finish_trace()
+    if traza is not None and traza.spans:
+        st.sidebar.caption(f"Etapas del último rerun completo ({traza.total_ms:,.0f} ms)")
+        _mostrar_traza(traza, st.sidebar)
+
 st.markdown("---")
-st.caption("💡 Puedes agregar nuevas funcionalidades fácilmente en el futuro, como exportar resultados o comparar clientes/tipologías.") 
\ No newline at end of file
+st.caption("💡 Puedes agregar nuevas funcionalidades fácilmente en el futuro, como comparar clientes/tipologías.")
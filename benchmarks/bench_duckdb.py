@@ -0,0 +1,62 @@
+"""
+Compara las funciones de análisis en pandas con su versión SQL en DuckDB sobre un dataset sintético.
+Verifica que ambos resultados sean idénticos y muestra los tiempos de cada implementación.
+
+Uso: python benchmarks/bench_duckdb.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_sales  # noqa: E402
+from functions.backends import PANDAS_ANALYSES  # noqa: E402
+from functions.duckdb_engine import DuckDBCatalog, SQL_ANALYSES, units_by_typology_across, clients_in_every_locale  # noqa: E402
+from functions.typology_analysis import add_typology_column  # noqa: E402
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = add_typology_column(synthetic_sales(args.rows))
+    catalog = DuckDBCatalog()
+    tabla, registro = _timed(catalog.register_dataframe, df, 'temporada sintetica.xlsx', {'file_type': 'temporada'})
+    print(f"{len(df):,} filas; registro en DuckDB: {registro * 1000:.1f} ms\n")
+    print(f"{'análisis':<26}{'pandas (ms)':>14}{'duckdb (ms)':>14}{'speedup':>10}")
+
+    for name, pandas_func in PANDAS_ANALYSES.items():
+        t_pandas, t_sql = [], []
+        for _ in range(args.repeat):
+            esperado, t = _timed(pandas_func, df)
+            t_pandas.append(t)
+            obtenido, t = _timed(SQL_ANALYSES[name], catalog, tabla)
+            t_sql.append(t)
+        pd.testing.assert_frame_equal(esperado.reset_index(drop=True), obtenido.reset_index(drop=True), check_dtype=False)
+        best_pandas, best_sql = min(t_pandas), min(t_sql)
+        print(f"{name:<26}{best_pandas * 1000:>14.1f}{best_sql * 1000:>14.1f}{best_pandas / best_sql:>9.1f}x")
+
+    # Consultas entre archivos: dos locales con parte de los mismos clientes
+    mitad = len(df) // 2
+    catalog.register_dataframe(df.iloc[:mitad], 'locales centenario.xlsx', {'file_type': 'locales:centenario'})
+    catalog.register_dataframe(df.iloc[mitad // 2:], 'locales 55.xlsx', {'file_type': 'locales:55'})
+    _, t = _timed(units_by_typology_across, catalog)
+    print(f"\n{'units_by_typology_across':<26}{'':>14}{t * 1000:>14.1f}")
+    clientes, t = _timed(clients_in_every_locale, catalog)
+    print(f"{'clients_in_every_locale':<26}{'':>14}{t * 1000:>14.1f}  ({len(clientes):,} clientes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Mide el arranque en frío de la app con `python -X importtime` (como en un contenedor recién creado)
+y lo compara con la línea base guardada en benchmarks/baselines/import_time.json.
+Falla si el arranque es más lento que la base más la tolerancia, o si al arrancar se importa alguna
+dependencia que debería cargarse recién al usarse (supabase, plotly.express, scipy.sparse, motores).
+
+Uso: python benchmarks/bench_import_time.py [--repeat 5] [--top 15] [--update-baseline]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "import_time.json")
+
+# Módulos que no deben importarse antes del primer uso
+LAZY_MODULES = ['supabase', 'plotly.express', 'scipy.sparse', 'duckdb', 'polars']
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def profile_once() -> List[Tuple[str, int, int, int]]:
+    """Corre `import app` en un proceso nuevo; devuelve (módulo, propio µs, acumulado µs, profundidad)."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    filas = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            filas.append((m.group(4), int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2))
+    if not filas:
+        raise RuntimeError(f"No se pudo perfilar el arranque:\n{proc.stderr[-2000:]}")
+    return filas
+
+
+def summarize(filas: List[Tuple[str, int, int, int]], top: int) -> Dict:
+    total = sum(acumulado for _, _, acumulado, profundidad in filas if profundidad == 0)
+    importados = {modulo for modulo, _, _, _ in filas}
+    # Dependencias directas de app y paquetes de terceros, por tiempo acumulado
+    mas_lentos = sorted(
+        ((modulo, acumulado) for modulo, _, acumulado, profundidad in filas if profundidad <= 1),
+        key=lambda x: x[1], reverse=True,
+    )[:top]
+    return {
+        'total_ms': round(total / 1000, 1),
+        'modulos': len(importados),
+        'mas_lentos_ms': [(modulo, round(us / 1000, 1)) for modulo, us in mas_lentos],
+        'perezosos_importados': [m for m in LAZY_MODULES if m in importados],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Margen sobre la base (0.25 = 25%%)")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    # El mejor de varios arranques: el ruido del sistema solo puede sumar tiempo
+    resumenes = [summarize(profile_once(), args.top) for _ in range(args.repeat)]
+    mejor = min(resumenes, key=lambda r: r['total_ms'])
+
+    print(f"Arranque (mejor de {args.repeat}): {mejor['total_ms']:.0f} ms · {mejor['modulos']} módulos\n")
+    print(f"{'módulo':<45}{'acumulado (ms)':>16}")
+    for modulo, ms in mejor['mas_lentos_ms']:
+        print(f"{modulo:<45}{ms:>16.1f}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(BASELINE), exist_ok=True)
+        with open(BASELINE, 'w', encoding='utf-8') as f:
+            json.dump({'total_ms': mejor['total_ms'], 'python': sys.version.split()[0]}, f, indent=2)
+            f.write("\n")
+        print(f"\nLínea base actualizada: {BASELINE}")
+        return
+
+    errores = []
+    if mejor['perezosos_importados']:
+        errores.append(f"Se importan al arrancar: {', '.join(mejor['perezosos_importados'])}")
+    if os.path.exists(BASELINE):
+        with open(BASELINE, encoding='utf-8') as f:
+            base = json.load(f)
+        limite = base['total_ms'] * (1 + args.tolerance)
+        print(f"\nLínea base: {base['total_ms']:.0f} ms (límite {limite:.0f} ms)")
+        if mejor['total_ms'] > limite:
+            errores.append(f"Arranque de {mejor['total_ms']:.0f} ms supera el límite de {limite:.0f} ms")
+    if errores:
+        print("\n".join(["", "REGRESIÓN:"] + errores))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Compara el backend de Polars con las funciones de análisis en pandas sobre un dataset sintético.
+Verifica paridad exacta (mismo esquema, orden e índice) con columnas numpy y con columnas Arrow
+(con los tipos del almacén mapeado) y muestra los tiempos de cada backend.
+
+Uso: python benchmarks/bench_polars.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import synthetic_sales  # noqa: E402
+from functions import arrow_store  # noqa: E402
+from functions.backends import analysis_functions  # noqa: E402
+from functions.typology_analysis import add_typology_column  # noqa: E402
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def _check_and_time(df: pd.DataFrame, repeat: int) -> None:
+    pandas_funcs, polars_funcs = analysis_functions('pandas'), analysis_functions('polars')
+    print(f"{'análisis':<26}{'pandas (ms)':>14}{'polars (ms)':>14}{'speedup':>10}")
+    for name, pandas_func in pandas_funcs.items():
+        t_pandas, t_polars = [], []
+        for _ in range(repeat):
+            esperado, t = _timed(pandas_func, df)
+            t_pandas.append(t)
+            obtenido, t = _timed(polars_funcs[name], df)
+            t_polars.append(t)
+        pd.testing.assert_frame_equal(esperado, obtenido, check_dtype=False)
+        best_pandas, best_polars = min(t_pandas), min(t_polars)
+        print(f"{name:<26}{best_pandas * 1000:>14.1f}{best_polars * 1000:>14.1f}{best_pandas / best_polars:>9.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=500_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    df = add_typology_column(synthetic_sales(args.rows))
+    # Clientes sin nombre y filas sin cliente, para cubrir el 'first' de pandas y las claves nulas
+    rng = np.random.default_rng(1)
+    df.loc[rng.random(len(df)) < 0.01, 'nombre_cliente'] = np.nan
+    df.loc[rng.random(len(df)) < 0.001, 'cliente'] = np.nan
+
+    print(f"{len(df):,} filas, columnas numpy\n")
+    _check_and_time(df, args.repeat)
+
+    arrow = arrow_store.table_to_pandas(pa.Table.from_pandas(df, preserve_index=False))
+    print(f"\n{len(arrow):,} filas, columnas como en el almacén Arrow\n")
+    _check_and_time(arrow, args.repeat)
+
+    # Sin devoluciones: ambos backends devuelven el mismo DataFrame vacío
+    sin_devoluciones = df[df['cantidad_vendida'] > 0]
+    pd.testing.assert_frame_equal(
+        analysis_functions('pandas')['client_returns_count'](sin_devoluciones),
+        analysis_functions('polars')['client_returns_count'](sin_devoluciones),
+    )
+
+
+if __name__ == '__main__':
+    main()
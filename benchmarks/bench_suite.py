@@ -0,0 +1,199 @@
+"""
+Mide tiempo y memoria de cada etapa del pipeline (lectura del Excel, parseo por formato, canonicalize,
+add_typology_column, prepare_dataset) y de cada análisis sobre datos sintéticos (ver synthetic.py),
+y compara con la línea base guardada en benchmarks/baselines/suite_<filas>.json.
+Falla si alguna etapa es más lenta o usa más memoria que la base más la tolerancia.
+
+Los análisis se corren sobre DataFrames sin huella, así memoize_by_fingerprint no devuelve resultados
+de la cache. El Excel se lee con a lo sumo --excel-rows filas: una hoja no admite más de 1.048.575
+y openpyxl tarda demasiado en escribir archivos grandes; el resto de las etapas usa --rows.
+Se compara la mediana de --repeat corridas (no el mínimo): una corrida suelta más rápida o más lenta
+por ruido de la máquina no mueve el resultado.
+
+Las líneas base son por máquina: los tiempos solo valen en el host donde se generaron (se guarda su
+nombre en el archivo). En otra máquina, o tras cambiar de hardware o de versión de Python, regenerarla
+con --update-baseline antes de comparar; si el host no coincide se avisa y no se marca regresión.
+
+Uso: python benchmarks/bench_suite.py --rows 100000 [--repeat 7] [--only typology] [--update-baseline]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import FILE_NAMES, FORMATS, raw_frame, synthetic_sales, workbook_bytes  # noqa: E402
+from functions.backends import PANDAS_ANALYSES  # noqa: E402
+from functions.client_analysis import build_client_article_matrix, client_reach  # noqa: E402
+from functions.data_repo import DataRepository, prepare_dataset  # noqa: E402
+from functions.locale_comparison import compare_locales, tag_locales  # noqa: E402
+from functions.parsers.articulos_mes import parse_articulos_mes  # noqa: E402
+from functions.parsers.locales import parse_locales  # noqa: E402
+from functions.parsers.temporada import parse_temporada  # noqa: E402
+from functions.schemas import canonicalize  # noqa: E402
+from functions.trend_analysis import month_over_month, monthly_rollup  # noqa: E402
+from functions.typology_analysis import add_typology_column, get_special_categories_summary  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES = os.path.join(ROOT, "benchmarks", "baselines")
+
+PARSERS = {'temporada': parse_temporada, 'locales': parse_locales, 'articulos_mes': parse_articulos_mes}
+
+# Una etapa: nombre, función a medir y cómo armar sus argumentos (lo que no se mide)
+Stage = Tuple[str, Callable[..., Any], Callable[[], tuple]]
+
+
+def baseline_path(rows: int) -> str:
+    return os.path.join(BASELINES, f"suite_{rows}.json")
+
+
+def build_stages(rows: int, excel_rows: int, seed: int) -> List[Stage]:
+    """Datos sintéticos de cada formato y la lista de etapas a medir sobre ellos."""
+    crudos = {fmt: raw_frame(fmt, rows, seed=seed) for fmt in FORMATS}
+    libros = {fmt: workbook_bytes(raw_frame(fmt, min(rows, excel_rows), seed=seed)) for fmt in FORMATS}
+    ventas = synthetic_sales(rows, seed=seed)
+    df = add_typology_column(ventas)
+    mitad = len(df) // 2
+    locales = tag_locales({'centro': df.iloc[:mitad], 'norte': df.iloc[mitad:]})
+
+    repo = DataRepository()
+    stages: List[Stage] = []
+    for fmt in FORMATS:
+        stages.append((f"leer_xlsx:{fmt}", repo.load_from_supabase_bytes, lambda fmt=fmt: (FILE_NAMES[fmt], libros[fmt])))
+    for fmt in FORMATS:
+        stages.append((f"parse:{fmt}", PARSERS[fmt], lambda fmt=fmt: (crudos[fmt].copy(),)))
+    stages += [
+        ("canonicalize", canonicalize, lambda: (crudos['temporada'].copy(),)),
+        ("add_typology_column", add_typology_column, lambda: (ventas,)),
+        ("prepare_dataset", prepare_dataset, lambda: (ventas,)),
+    ]
+    stages += [(name, func, lambda: (df,)) for name, func in PANDAS_ANALYSES.items()]
+    stages += [
+        ("get_special_categories_summary", get_special_categories_summary, lambda: (df,)),
+        ("build_client_article_matrix", build_client_article_matrix, lambda: (df,)),
+        ("client_reach:tipologia", client_reach, lambda: (df, 'tipologia')),
+        ("client_reach:localidad", client_reach, lambda: (df, 'localidad')),
+        ("monthly_rollup", monthly_rollup, lambda: (df, ('codigo_del_articulo', 'descripcion_del_producto'))),
+        ("month_over_month", month_over_month, lambda: (df, 'tipologia')),
+        ("compare_locales", compare_locales, lambda: (locales,)),
+    ]
+    return stages
+
+
+def measure(func: Callable[..., Any], make_args: Callable[[], tuple], repeat: int) -> Dict[str, float]:
+    """
+    Mediana y mejor tiempo de `repeat` corridas y pico de memoria de una corrida aparte con tracemalloc
+    (que hace más lenta la ejecución, por eso no se mezcla con la medición de tiempo).
+    """
+    tiempos = []
+    for _ in range(repeat):
+        args = make_args()
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        tiempos.append(time.perf_counter() - start)
+        del args
+
+    args = make_args()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'ms': round(statistics.median(tiempos) * 1000, 2),
+        'ms_min': round(min(tiempos) * 1000, 2),
+        'peak_mb': round(pico / 2**20, 2),
+    }
+
+
+def compare(resultados: Dict[str, Dict[str, float]], base: Dict[str, Dict[str, float]],
+            tolerance: float, memory_tolerance: float, min_ms: float) -> List[str]:
+    """
+    Etapas cuya mediana supera la de la base más la tolerancia (las de menos de min_ms de diferencia
+    no cuentan).
+    """
+    errores = []
+    for nombre, actual in resultados.items():
+        previo = base.get(nombre)
+        if previo is None:
+            continue
+        limite = previo['ms'] * (1 + tolerance)
+        if actual['ms'] > limite and actual['ms'] - previo['ms'] > min_ms:
+            errores.append(f"{nombre}: {actual['ms']:.1f} ms supera el límite de {limite:.1f} ms")
+        limite = previo['peak_mb'] * (1 + memory_tolerance)
+        if actual['peak_mb'] > limite and actual['peak_mb'] - previo['peak_mb'] > 1:
+            errores.append(f"{nombre}: pico de {actual['peak_mb']:.1f} MB supera el límite de {limite:.1f} MB")
+    return errores
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--excel-rows', type=int, default=20_000, help="Filas de los Excel que se leen")
+    parser.add_argument('--repeat', type=int, default=7, help="Corridas por etapa (se compara la mediana)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', default=None, help="Solo las etapas cuyo nombre contiene este texto")
+    parser.add_argument('--tolerance', type=float, default=0.30, help="Margen de tiempo sobre la base (0.30 = 30%%)")
+    parser.add_argument('--memory-tolerance', type=float, default=0.10, help="Margen de memoria sobre la base")
+    parser.add_argument('--min-ms', type=float, default=5.0, help="Diferencias menores no cuentan como regresión")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stages = build_stages(args.rows, args.excel_rows, args.seed)
+    if args.only:
+        stages = [s for s in stages if args.only in s[0]]
+    print(f"{args.rows:,} filas sintéticas (Excel de {min(args.rows, args.excel_rows):,}), "
+          f"generadas en {time.perf_counter() - start:.1f} s\n")
+
+    path = baseline_path(args.rows)
+    base, host_base = {}, None
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            guardada = json.load(f)
+        base, host_base = guardada['etapas'], guardada.get('host')
+
+    resultados = {}
+    print(f"{'etapa':<34}{'mediana (ms)':>13}{'base (ms)':>11}{'pico (MB)':>11}{'base (MB)':>11}")
+    for nombre, func, make_args in stages:
+        resultados[nombre] = actual = measure(func, make_args, args.repeat)
+        previo = base.get(nombre, {})
+        print(f"{nombre:<34}{actual['ms']:>13.1f}{previo.get('ms', float('nan')):>11.1f}"
+              f"{actual['peak_mb']:>11.1f}{previo.get('peak_mb', float('nan')):>11.1f}")
+
+    if args.update_baseline:
+        os.makedirs(BASELINES, exist_ok=True)
+        etapas = {**base, **resultados}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'rows': args.rows, 'excel_rows': args.excel_rows, 'python': sys.version.split()[0],
+                       'host': platform.node(), 'etapas': etapas}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nLínea base actualizada: {path}")
+        return
+
+    if not base:
+        print(f"\nSin línea base para {args.rows:,} filas (crearla con --update-baseline)")
+        return
+    if host_base != platform.node():
+        print(f"\nLa línea base es de otra máquina ({host_base or 'sin host'}): los tiempos no son comparables, "
+              f"regenerarla acá con --update-baseline")
+        return
+    errores = compare(resultados, base, args.tolerance, args.memory_tolerance, args.min_ms)
+    if errores:
+        print("\n".join(["", "REGRESIÓN:"] + errores))
+        sys.exit(1)
+    print("\nSin regresiones respecto de la línea base")
+
+
+if __name__ == '__main__':
+    main()
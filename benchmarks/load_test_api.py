@@ -0,0 +1,179 @@
+"""
+Prueba de carga de la API de análisis (api.py): sube un libro sintético y lanza clientes concurrentes
+que mezclan consultas sueltas (JSON y Arrow) y lotes. Informa la latencia en frío de cada análisis y,
+ya con la cache caliente, pedidos por segundo y percentiles de latencia por tipo de pedido.
+
+Sin --url levanta una instancia local en otro proceso y la cierra al terminar.
+
+Uso: python benchmarks/load_test_api.py [--rows 50000] [--clients 8] [--requests 200] [--url http://127.0.0.1:8765]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import FILE_NAMES, raw_frame, workbook_bytes  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Consultas que se reparten los clientes: (análisis, parámetros)
+QUERIES = [
+    ('top_selling_products', {'n': 10}),
+    ('top_selling_products', {'n': 50}),
+    ('client_share_of_sales', {}),
+    ('client_returns_count', {}),
+    ('top_selling_typologies', {'n': 5}),
+    ('get_sales_by_gender', {}),
+    ('client_reach', {'dimension': 'tipologia'}),
+    ('client_reach', {'dimension': 'localidad'}),
+    ('month_over_month', {'by': 'tipologia', 'n': 10}),
+    ('special_categories', {}),
+]
+
+
+class Client:
+    """Conexión keep-alive a la API."""
+
+    def __init__(self, url: str):
+        partes = urlsplit(url)
+        self.conn = http.client.HTTPConnection(partes.hostname, partes.port, timeout=300)
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None, content_type: str = "application/json") -> Tuple[int, bytes]:
+        headers = {"Content-Type": content_type} if body is not None else {}
+        self.conn.request(method, path, body=body, headers=headers)
+        resp = self.conn.getresponse()
+        return resp.status, resp.read()
+
+
+def _query_path(dataset: str, analisis: str, params: Dict, fmt: str) -> str:
+    qs = "&".join([f"{k}={v}" for k, v in params.items()] + [f"format={fmt}"])
+    return f"/datasets/{dataset}/{analisis}?{qs}"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local() -> Tuple[subprocess.Popen, str]:
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, "api.py", "--port", str(port), "--quiet"], cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(300):
+        try:
+            if Client(url).request("GET", "/health")[0] == 200:
+                return proc, url
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("La API local no arrancó")
+
+
+def _worker(url: str, dataset: str, requests: int, batch_size: int, seed: int,
+            resultados: Dict[str, List[float]], errores: List[str], lock: threading.Lock) -> None:
+    rng = random.Random(seed)
+    client = Client(url)
+    propios: Dict[str, List[float]] = {}
+    for _ in range(requests):
+        r = rng.random()
+        if r < 0.2:
+            tipo = f"lote x{batch_size}"
+            lote = [{'analysis': a, 'params': p} for a, p in rng.sample(QUERIES, batch_size)]
+            method, path, body = "POST", f"/datasets/{dataset}/batch", json.dumps({'queries': lote}).encode()
+        else:
+            fmt = "arrow" if r < 0.4 else "json"
+            analisis, params = rng.choice(QUERIES)
+            tipo, method, path, body = f"consulta {fmt}", "GET", _query_path(dataset, analisis, params, fmt), None
+        start = time.perf_counter()
+        try:
+            status, _ = client.request(method, path, body)
+        except OSError as e:
+            status, client = str(e), Client(url)
+        propios.setdefault(tipo, []).append(time.perf_counter() - start)
+        if status != 200:
+            with lock:
+                errores.append(f"{method} {path}: {status}")
+    with lock:
+        for tipo, tiempos in propios.items():
+            resultados.setdefault(tipo, []).extend(tiempos)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default=None, help="API ya levantada (por defecto se levanta una local)")
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="Pedidos por cliente")
+    parser.add_argument('--batch-size', type=int, default=5)
+    args = parser.parse_args()
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = start_local()
+    try:
+        client = Client(url)
+        libro = workbook_bytes(raw_frame('temporada', args.rows))
+        start = time.perf_counter()
+        status, body = client.request("POST", f"/datasets?nombre={FILE_NAMES['temporada']}", libro,
+                                      "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        if status != 201:
+            raise RuntimeError(f"No se pudo cargar el dataset: {status} {body[:500]!r}")
+        dataset = json.loads(body)['dataset']
+        print(f"Dataset de {args.rows:,} filas cargado en {time.perf_counter() - start:.2f} s ({dataset})\n")
+
+        print(f"{'análisis (en frío)':<48}{'ms':>10}")
+        for analisis, params in QUERIES:
+            start = time.perf_counter()
+            status, _ = client.request("GET", _query_path(dataset, analisis, params, "json"))
+            print(f"{analisis + ' ' + json.dumps(params):<48}{(time.perf_counter() - start) * 1000:>10.1f}"
+                  + ("" if status == 200 else f"  (HTTP {status})"))
+
+        resultados: Dict[str, List[float]] = {}
+        errores: List[str] = []
+        lock = threading.Lock()
+        hilos = [
+            threading.Thread(target=_worker, args=(url, dataset, args.requests, args.batch_size, i, resultados, errores, lock))
+            for i in range(args.clients)
+        ]
+        start = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        total = time.perf_counter() - start
+
+        pedidos = sum(len(t) for t in resultados.values())
+        print(f"\n{args.clients} clientes · {pedidos:,} pedidos en {total:.2f} s · {pedidos / total:,.0f} pedidos/s · "
+              f"{len(errores)} errores\n")
+        print(f"{'pedido':<20}{'n':>8}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}{'máx (ms)':>11}")
+        for tipo, tiempos in sorted(resultados.items()):
+            ms = np.array(tiempos) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            print(f"{tipo:<20}{len(ms):>8,}{p50:>11.1f}{p95:>11.1f}{p99:>11.1f}{ms.max():>11.1f}")
+        for error in errores[:10]:
+            print(f"  {error}")
+        if errores:
+            sys.exit(1)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == '__main__':
+    main()
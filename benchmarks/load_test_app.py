@@ -0,0 +1,308 @@
+"""
+Prueba de carga de la app con sesiones simuladas (streamlit.testing AppTest): N sesiones concurrentes
+en un mismo proceso recorren los flujos reales —subir un libro, abrir uno guardado, cambiar de análisis
+y escribir en los filtros de cliente y producto— contra el almacenamiento local (services/storage_local.py).
+Informa percentiles de latencia por rerun, CPU y memoria para cada cantidad de sesiones.
+
+Cada cantidad de sesiones corre en un proceso aparte, con el almacenamiento y el almacén Arrow vacíos:
+las caches que calienta una medición no favorecen a la siguiente. Dentro de un proceso las sesiones sí
+comparten el registro de datasets y la cache de resultados, como en una instancia real.
+
+Uso: python benchmarks/load_test_app.py [--sessions 1,2,4,8] [--rows 20000] [--datasets 2] [--switches 6]
+                                        [--keystrokes 4] [--storage-latency-ms 0] [--json resultados.json]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import raw_frame, workbook_bytes  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Análisis en el que se muestran los filtros de cliente y producto
+FILTER_ANALYSIS = "Productos más comprados por cliente"
+CLIENT_FILTER = "Filtrar por cliente (código o nombre)"
+PRODUCT_FILTER = "Filtrar por producto (código o nombre)"
+STORED_FILE = "Elegí un archivo"
+
+# Id de sesión de cada hilo: AppTest usa el mismo para todas, y la app lo usa para repartir
+# referencias en el registro de datasets y tareas de precálculo
+_sesion = threading.local()
+
+
+def _patch_runner() -> None:
+    """
+    Acerca AppTest a un servidor real con varias sesiones: cada una con su propio id, el script
+    compilado una sola vez para todas (compilar en paralelo rompe ast.parse en Python 3.11) y un
+    único Runtime, que AppTest pone y quita del singleton global en cada ejecución.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    original = LocalScriptRunner.__init__
+    compartido = {'script_cache': ScriptCache(), 'runtime': None}
+
+    def __init__(self, *args, **kwargs):
+        original(self, *args, **kwargs)
+        self._session_id = getattr(_sesion, 'id', self._session_id)
+        self._script_cache = compartido['script_cache']
+        if compartido['runtime'] is None:
+            compartido['runtime'] = Runtime._instance
+
+    Runtime.instance = classmethod(lambda cls: cls._instance or compartido['runtime'])
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or compartido['runtime'] is not None)
+    LocalScriptRunner.__init__ = __init__
+
+
+def _rss_mb() -> float:
+    # Memoria residente actual (Linux); en otros sistemas, el pico
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2**20 if sys.platform == "darwin" else pico / 1024
+
+
+def _cpu_seconds() -> float:
+    uso = resource.getrusage(resource.RUSAGE_SELF)
+    return uso.ru_utime + uso.ru_stime
+
+
+def _typed(texto: str, keystrokes: int) -> List[str]:
+    # Valores sucesivos del campo mientras se escribe (cada uno confirmado provoca un rerun)
+    return [texto[:k] for k in range(max(1, len(texto) - keystrokes + 1), len(texto) + 1)]
+
+
+class Session:
+    """Una sesión simulada: un AppTest propio y la latencia de cada rerun, por paso del flujo."""
+
+    def __init__(self, idx: int, libro: Tuple[str, bytes, Dict[str, str]], args: argparse.Namespace):
+        self.idx = idx
+        self.nombre, self.contenido, self.ejemplo = libro
+        self.args = args
+        self.rng = random.Random(idx)
+        self.tiempos: Dict[str, List[float]] = {}
+        self.errores: List[str] = []
+        self.at = None
+
+    def _paso(self, paso: str, accion) -> None:
+        start = time.perf_counter()
+        try:
+            accion()
+        except Exception as e:
+            self.errores.append(f"{paso}: {type(e).__name__}: {e}")
+            raise
+        self.tiempos.setdefault(paso, []).append(time.perf_counter() - start)
+        if self.at.exception:
+            self.errores.extend(f"{paso}: {e.value}" for e in self.at.exception)
+
+    def _campo(self, etiqueta: str):
+        # Los filtros no tienen key: se buscan por su etiqueta
+        campos = [t for t in self.at.text_input if t.label == etiqueta]
+        if not campos:
+            raise LookupError(f"No aparece el campo '{etiqueta}'")
+        return campos[0]
+
+    def _escribir(self, paso: str, etiqueta: str, texto: str) -> None:
+        for valor in _typed(texto, self.args.keystrokes):
+            self._paso(paso, lambda: self._campo(etiqueta).set_value(valor).run())
+
+    def _cambiar_analisis(self) -> None:
+        opciones = list(self.at.selectbox(key="analysis_type").options)
+        for opcion in self.rng.sample(opciones, min(self.args.switches, len(opciones))):
+            self._paso("cambiar análisis", lambda: self.at.selectbox(key="analysis_type").set_value(opcion).run())
+
+    def _filtrar(self) -> None:
+        self._paso("cambiar análisis", lambda: self.at.selectbox(key="analysis_type").set_value(FILTER_ANALYSIS).run())
+        self._escribir("filtro cliente", CLIENT_FILTER, self.ejemplo['cliente'])
+        self._escribir("filtro producto", PRODUCT_FILTER, self.ejemplo['producto'])
+        self._paso("filtro cliente", lambda: self._campo(CLIENT_FILTER).set_value("").run())
+        self._paso("filtro producto", lambda: self._campo(PRODUCT_FILTER).set_value("").run())
+
+    def run(self, barrera: threading.Barrier) -> None:
+        from streamlit.testing.v1 import AppTest
+
+        _sesion.id = f"carga-{self.idx}"
+        self.at = AppTest.from_file(APP, default_timeout=self.args.timeout)
+        barrera.wait()
+        try:
+            self._paso("inicio", self.at.run)
+            # Subir un libro y trabajar con él
+            self._paso("subir", lambda: self.at.file_uploader[0].upload(self.nombre, self.contenido, XLSX).run())
+            self._cambiar_analisis()
+            self._filtrar()
+            # Quitar el archivo y abrir uno guardado (puede ser el que subió otra sesión)
+            self._paso("quitar archivo", lambda: self.at.file_uploader[0].set_value(None).run())
+            guardados = [s for s in self.at.selectbox if s.label == STORED_FILE]
+            if not guardados or not guardados[0].options:
+                self.errores.append("abrir guardado: no hay archivos guardados")
+                return
+            elegido = self.rng.randrange(len(guardados[0].options))
+            self._paso("abrir guardado", lambda: guardados[0].select_index(elegido).run())
+            self._cambiar_analisis()
+            self._filtrar()
+        except Exception:
+            # El error ya quedó registrado; la sesión se abandona como la abandonaría el usuario
+            pass
+
+
+def _workbooks(args: argparse.Namespace) -> List[Tuple[str, bytes, Dict[str, str]]]:
+    libros = []
+    for i in range(args.datasets):
+        df = raw_frame('temporada', args.rows, seed=i)
+        # Un cliente y un producto del libro, para escribir en los filtros
+        fila = df.iloc[len(df) // 2]
+        ejemplo = {'cliente': str(fila['Nombre']), 'producto': str(fila['Descripción'])}
+        libros.append((f"temporada_sintetica_{i + 1}.xlsx", workbook_bytes(df), ejemplo))
+    return libros
+
+
+def run_level(sesiones: int, args: argparse.Namespace) -> Dict:
+    """Corre `sesiones` sesiones concurrentes en este proceso y devuelve latencias, CPU y memoria."""
+    from streamlit.testing.v1 import AppTest
+
+    _patch_runner()
+    libros = _workbooks(args)
+    # Una primera ejecución importa los módulos de la app: se mide una instancia ya levantada
+    _sesion.id = "calentamiento"
+    AppTest.from_file(APP, default_timeout=args.timeout).run()
+    rss_base = _rss_mb()
+
+    pool = [Session(i, libros[i % len(libros)], args) for i in range(sesiones)]
+    barrera = threading.Barrier(sesiones)
+    hilos = [threading.Thread(target=s.run, args=(barrera,)) for s in pool]
+    cpu_inicio = _cpu_seconds()
+    start = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    total = time.perf_counter() - start
+    cpu = _cpu_seconds() - cpu_inicio
+    rss_final = _rss_mb()
+
+    por_paso: Dict[str, List[float]] = {}
+    for s in pool:
+        for paso, tiempos in s.tiempos.items():
+            por_paso.setdefault(paso, []).extend(tiempos)
+    todos = [t for tiempos in por_paso.values() for t in tiempos]
+
+    def percentiles(tiempos: List[float]) -> Dict[str, float]:
+        ms = np.array(tiempos) * 1000
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+        return {'n': len(ms), 'p50': p50, 'p95': p95, 'p99': p99, 'max': float(ms.max()) if len(ms) else 0.0}
+
+    return {
+        'sesiones': sesiones,
+        'segundos': total,
+        'reruns': len(todos),
+        'latencia': percentiles(todos),
+        'pasos': {paso: percentiles(t) for paso, t in por_paso.items()},
+        'cpu_segundos': cpu,
+        'rss_base_mb': rss_base,
+        'rss_final_mb': rss_final,
+        'rss_pico_mb': _peak_rss_mb(),
+        'errores': [e for s in pool for e in s.errores],
+    }
+
+
+def _worker_args(args: argparse.Namespace) -> List[str]:
+    return [
+        '--rows', str(args.rows), '--datasets', str(args.datasets), '--switches', str(args.switches),
+        '--keystrokes', str(args.keystrokes), '--timeout', str(args.timeout),
+    ]
+
+
+def _run_isolated(sesiones: int, args: argparse.Namespace) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="carga_app_") as tmp:
+        env = dict(
+            os.environ,
+            RECOPILACION_STORAGE_BACKEND="local",
+            RECOPILACION_STORAGE_LOCAL_DIR=os.path.join(tmp, "storage"),
+            RECOPILACION_STORAGE_LOCAL_LATENCY_MS=str(args.storage_latency_ms),
+            RECOPILACION_DATASETS_ARROW_DIR=os.path.join(tmp, "datasets"),
+        )
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', str(sesiones)] + _worker_args(args),
+            cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        )
+    salida = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not salida:
+        raise RuntimeError(f"La medición con {sesiones} sesiones falló:\n{proc.stderr[-2000:]}")
+    return json.loads(salida[-1])
+
+
+def _print_results(resultados: List[Dict]) -> None:
+    print(f"{'sesiones':>8}{'reruns':>8}{'rerun/s':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}"
+          f"{'máx (ms)':>10}{'CPU (s)':>9}{'núcleos':>9}{'RSS pico':>10}{'MB/sesión':>11}{'errores':>9}")
+    for r in resultados:
+        lat = r['latencia']
+        print(f"{r['sesiones']:>8}{r['reruns']:>8}{r['reruns'] / r['segundos']:>9.1f}{lat['p50']:>10.0f}{lat['p95']:>10.0f}"
+              f"{lat['p99']:>10.0f}{lat['max']:>10.0f}{r['cpu_segundos']:>9.1f}{r['cpu_segundos'] / r['segundos']:>9.2f}"
+              f"{r['rss_pico_mb']:>10.0f}{(r['rss_final_mb'] - r['rss_base_mb']) / r['sesiones']:>11.1f}{len(r['errores']):>9}")
+
+    pasos = list(dict.fromkeys(p for r in resultados for p in r['pasos']))
+    print(f"\np95 por paso (ms)\n{'paso':<20}" + "".join(f"{str(r['sesiones']) + ' ses.':>10}" for r in resultados))
+    for paso in pasos:
+        print(f"{paso:<20}" + "".join(
+            f"{r['pasos'][paso]['p95']:>10.0f}" if paso in r['pasos'] else f"{'-':>10}" for r in resultados
+        ))
+    for r in resultados:
+        for error in r['errores'][:5]:
+            print(f"  [{r['sesiones']} sesiones] {error}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', default="1,2,4,8", help="Cantidades de sesiones concurrentes a medir")
+    parser.add_argument('--rows', type=int, default=20_000, help="Filas de cada libro")
+    parser.add_argument('--datasets', type=int, default=2, help="Libros distintos que se reparten las sesiones")
+    parser.add_argument('--switches', type=int, default=6, help="Cambios de análisis por libro abierto")
+    parser.add_argument('--keystrokes', type=int, default=4, help="Valores confirmados por filtro al escribir")
+    parser.add_argument('--storage-latency-ms', type=float, default=0, help="Demora simulada del almacenamiento")
+    parser.add_argument('--timeout', type=float, default=300, help="Máximo por rerun (s)")
+    parser.add_argument('--json', default=None, help="Guardar los resultados en este archivo")
+    parser.add_argument('--worker', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(run_level(args.worker, args), default=float))
+        return
+
+    niveles = [int(n) for n in args.sessions.split(',') if n.strip()]
+    print(f"Libros de {args.rows:,} filas · {args.datasets} distintos · niveles: {', '.join(map(str, niveles))} sesiones\n")
+    resultados = []
+    for n in niveles:
+        start = time.perf_counter()
+        resultados.append(_run_isolated(n, args))
+        print(f"  {n} sesiones medidas en {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    _print_results(resultados)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, ensure_ascii=False, indent=2, default=float)
+    if any(r['errores'] for r in resultados):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Generador de datos sintéticos con la forma de las exportaciones reales (temporada, locales y
+artículos más vendidos por mes), para benchmarks y pruebas de carga.
+
+Los códigos de artículo siguen las familias que reconoce add_typology_column: códigos de temporada
+de 7 dígitos, básicos B*, especiales (CIERRE, SORTEO, CH*, perfuminas) y otros; la popularidad de
+artículos y clientes sigue una ley de Zipf (pocos concentran muchas ventas) y una fracción de las
+filas son devoluciones.
+
+Uso: python benchmarks/synthetic.py --format temporada --rows 100000 --out temporada.xlsx
+"""
+import argparse
+import io
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Peso de cada familia de códigos en el catálogo de artículos
+CODE_MIX: Dict[str, float] = {
+    'temporada': 0.55,      # 7 dígitos: temporada(2) + género(1) + tipología(1) + modelo(3)
+    'basico': 0.25,         # B + género + tipología + modelo(2)
+    'numerico_corto': 0.04, # 4 a 6 dígitos (p. ej. 710091, accesorios)
+    'ch': 0.03,
+    'cierre': 0.02,
+    'sorteo': 0.01,
+    'perfuminas': 0.02,
+    'otros': 0.03,          # códigos con letra que no son básicos ni CH
+}
+
+LOCALIDADES = ['Neuquén', 'Cipolletti', 'Plottier', 'Centenario', 'Cinco Saltos', 'General Roca']
+
+FORMATS = ('temporada', 'locales', 'articulos_mes')
+
+# Nombres de archivo que detect_from_filename reconoce como cada formato
+FILE_NAMES = {
+    'temporada': 'temporada_sintetica.xlsx',
+    'locales': 'ventas_local_55.xlsx',
+    'articulos_mes': 'articulos_mas_vendidos_2024-06.xlsx',
+}
+
+# Filas de datos que entran en una hoja de Excel (más el encabezado)
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def _zipf_weights(n: int, skew: float) -> np.ndarray:
+    pesos = 1.0 / np.arange(1, n + 1) ** skew
+    return pesos / pesos.sum()
+
+
+def _catalog(rng: np.random.Generator, articulos: int, mix: Dict[str, float]) -> pd.DataFrame:
+    familias = np.array(list(mix))
+    pesos = np.array(list(mix.values()), dtype=float)
+    elegidas = rng.choice(familias, size=articulos, p=pesos / pesos.sum())
+    codigos, descripciones = [], []
+    for i, familia in enumerate(elegidas):
+        genero, tipologia = rng.integers(0, 4), rng.integers(0, 10)
+        if familia == 'temporada':
+            codigo = f"{rng.integers(10, 30)}{genero}{tipologia}{rng.integers(0, 1000):03d}"
+        elif familia == 'basico':
+            codigo = f"B{genero}{tipologia}{rng.integers(0, 100):02d}"
+        elif familia == 'numerico_corto':
+            codigo = str(rng.integers(1000, 1_000_000))
+        elif familia == 'ch':
+            codigo = f"CH{rng.integers(1, 100)}"
+        elif familia == 'cierre':
+            codigo = "CIERRE"
+        elif familia == 'sorteo':
+            codigo = "SORTEO"
+        elif familia == 'perfuminas':
+            codigo = str(rng.choice(["9310", "9309"]))
+        else:
+            codigo = f"{rng.choice(list('ACDEFGXZ'))}{rng.choice(list('ABXZ'))}{rng.integers(0, 100)}"
+        codigos.append(codigo)
+        descripciones.append(f"{familia.replace('_', ' ').capitalize()} {codigo} #{i}")
+    return pd.DataFrame({
+        'codigo': codigos,
+        'descripcion': descripciones,
+        'precio': rng.integers(5, 60, articulos) * 1000.0,
+    })
+
+
+def synthetic_sales(rows: int, clientes: int = 5000, articulos: int = 2000, seed: int = 0,
+                    mix: Optional[Dict[str, float]] = None, skew: float = 1.05, devoluciones: float = 0.05,
+                    meses: int = 12, desde: str = '2024-01-01') -> pd.DataFrame:
+    """
+    Ventas en columnas canónicas (como quedan después de canonicalize): cliente, nombre_cliente,
+    localidad, codigo_del_articulo, descripcion_del_producto, cantidad_vendida, total y fecha_de_la_venta.
+    """
+    rng = np.random.default_rng(seed)
+    catalogo = _catalog(rng, articulos, mix or CODE_MIX)
+    a = rng.choice(articulos, size=rows, p=_zipf_weights(articulos, skew))
+    c = rng.choice(clientes, size=rows, p=_zipf_weights(clientes, skew * 0.8))
+
+    cantidad = rng.integers(1, 10, rows).astype(float)
+    cantidad[rng.random(rows) < devoluciones] *= -1
+    inicio = pd.Timestamp(desde)
+    dias = (inicio + pd.DateOffset(months=meses) - inicio).days
+    # Cada cliente compra siempre en la misma localidad
+    localidad_cliente = rng.choice(np.array(LOCALIDADES, dtype=object), size=clientes,
+                                   p=_zipf_weights(len(LOCALIDADES), 1.0))
+    return pd.DataFrame({
+        'cliente': np.array([f"C{i}" for i in range(clientes)], dtype=object)[c],
+        'nombre_cliente': np.array([f"Cliente {i}" for i in range(clientes)], dtype=object)[c],
+        'localidad': localidad_cliente[c],
+        'codigo_del_articulo': catalogo['codigo'].to_numpy(dtype=object)[a],
+        'descripcion_del_producto': catalogo['descripcion'].to_numpy(dtype=object)[a],
+        'cantidad_vendida': cantidad,
+        'total': cantidad * catalogo['precio'].to_numpy()[a],
+        'fecha_de_la_venta': inicio + pd.to_timedelta(rng.integers(0, dias, rows), unit='D'),
+    })
+
+
+def raw_frame(fmt: str, rows: int, **kwargs) -> pd.DataFrame:
+    """Hoja con los encabezados de la exportación real de ese formato (antes de canonicalize)."""
+    ventas = synthetic_sales(rows, **kwargs)
+    if fmt == 'temporada':
+        return ventas.rename(columns={
+            'cliente': 'Cliente', 'nombre_cliente': 'Nombre', 'localidad': 'Localidad',
+            'codigo_del_articulo': 'Artículo', 'descripcion_del_producto': 'Descripción',
+            'cantidad_vendida': 'Unidades', 'total': 'Total', 'fecha_de_la_venta': 'Fecha',
+        })
+    if fmt == 'locales':
+        return ventas[['fecha_de_la_venta', 'codigo_del_articulo', 'descripcion_del_producto', 'cantidad_vendida', 'total']].rename(columns={
+            'fecha_de_la_venta': 'Fecha', 'codigo_del_articulo': 'Artículo',
+            'descripcion_del_producto': 'Descripción', 'cantidad_vendida': 'Cantidad', 'total': 'Total',
+        })
+    if fmt == 'articulos_mes':
+        # Ranking mensual ya agregado: una fila por artículo (rows = cantidad de filas vendidas de origen)
+        resumen = (
+            ventas.groupby(['codigo_del_articulo', 'descripcion_del_producto'], sort=False)['cantidad_vendida']
+            .sum().reset_index().sort_values('cantidad_vendida', ascending=False, kind='stable')
+        )
+        return resumen.rename(columns={
+            'codigo_del_articulo': 'Artículo', 'descripcion_del_producto': 'Descripción', 'cantidad_vendida': 'Unidades',
+        })
+    raise ValueError(f"Formato desconocido: {fmt} (usar {', '.join(FORMATS)})")
+
+
+def workbook_bytes(df: pd.DataFrame) -> bytes:
+    """xlsx en memoria. Una hoja de Excel no admite más de EXCEL_MAX_ROWS filas de datos."""
+    if len(df) > EXCEL_MAX_ROWS:
+        raise ValueError(f"{len(df):,} filas no entran en una hoja de Excel (máximo {EXCEL_MAX_ROWS:,})")
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    return buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--format', choices=FORMATS, default='temporada')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--clientes', type=int, default=5000)
+    parser.add_argument('--articulos', type=int, default=2000)
+    parser.add_argument('--skew', type=float, default=1.05)
+    parser.add_argument('--devoluciones', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help="Archivo .xlsx (por defecto, el nombre típico del formato)")
+    args = parser.parse_args()
+
+    df = raw_frame(args.format, args.rows, clientes=args.clientes, articulos=args.articulos,
+                   skew=args.skew, devoluciones=args.devoluciones, seed=args.seed)
+    out = args.out or FILE_NAMES[args.format]
+    with open(out, 'wb') as f:
+        f.write(workbook_bytes(df))
+    print(f"{out}: {len(df):,} filas, {os.path.getsize(out) / 1e6:.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
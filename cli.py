@@ -0,0 +1,103 @@
+"""
+Genera reportes en lote sin abrir la app: carga cada libro con DataRepository, corre los análisis
+elegidos y escribe los resultados en Parquet o CSV, un subdirectorio por archivo.
+
+Con --across, en lugar de un reporte por archivo corre consultas entre todos los archivos juntos
+(en DuckDB, en proceso) y escribe un resultado por consulta.
+
+Uso: python cli.py datos/*.xlsx --out reportes [--analyses top_selling_products,get_sales_by_gender]
+                   [--format csv] [--workers 4] [--top 20] [--out-of-core]
+     python cli.py datos/*.xlsx --out reportes --across units_by_typology_across,clients_in_every_locale
+"""
+import argparse
+import os
+import sys
+import time
+
+from functions.backends import BACKENDS, PANDAS_ANALYSES
+from functions.batch import OUTPUT_FORMATS, expand_inputs, run_across, run_batch
+
+# Nombres de duckdb_engine.ACROSS_QUERIES (duckdb se importa recién al usar --across)
+ACROSS_QUERIES = ('units_by_typology_across', 'clients_in_every_locale')
+
+
+def _parse_analyses(valor: str) -> list:
+    if valor in ('', 'todos', 'all'):
+        return list(PANDAS_ANALYSES)
+    nombres = [v.strip() for v in valor.split(',') if v.strip()]
+    desconocidos = [n for n in nombres if n not in PANDAS_ANALYSES]
+    if desconocidos:
+        raise argparse.ArgumentTypeError(
+            f"Análisis desconocidos: {', '.join(desconocidos)} (disponibles: {', '.join(PANDAS_ANALYSES)})"
+        )
+    return nombres
+
+
+def _parse_across(valor: str) -> list:
+    if valor in ('todos', 'all'):
+        return list(ACROSS_QUERIES)
+    nombres = [v.strip() for v in valor.split(',') if v.strip()]
+    desconocidas = [n for n in nombres if n not in ACROSS_QUERIES]
+    if not nombres or desconocidas:
+        raise argparse.ArgumentTypeError(
+            f"Consultas desconocidas: {', '.join(desconocidas) or valor} (disponibles: {', '.join(ACROSS_QUERIES)})"
+        )
+    return nombres
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('inputs', nargs='+', help="Archivos, directorios o patrones glob (xlsx/xls; csv con --out-of-core)")
+    parser.add_argument('--out', required=True, help="Directorio de salida")
+    parser.add_argument('--analyses', type=_parse_analyses, default='todos',
+                        help=f"Separados por coma (por defecto todos: {', '.join(PANDAS_ANALYSES)})")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='parquet')
+    parser.add_argument('--workers', type=int, default=None, help="Procesos en paralelo (por defecto, uno por CPU)")
+    parser.add_argument('--top', type=int, default=None, help="Filas de los rankings de productos y tipologías")
+    parser.add_argument('--backend', choices=BACKENDS, default=None)
+    parser.add_argument('--out-of-core', action='store_true',
+                        help="Procesar por bloques en disco (archivos más grandes que la memoria)")
+    parser.add_argument('--across', type=_parse_across, default=None,
+                        help=f"Consultas entre archivos, separadas por coma o 'todos' ({', '.join(ACROSS_QUERIES)})")
+    args = parser.parse_args()
+
+    archivos = expand_inputs(args.inputs, args.out_of_core)
+    if not archivos:
+        print("No se encontraron archivos para procesar.", file=sys.stderr)
+        sys.exit(2)
+
+    start = time.perf_counter()
+    if args.across:
+        print(f"{len(archivos)} archivos · consultas entre archivos: {', '.join(args.across)}")
+        for nombre, ruta in run_across(archivos, args.out, args.across, args.format).items():
+            print(f"{nombre}: {ruta}")
+        print(f"\n{len(archivos)} archivos en {time.perf_counter() - start:.1f} s")
+        return
+
+    print(f"{len(archivos)} archivos · análisis: {', '.join(args.analyses)}")
+
+    def progreso(hechos, total, report):
+        nombre = os.path.basename(report.archivo)
+        if report.error:
+            print(f"[{hechos}/{total}] {nombre}: ERROR {report.error}")
+            return
+        omitidos = f" · omitidos: {', '.join(report.omitidos)}" if report.omitidos else ""
+        print(f"[{hechos}/{total}] {nombre}: {report.filas:,} filas en {report.segundos:.1f} s"
+              f" ({report.filas / max(report.segundos, 1e-9):,.0f} filas/s){omitidos}")
+
+    reports = run_batch(archivos, args.out, args.analyses, args.format, args.top, args.backend,
+                        args.out_of_core, args.workers, progreso)
+
+    total = time.perf_counter() - start
+    filas = sum(r.filas for r in reports)
+    megas = sum(r.bytes for r in reports) / 1e6
+    errores = [r for r in reports if r.error]
+    print(f"\n{len(reports) - len(errores)}/{len(reports)} archivos en {total:.1f} s · "
+          f"{filas / total:,.0f} filas/s · {megas / total:.1f} MB/s · {len(reports) / total:.2f} archivos/s")
+    print(f"Resultados en {os.path.abspath(args.out)} (resumen.csv)")
+    if errores:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import io
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from functions.backends import analysis_functions
+from functions.client_analysis import REACH_DIMENSIONS, client_reach
+from functions.data_repo import DataRepository, load_prepared
+from functions.dataset_registry import dataset_registry
+from functions.result_cache import content_fingerprint, result_cache
+from functions.trend_analysis import month_over_month
+from functions.typology_analysis import get_special_categories_summary
+
+# Referencia con la que el servicio retiene sus datasets en el registro compartido
+SESSION_ID = "api"
+
+JSON = "application/json"
+ARROW = "application/vnd.apache.arrow.stream"
+FORMATS = {'json': JSON, 'arrow': ARROW}
+
+
+class ServiceError(Exception):
+    """Error de una consulta, con el código HTTP con el que se responde."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Payload:
+    """Respuesta ya serializada; se guarda así en la cache de resultados."""
+    body: bytes
+    content_type: str
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.body)
+
+
+def _special_categories(df: pd.DataFrame) -> pd.DataFrame:
+    resumen = get_special_categories_summary(df)
+    return pd.DataFrame(
+        [{'categoria': k, 'registros': v['cantidad'], 'unidades': v['unidades']} for k, v in resumen.items()],
+        columns=['categoria', 'registros', 'unidades'],
+    )
+
+
+def _analyses() -> Dict[str, Tuple[Callable[..., pd.DataFrame], Dict[str, type]]]:
+    # Nombre -> (función, parámetros que acepta y su tipo). Los cinco primeros usan el backend configurado.
+    base = analysis_functions()
+    return {
+        'top_selling_products': (base['top_selling_products'], {'n': int}),
+        'client_share_of_sales': (base['client_share_of_sales'], {}),
+        'client_returns_count': (base['client_returns_count'], {}),
+        'top_selling_typologies': (base['top_selling_typologies'], {'n': int}),
+        'get_sales_by_gender': (base['get_sales_by_gender'], {}),
+        'client_reach': (client_reach, {'dimension': str}),
+        'month_over_month': (month_over_month, {'by': str, 'desde': str, 'hasta': str, 'n': int}),
+        'special_categories': (_special_categories, {}),
+    }
+
+
+ANALYSES = _analyses()
+
+
+def describe() -> Dict[str, Any]:
+    """Análisis disponibles con sus parámetros (para GET /analyses)."""
+    return {
+        'analyses': {nombre: {p: t.__name__ for p, t in params.items()} for nombre, (_, params) in ANALYSES.items()},
+        'reach_dimensions': list(REACH_DIMENSIONS),
+        'formats': list(FORMATS),
+    }
+
+
+def load_dataset(nombre: str, content: bytes) -> Dict[str, Any]:
+    """
+    Carga un libro con DataRepository (o lo reabre del almacén Arrow si ya se ingirió) y lo deja
+    en memoria en el registro compartido. Devuelve su huella, que identifica al dataset en las consultas.
+    """
+    clave = content_fingerprint(content)
+    repo = DataRepository()
+    preparado = dataset_registry.acquire(clave, SESSION_ID, lambda: load_prepared(clave, lambda: repo.load_from_supabase_bytes(nombre, content)))
+    if preparado['df'] is None:
+        raise ServiceError(422, preparado['error'] or "No se pudo preparar el dataset")
+    return {'dataset': clave, 'nombre': nombre, **info(clave)}
+
+
+def _dataset(clave: str) -> pd.DataFrame:
+    preparado = dataset_registry.get(clave)
+    if preparado is None:
+        # Desalojado de memoria: si sigue en el almacén Arrow del host se reabre sin volver a parsear
+        def sin_archivo():
+            raise ServiceError(404, f"Dataset desconocido: {clave} (cargalo con POST /datasets)")
+        preparado = dataset_registry.acquire(clave, SESSION_ID, lambda: load_prepared(clave, sin_archivo))
+    if preparado['df'] is None:
+        raise ServiceError(404, f"Dataset desconocido: {clave}")
+    dataset_registry.touch(clave, SESSION_ID)
+    return preparado['df']
+
+
+def info(clave: str) -> Dict[str, Any]:
+    df = _dataset(clave)
+    preparado = dataset_registry.get(clave)
+    return {'filas': len(df), 'columnas': [str(c) for c in df.columns], 'meses': preparado['meses']}
+
+
+def _coerce_params(nombre: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    if nombre not in ANALYSES:
+        raise ServiceError(404, f"Análisis desconocido: {nombre} (disponibles: {', '.join(ANALYSES)})")
+    tipos = ANALYSES[nombre][1]
+    desconocidos = [p for p in params if p not in tipos]
+    if desconocidos:
+        raise ServiceError(400, f"Parámetros no válidos para {nombre}: {', '.join(desconocidos)}")
+    try:
+        return {p: tipos[p](v) for p, v in params.items() if v not in (None, "")}
+    except (TypeError, ValueError):
+        raise ServiceError(400, f"Parámetros mal formados para {nombre}: {params}")
+
+
+def _arrow_bytes(df: pd.DataFrame) -> bytes:
+    import pyarrow as pa
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columnas de texto con tipos mezclados (códigos numéricos y alfanuméricos)
+        texto = {c: df[c].map(lambda v: v if pd.isna(v) else str(v)) for c in df.columns if df[c].dtype == object}
+        table = pa.Table.from_pandas(df.assign(**texto), preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _compute(clave: str, nombre: str, params: Dict[str, Any]) -> pd.DataFrame:
+    func = ANALYSES[nombre][0]
+    try:
+        return func(_dataset(clave), **params)
+    except ServiceError:
+        raise
+    except KeyError as e:
+        raise ServiceError(422, f"{nombre} no aplica a este dataset: falta la columna {e}")
+    except ValueError as e:
+        raise ServiceError(400, str(e))
+
+
+def run(clave: str, nombre: str, params: Dict[str, Any], fmt: str = 'json') -> Payload:
+    """
+    Resultado serializado de un análisis sobre el dataset. Se cachea por dataset, análisis,
+    parámetros y formato: una consulta repetida no recalcula ni vuelve a serializar.
+    """
+    if fmt not in FORMATS:
+        raise ServiceError(400, f"Formato no válido: {fmt} (usar {', '.join(FORMATS)})")
+    params = _coerce_params(nombre, params)
+    key = ('api', clave, nombre, tuple(sorted(params.items())), fmt)
+    cached = result_cache.get(key)
+    if cached is not result_cache._MISSING:
+        dataset_registry.touch(clave, SESSION_ID)
+        return cached
+
+    df = _compute(clave, nombre, params)
+    if fmt == 'arrow':
+        payload = Payload(_arrow_bytes(df), ARROW)
+    else:
+        # El resultado va como {"columns", "data"}; se arma el JSON por partes para no serializarlo dos veces
+        cabecera = json.dumps({'dataset': clave, 'analysis': nombre, 'params': params}, ensure_ascii=False)[:-1]
+        resultado = df.to_json(orient='split', index=False, date_format='iso', force_ascii=False)
+        payload = Payload(f'{cabecera}, "result": {resultado}}}'.encode('utf-8'), JSON)
+    result_cache.put(key, payload)
+    return payload
+
+
+def run_batch(clave: str, queries: List[Dict[str, Any]]) -> Payload:
+    """
+    Varias consultas sobre el mismo dataset en un solo pedido (siempre JSON). Cada consulta es
+    {'analysis': nombre, 'params': {...}}; una que falla devuelve su error sin frenar a las demás.
+    """
+    if not isinstance(queries, list) or not queries:
+        raise ServiceError(400, "El lote debe ser una lista no vacía de consultas")
+    _dataset(clave)
+    partes = []
+    for consulta in queries:
+        try:
+            if not isinstance(consulta, dict) or 'analysis' not in consulta:
+                raise ServiceError(400, "Cada consulta necesita 'analysis'")
+            payload = run(clave, consulta['analysis'], consulta.get('params') or {}, 'json')
+            # El JSON cacheado de cada consulta se inserta tal cual, sin decodificarlo
+            partes.append(b'{"status": 200, ' + payload.body[1:])
+        except ServiceError as e:
+            error = {'status': e.status, 'analysis': consulta.get('analysis') if isinstance(consulta, dict) else None, 'error': str(e)}
+            partes.append(json.dumps(error, ensure_ascii=False).encode('utf-8'))
+    cabecera = json.dumps({'dataset': clave})[:-1].encode('utf-8')
+    return Payload(cabecera + b', "results": [' + b', '.join(partes) + b']}', JSON)
+
+
+def loaded() -> List[str]:
+    """Huellas de los datasets que el servicio tiene cargados y siguen en memoria."""
+    return dataset_registry.held_by(SESSION_ID)
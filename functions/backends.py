@@ -0,0 +1,40 @@
+import warnings
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from functions.client_analysis import client_share_of_sales, client_returns_count
+from functions.product_analysis import top_selling_products
+from functions.typology_analysis import top_selling_typologies, get_sales_by_gender
+from utils.settings import get_setting
+
+BACKENDS = ('pandas', 'polars')
+
+PANDAS_ANALYSES: Dict[str, Callable[..., pd.DataFrame]] = {
+    'top_selling_products': top_selling_products,
+    'client_share_of_sales': client_share_of_sales,
+    'client_returns_count': client_returns_count,
+    'top_selling_typologies': top_selling_typologies,
+    'get_sales_by_gender': get_sales_by_gender,
+}
+
+
+def selected_backend() -> str:
+    """Backend configurado para el despliegue (opción analysis.backend), 'pandas' por defecto."""
+    backend = str(get_setting("analysis", "backend", "pandas")).strip().lower()
+    return backend if backend in BACKENDS else 'pandas'
+
+
+def analysis_functions(backend: Optional[str] = None) -> Dict[str, Callable[..., pd.DataFrame]]:
+    """
+    Funciones de análisis del backend pedido (o el configurado), con las mismas firmas y
+    esquemas de salida que las de pandas. Si Polars no está instalado se usa pandas.
+    """
+    backend = backend or selected_backend()
+    if backend == 'polars':
+        try:
+            from functions.polars_backend import POLARS_ANALYSES
+            return POLARS_ANALYSES
+        except ImportError:
+            warnings.warn("Backend 'polars' configurado pero polars no está instalado; se usa pandas.")
+    return PANDAS_ANALYSES
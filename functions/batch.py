@@ -0,0 +1,190 @@
+import glob
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from utils.settings import get_setting
+
+# Extensiones que se toman al recorrer un directorio (csv solo se puede procesar por bloques)
+EXTENSIONS = ('.xlsx', '.xls')
+OUT_OF_CORE_EXTENSIONS = EXTENSIONS + ('.csv',)
+
+OUTPUT_FORMATS = ('parquet', 'csv')
+
+# Análisis que aceptan la cantidad de filas del ranking
+_TOP_N_ANALYSES = {'top_selling_products', 'top_selling_typologies'}
+
+
+@dataclass
+class FileReport:
+    """Resultado de procesar un archivo: qué se escribió, cuánto tardó y qué análisis no se pudieron correr."""
+    archivo: str
+    filas: int = 0
+    bytes: int = 0
+    segundos: float = 0.0
+    salidas: Dict[str, str] = field(default_factory=dict)
+    omitidos: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+def expand_inputs(inputs: Iterable[str], out_of_core: bool = False) -> List[str]:
+    """Archivos a procesar a partir de rutas, directorios (sin recursión) o patrones glob, sin repetir."""
+    extensiones = OUT_OF_CORE_EXTENSIONS if out_of_core else EXTENSIONS
+    archivos = []
+    for entrada in inputs:
+        if os.path.isdir(entrada):
+            candidatos = sorted(os.path.join(entrada, nombre) for nombre in os.listdir(entrada))
+        else:
+            candidatos = sorted(glob.glob(entrada)) or [entrada]
+        for ruta in candidatos:
+            # Los temporales de Excel (~$archivo.xlsx) no son libros válidos
+            if os.path.isfile(ruta) and ruta.lower().endswith(extensiones) and not os.path.basename(ruta).startswith('~$'):
+                archivos.append(os.path.abspath(ruta))
+    return list(dict.fromkeys(archivos))
+
+
+def _write(df: pd.DataFrame, path: str, fmt: str) -> str:
+    if fmt == 'csv':
+        path += '.csv'
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+        return path
+    path += '.parquet'
+    try:
+        df.to_parquet(path, index=False)
+    except Exception:
+        # Columnas de texto con valores mezclados (códigos numéricos y alfanuméricos): Parquet exige un solo tipo
+        texto = {c: df[c].map(lambda v: v if pd.isna(v) else str(v)) for c in df.columns if df[c].dtype == object}
+        df.assign(**texto).to_parquet(path, index=False)
+    return path
+
+
+def _analysis_functions(backend: Optional[str], out_of_core: bool) -> Dict[str, Callable[..., pd.DataFrame]]:
+    if out_of_core:
+        from functions.out_of_core import CHUNKED_ANALYSES
+        return CHUNKED_ANALYSES
+    from functions.backends import analysis_functions
+    return analysis_functions(backend)
+
+
+def process_file(path: str, out_dir: str, analyses: List[str], fmt: str = 'parquet', top_n: Optional[int] = None,
+                 backend: Optional[str] = None, out_of_core: bool = False) -> FileReport:
+    """
+    Carga un archivo con DataRepository (o por bloques con out_of_core), corre los análisis pedidos y
+    escribe cada resultado en out_dir/<análisis>.<fmt>. Un análisis que no aplica al formato del
+    archivo (p. ej. clientes en un archivo de locales) queda en 'omitidos' y no frena a los demás.
+    """
+    report = FileReport(archivo=path, bytes=os.path.getsize(path))
+    start = time.perf_counter()
+    chunks_dir = None
+    try:
+        funcs = _analysis_functions(backend, out_of_core)
+        if out_of_core:
+            from functions.out_of_core import convert_to_chunks
+            dataset = convert_to_chunks(path)
+            chunks_dir = dataset.directory
+            report.filas = dataset.filas
+        else:
+            from functions.data_repo import DataRepository, prepare_dataset
+            with open(path, 'rb') as f:
+                df = DataRepository().load_from_supabase_bytes(os.path.basename(path), f.read())
+            preparado = prepare_dataset(df)
+            if preparado['df'] is None:
+                raise ValueError(preparado['error'])
+            dataset = preparado['df']
+            report.filas = len(dataset)
+
+        os.makedirs(out_dir, exist_ok=True)
+        for nombre in analyses:
+            kwargs = {'n': top_n} if top_n and nombre in _TOP_N_ANALYSES else {}
+            try:
+                resultado = funcs[nombre](dataset, **kwargs)
+            except Exception as e:
+                report.omitidos[nombre] = f"{type(e).__name__}: {e}"
+                continue
+            report.salidas[nombre] = _write(resultado, os.path.join(out_dir, nombre), fmt)
+    except Exception as e:
+        report.error = f"{type(e).__name__}: {e}"
+    finally:
+        if chunks_dir is not None:
+            shutil.rmtree(chunks_dir, ignore_errors=True)
+        report.segundos = time.perf_counter() - start
+    return report
+
+
+def _output_dirs(archivos: List[str], out_dir: str) -> Dict[str, str]:
+    # Un subdirectorio por archivo con su nombre; si dos archivos se llaman igual se numeran
+    usados: Dict[str, int] = {}
+    destinos = {}
+    for ruta in archivos:
+        base = os.path.splitext(os.path.basename(ruta))[0]
+        usados[base] = usados.get(base, 0) + 1
+        destinos[ruta] = os.path.join(out_dir, base if usados[base] == 1 else f"{base}_{usados[base]}")
+    return destinos
+
+
+def _read_file(path: str) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def run_across(archivos: List[str], out_dir: str, queries: List[str], fmt: str = 'parquet') -> Dict[str, str]:
+    """
+    Consultas entre archivos (duckdb_engine.ACROSS_QUERIES) sobre todos los archivos juntos: cada uno
+    se registra en un catálogo DuckDB en proceso y cada consulta escribe out_dir/<consulta>.<fmt>.
+    El tipo de cada archivo (temporada, locales:<local>) sale de su nombre, como al subirlo en la app.
+    Devuelve {consulta: ruta escrita}.
+    """
+    from functions.duckdb_engine import ACROSS_QUERIES, DuckDBCatalog
+    from utils.format_detect import detect_from_filename
+
+    rows = [
+        {'original_name': os.path.basename(ruta), 'storage_key': ruta,
+         'file_type': detect_from_filename(os.path.basename(ruta))}
+        for ruta in archivos
+    ]
+    catalog = DuckDBCatalog()
+    catalog.build_from_files(rows, _read_file)
+    os.makedirs(out_dir, exist_ok=True)
+    return {nombre: _write(ACROSS_QUERIES[nombre](catalog), os.path.join(out_dir, nombre), fmt) for nombre in queries}
+
+
+def run_batch(archivos: List[str], out_dir: str, analyses: List[str], fmt: str = 'parquet', top_n: Optional[int] = None,
+              backend: Optional[str] = None, out_of_core: bool = False, workers: Optional[int] = None,
+              on_progress: Optional[Callable[[int, int, FileReport], None]] = None) -> List[FileReport]:
+    """
+    Procesa los archivos en paralelo, uno por proceso del pool (el parseo de Excel no libera el GIL),
+    y deja en out_dir un subdirectorio por archivo más resumen.csv con una fila por archivo.
+    `on_progress(hechos, total, reporte)` se llama a medida que termina cada archivo.
+    """
+    workers = workers or int(get_setting("batch", "workers", 0)) or os.cpu_count() or 1
+    destinos = _output_dirs(archivos, out_dir)
+    reports = []
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(archivos) or 1))) as pool:
+        futuros = [
+            pool.submit(process_file, ruta, destinos[ruta], analyses, fmt, top_n, backend, out_of_core)
+            for ruta in archivos
+        ]
+        for hechos, futuro in enumerate(as_completed(futuros), start=1):
+            report = futuro.result()
+            reports.append(report)
+            if on_progress is not None:
+                on_progress(hechos, len(archivos), report)
+
+    # El resumen respeta el orden de entrada, no el de finalización
+    orden = {ruta: i for i, ruta in enumerate(archivos)}
+    reports.sort(key=lambda r: orden[r.archivo])
+    os.makedirs(out_dir, exist_ok=True)
+    resumen = pd.DataFrame([
+        dict(asdict(r), salidas=len(r.salidas), omitidos="; ".join(f"{k} ({v})" for k, v in r.omitidos.items()))
+        for r in reports
+    ])
+    resumen.to_csv(os.path.join(out_dir, "resumen.csv"), index=False, encoding='utf-8-sig')
+    return reports
@@ -1,4 +1,14 @@
 import pandas as pd
+import numpy as np
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+from functions.result_cache import memoize_by_fingerprint
+from functions.sketches import REACH_DIMENSIONS, build_reach_sketches, approximate_reach, exact_reach
+from utils.settings import get_setting
+
+if TYPE_CHECKING:
+    # scipy se importa recién al armar la matriz cliente × artículo (tarda en cargar y no hace falta al arrancar)
+    from scipy import sparse
 
 def products_bought_by_client(df: pd.DataFrame, client: str, n: int = 10) -> pd.DataFrame:
     """
@@ -8,8 +18,9 @@ def products_bought_by_client(df: pd.DataFrame, client: str, n: int = 10) -> pd.
     df['cliente'] = df['cliente'].astype(str).fillna("")
     filtered = df[df['cliente'].str.lower() == client.lower()]
     result = filtered.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
-    return result.sort_values('cantidad_vendida', ascending=False).head(n)
+    return result.sort_values('cantidad_vendida', ascending=False, kind='stable').head(n)
 
+@memoize_by_fingerprint
 def client_share_of_sales(df: pd.DataFrame) -> pd.DataFrame:
     """
     Devuelve el peso (porcentaje) de cada cliente sobre el total neto de unidades vendidas.
@@ -42,7 +53,7 @@ def client_share_of_sales(df: pd.DataFrame) -> pd.DataFrame:
     resumen['porcentaje'] = 100 * resumen['cantidad_vendida'] / total_unidades if total_unidades > 0 else 0
     
     # Ordenar por cantidad vendida y agregar ranking
-    resumen = resumen.sort_values('cantidad_vendida', ascending=False).reset_index(drop=True)
+    resumen = resumen.sort_values('cantidad_vendida', ascending=False, kind='stable').reset_index(drop=True)
     resumen.insert(0, 'Ranking', range(1, len(resumen) + 1))
     
     # Formatear porcentaje
@@ -53,6 +64,7 @@ def client_share_of_sales(df: pd.DataFrame) -> pd.DataFrame:
     
     return resumen
 
+@memoize_by_fingerprint
 def client_returns_count(df: pd.DataFrame) -> pd.DataFrame:
     """
     Devuelve la cantidad de devoluciones por cliente con porcentaje, nombre del cliente, localidad y ranking.
@@ -119,7 +131,7 @@ def client_returns_count(df: pd.DataFrame) -> pd.DataFrame:
     result['porcentaje_devolucion'] = result['porcentaje_devolucion'].fillna(0)
     
     # Ordenar por porcentaje de devoluciones (mayor a menor) y agregar ranking
-    result = result.sort_values('porcentaje_devolucion', ascending=False).reset_index(drop=True)
+    result = result.sort_values('porcentaje_devolucion', ascending=False, kind='stable').reset_index(drop=True)
     result.insert(0, 'Ranking', range(1, len(result) + 1))
     
     # Formatear porcentaje
@@ -135,4 +147,158 @@ def client_returns_count(df: pd.DataFrame) -> pd.DataFrame:
     
     result = result[columns_to_include]
     
-    return result 
\ No newline at end of file
+    return result 
+
+@dataclass
+class ClientArticleMatrix:
+    """
+    Matriz dispersa cliente × artículo con las unidades netas compradas (solo ventas normales).
+    Se construye una vez por dataset y se reutiliza en todas las consultas.
+    """
+    cantidades: "sparse.csr_matrix"    # unidades netas por cliente (filas) y artículo (columnas)
+    normalizada: "sparse.csr_matrix"   # filas con norma L2 = 1, para similitud coseno
+    compras: "sparse.csc_matrix"       # 1 si el cliente compró el artículo, por columnas para co-ocurrencia
+    clientes: pd.Index
+    articulos: pd.Index
+    nombres_cliente: Optional[pd.Series] = None
+    descripciones: Optional[pd.Series] = None
+
+@memoize_by_fingerprint
+def build_client_article_matrix(df: pd.DataFrame) -> ClientArticleMatrix:
+    """
+    Construye la matriz dispersa cliente × artículo a partir del DataFrame canónico.
+    Solo cuenta ventas normales; las devoluciones se netean y los saldos negativos quedan en 0.
+    """
+    from scipy import sparse
+
+    if 'cuenta_ventas' in df.columns:
+        df_ventas = df[df['cuenta_ventas'] == True]
+    else:
+        df_ventas = df
+    df_ventas = df_ventas.dropna(subset=['cliente', 'codigo_del_articulo', 'cantidad_vendida'])
+
+    filas, clientes = pd.factorize(df_ventas['cliente'].astype(str), sort=True)
+    columnas, articulos = pd.factorize(df_ventas['codigo_del_articulo'].astype(str), sort=True)
+    valores = df_ventas['cantidad_vendida'].to_numpy(dtype=np.float64)
+
+    # coo -> csr suma los duplicados (mismo cliente y artículo en varias filas)
+    cantidades = sparse.coo_matrix(
+        (valores, (filas, columnas)), shape=(len(clientes), len(articulos))
+    ).tocsr()
+    cantidades.sum_duplicates()
+    cantidades.data = np.maximum(cantidades.data, 0)
+    cantidades.eliminate_zeros()
+
+    # Normalizar filas para que el producto punto sea directamente la similitud coseno
+    normas = np.sqrt(np.asarray(cantidades.multiply(cantidades).sum(axis=1)).ravel())
+    normas[normas == 0] = 1
+    normalizada = sparse.diags(1 / normas) @ cantidades
+
+    compras = cantidades.copy()
+    compras.data = np.ones_like(compras.data)
+
+    nombres_cliente = None
+    if 'nombre_cliente' in df_ventas.columns:
+        nombres_cliente = df_ventas.groupby('cliente')['nombre_cliente'].first()
+    descripciones = None
+    if 'descripcion_del_producto' in df_ventas.columns:
+        descripciones = df_ventas.groupby('codigo_del_articulo')['descripcion_del_producto'].first()
+
+    return ClientArticleMatrix(
+        cantidades=cantidades,
+        normalizada=normalizada.tocsr(),
+        compras=compras.tocsc(),
+        clientes=pd.Index(clientes),
+        articulos=pd.Index(articulos),
+        nombres_cliente=nombres_cliente,
+        descripciones=descripciones,
+    )
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Índices de los k valores más altos, ordenados de mayor a menor (sin ordenar todo el vector)."""
+    if k <= 0 or scores.size == 0:
+        return np.array([], dtype=int)
+    k = min(k, scores.size)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx], kind='stable')]
+
+def similar_clients(matrix: ClientArticleMatrix, client: str, n: int = 10) -> pd.DataFrame:
+    """
+    Devuelve los n clientes que más se parecen a `client` por lo que compran (similitud coseno
+    sobre las unidades por artículo), con la cantidad de artículos en común y ranking.
+    """
+    columns = ['Ranking', 'cliente', 'similitud', 'articulos_en_comun', 'Similitud']
+    if matrix.nombres_cliente is not None:
+        columns.insert(2, 'nombre_cliente')
+    if client not in matrix.clientes:
+        return pd.DataFrame(columns=columns)
+
+    i = matrix.clientes.get_loc(client)
+    # Una sola multiplicación dispersa: similitud de la fila i contra todos los clientes
+    scores = (matrix.normalizada @ matrix.normalizada[i].T).toarray().ravel()
+    scores[i] = 0
+    candidatos = _top_k(scores, n)
+    candidatos = candidatos[scores[candidatos] > 0]
+
+    filas = (matrix.cantidades[candidatos] > 0).astype(np.float64)
+    en_comun = (filas @ (matrix.cantidades[i] > 0).astype(np.float64).T).toarray().ravel()
+
+    result = pd.DataFrame({
+        'cliente': matrix.clientes[candidatos],
+        'similitud': scores[candidatos],
+        'articulos_en_comun': en_comun.astype(int),
+    })
+    if matrix.nombres_cliente is not None:
+        result.insert(1, 'nombre_cliente', matrix.nombres_cliente.reindex(result['cliente']).to_numpy())
+    result.insert(0, 'Ranking', range(1, len(result) + 1))
+    result['Similitud'] = result['similitud'].apply(lambda x: f"{x * 100:.1f}%")
+    return result[columns]
+
+def co_purchased_articles(matrix: ClientArticleMatrix, article: str, n: int = 10) -> pd.DataFrame:
+    """
+    Devuelve los n artículos que más se compran junto con `article`: cuántos de sus clientes
+    también compraron cada otro artículo y qué porcentaje representan.
+    """
+    columns = ['Ranking', 'codigo_del_articulo', 'clientes_en_comun', 'Porcentaje de clientes']
+    if matrix.descripciones is not None:
+        columns.insert(2, 'descripcion_del_producto')
+    if article not in matrix.articulos:
+        return pd.DataFrame(columns=columns)
+
+    j = matrix.articulos.get_loc(article)
+    columna = matrix.compras[:, j]
+    total_clientes = columna.nnz
+    # Co-ocurrencia del artículo j con todos los demás en una sola multiplicación dispersa
+    co = (matrix.compras.T @ columna).toarray().ravel()
+    co[j] = 0
+    candidatos = _top_k(co, n)
+    candidatos = candidatos[co[candidatos] > 0]
+
+    result = pd.DataFrame({
+        'codigo_del_articulo': matrix.articulos[candidatos],
+        'clientes_en_comun': co[candidatos].astype(int),
+    })
+    if matrix.descripciones is not None:
+        result.insert(1, 'descripcion_del_producto', matrix.descripciones.reindex(result['codigo_del_articulo']).to_numpy())
+    result.insert(0, 'Ranking', range(1, len(result) + 1))
+    porcentaje = 100 * result['clientes_en_comun'] / total_clientes if total_clientes > 0 else 0
+    result['Porcentaje de clientes'] = pd.Series(porcentaje, index=result.index).apply(lambda x: f"{x:.1f}%")
+    return result[columns]
+
+
+# Hasta esta cantidad de filas el alcance de clientes se calcula exacto (nunique)
+REACH_EXACT_MAX_ROWS = 200_000
+
+@memoize_by_fingerprint
+def client_reach(df: pd.DataFrame, dimension: str = 'tipologia') -> pd.DataFrame:
+    """
+    Alcance de clientes: cuántos clientes distintos compraron cada artículo, tipología, género o
+    localidad (ver REACH_DIMENSIONS). En datasets chicos es exacto; en los grandes usa HyperLogLog
+    y 'margen' indica el error típico (±) de cada estimación.
+    """
+    if dimension not in REACH_DIMENSIONS:
+        raise ValueError(f"Dimensión de alcance desconocida: {dimension}")
+    max_rows = int(get_setting("sketches", "exact_max_rows", REACH_EXACT_MAX_ROWS))
+    if len(df) <= max_rows:
+        return exact_reach([df], dimension)
+    return approximate_reach([build_reach_sketches(df)], dimension)
@@ -6,9 +6,15 @@ from functions.parsers.temporada import parse_temporada
 from functions.parsers.locales import parse_locales
 from functions.parsers.articulos_mes import parse_articulos_mes
 from functions.schemas import canonicalize
+from functions.result_cache import content_fingerprint, get_fingerprint, set_fingerprint, derive_fingerprint
+from functions.typology_analysis import add_typology_column
+from functions.trend_analysis import precompute_monthly
+from functions import arrow_store, sketches
+from utils import metrics, tracing
 
-@st.cache_data(show_spinner=False)
-def _cache_df(key: str, content: bytes) -> pd.DataFrame:
+def _read_excel_bytes(key: str, content: bytes) -> pd.DataFrame:
+    # Sin st.cache_data: el dataset ya parseado se comparte entre sesiones en dataset_registry
+    # y cachear también el crudo duplicaba el archivo en memoria por cada versión abierta
     bio = io.BytesIO(content)
     name_lower = str(key).lower()
     try:
@@ -35,43 +41,122 @@ class DataRepository:
         pass
 
     def _parse_by_format(self, df: pd.DataFrame, filename: str | None = None) -> pd.DataFrame:
-        fmt = detect_format_smart(df, filename)
-        if fmt == 'temporada':
-            return parse_temporada(df)
-        if fmt == 'articulos_mes':
-            return parse_articulos_mes(df)
-        if fmt == 'locales' or fmt.startswith('locales:'):
-            return parse_locales(df)
-        # fallback: canonical base
-        df, missing = canonicalize(df)
-        if missing:
-            raise ValueError(f"Formato desconocido. Columnas faltantes: {missing}")
-        df['cuenta_ventas'] = True
-        return df
+        with tracing.span("detectar_formato") as span:
+            fmt = detect_format_smart(df, filename)
+            if span is not None:
+                span.atributos['formato'] = fmt
+        # 'locales:55' y 'locales' se cuentan juntos: una serie por formato, no por local
+        formato = fmt.split(':')[0]
+        metrics.ROWS_PARSED.inc(len(df), formato=formato)
+        with tracing.span("parsear", formato=fmt, filas=len(df)), metrics.PARSE_SECONDS.time(formato=formato):
+            if fmt == 'temporada':
+                return parse_temporada(df)
+            if fmt == 'articulos_mes':
+                return parse_articulos_mes(df)
+            if fmt == 'locales' or fmt.startswith('locales:'):
+                return parse_locales(df)
+            # fallback: canonical base
+            df, missing = canonicalize(df)
+            if missing:
+                raise ValueError(f"Formato desconocido. Columnas faltantes: {missing}")
+            df['cuenta_ventas'] = True
+            return df
 
     def load_from_upload(self, uploaded_file) -> pd.DataFrame:
         # leer con pandas directo (streamlit UploadedFile)
         name_lower = uploaded_file.name.lower()
-        try:
-            if name_lower.endswith('.xlsx'):
-                df = pd.read_excel(uploaded_file, engine='openpyxl')
-            else:
-                # .xls: intentar xlrd; si no está instalado, informar claramente
-                try:
-                    df = pd.read_excel(uploaded_file, engine='xlrd')
-                except ImportError:
-                    st.error("No se pudo leer .xls: falta 'xlrd==1.2.0' en el entorno. Convertí el archivo a .xlsx o subí .xlsx.")
-                    raise
-        except Exception:
-            # fallback cruzado: intentar el otro engine por si la extensión engaña
-            uploaded_file.seek(0)
+        with tracing.span("leer_excel", archivo=uploaded_file.name, bytes=uploaded_file.size):
             try:
-                df = pd.read_excel(uploaded_file, engine='openpyxl')
+                if name_lower.endswith('.xlsx'):
+                    df = pd.read_excel(uploaded_file, engine='openpyxl')
+                else:
+                    # .xls: intentar xlrd; si no está instalado, informar claramente
+                    try:
+                        df = pd.read_excel(uploaded_file, engine='xlrd')
+                    except ImportError:
+                        st.error("No se pudo leer .xls: falta 'xlrd==1.2.0' en el entorno. Convertí el archivo a .xlsx o subí .xlsx.")
+                        raise
             except Exception:
+                # fallback cruzado: intentar el otro engine por si la extensión engaña
                 uploaded_file.seek(0)
-                df = pd.read_excel(uploaded_file, engine='xlrd')
-        return self._parse_by_format(df, getattr(uploaded_file, 'name', None))
+                try:
+                    df = pd.read_excel(uploaded_file, engine='openpyxl')
+                except Exception:
+                    uploaded_file.seek(0)
+                    df = pd.read_excel(uploaded_file, engine='xlrd')
+        df = self._parse_by_format(df, getattr(uploaded_file, 'name', None))
+        return set_fingerprint(df, content_fingerprint(uploaded_file.getvalue()))
 
     def load_from_supabase_bytes(self, original_name: str, content: bytes) -> pd.DataFrame:
-        df = _cache_df(original_name, content)
-        return self._parse_by_format(df, original_name)
+        with tracing.span("leer_excel", archivo=original_name, bytes=len(content)):
+            df = _read_excel_bytes(original_name, content)
+        df = self._parse_by_format(df, original_name)
+        return set_fingerprint(df, content_fingerprint(content))
+
+    def load_prepared_bytes(self, original_name: str, content: bytes) -> dict:
+        """Carga un archivo guardado ya preparado para análisis (ver load_prepared)."""
+        return load_prepared(content_fingerprint(content), lambda: self.load_from_supabase_bytes(original_name, content))
+
+
+def prepare_dataset(df: pd.DataFrame) -> dict:
+    """
+    Preprocesa el dataset una sola vez (tipologías y opciones de filtros).
+    Devuelve {'df', 'error', 'filas', 'tipologias', 'meses'}; si algo falla, 'df' es None y 'error' explica por qué.
+    """
+    preparado = {'df': None, 'error': None, 'filas': len(df), 'tipologias': [], 'meses': []}
+
+    # Verificar columnas críticas (si faltan, mostrar error siempre)
+    # Para locales solo necesitamos cantidad_vendida, para temporada necesitamos más
+    required_columns = ['cantidad_vendida']  # Mínimo requerido
+    missing_columns = [col for col in required_columns if col not in df.columns]
+    if missing_columns:
+        preparado['error'] = f"❌ Columnas críticas faltantes: {missing_columns}"
+        return preparado
+
+    # Preprocesar tipología solo si las columnas están disponibles
+    try:
+        fingerprint = get_fingerprint(df)
+        df = add_typology_column(df)
+        if fingerprint:
+            set_fingerprint(df, derive_fingerprint(fingerprint, "add_typology_column"))
+    except Exception as e:
+        preparado['error'] = f"❌ Error al procesar tipologías: {str(e)}"
+        return preparado
+
+    preparado['df'] = df
+    preparado['tipologias'] = df['tipologia'].dropna().unique().tolist() if 'tipologia' in df.columns else []
+    # Índice por mes y rollup mensual de productos, calculados una vez por dataset
+    preparado['meses'] = precompute_monthly(df)
+    return preparado
+
+
+def load_prepared(fingerprint: str, cargar) -> dict:
+    """
+    Devuelve el dataset preparado para esa huella de contenido. Primero intenta abrirlo desde el
+    almacén Arrow del host (memory map, compartido entre procesos); si no existe, llama a `cargar`
+    (descarga/parseo), lo prepara, lo escribe y lo reabre mapeado.
+    Al ingerir un archivo también guarda sus resúmenes (más vendidos y alcance de clientes, ver sketches).
+    """
+    arrow_store.maybe_cleanup()
+    df = arrow_store.open_dataset(fingerprint)
+    if df is None:
+        preparado = prepare_dataset(cargar())
+        if preparado['df'] is not None:
+            sketches.ingest(fingerprint, preparado['df'])
+        if preparado['df'] is None or arrow_store.write_dataset(fingerprint, preparado['df']) is None:
+            return preparado
+        df = arrow_store.open_dataset(fingerprint)
+        if df is None:
+            return preparado
+    elif not sketches.has_sketches(fingerprint):
+        # Ya en el almacén: solo se construyen los resúmenes si faltan (p. ej. los borró la limpieza)
+        sketches.ingest(fingerprint, df)
+
+    set_fingerprint(df, derive_fingerprint(fingerprint, "add_typology_column"))
+    return {
+        'df': df,
+        'error': None,
+        'filas': len(df),
+        'tipologias': df['tipologia'].dropna().unique().tolist() if 'tipologia' in df.columns else [],
+        'meses': precompute_monthly(df),
+    }
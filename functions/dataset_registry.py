@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from functions.result_cache import estimate_bytes
+
+# Presupuesto global de memoria para datasets cargados, compartido por todas las sesiones (bytes)
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Una sesión que no toca su dataset en este tiempo (segundos) se considera cerrada
+DEFAULT_IDLE_TTL = 30 * 60
+
+
+class _Entry:
+    def __init__(self, value: Any, size: int):
+        self.value = value
+        self.size = size
+        self.refs: Dict[str, float] = {}  # session_id -> último uso
+
+
+class DatasetRegistry:
+    """
+    Registro de datasets de solo lectura compartido por todas las sesiones del proceso.
+    Cada dataset se guarda una vez por huella de contenido; las sesiones lo adquieren y liberan
+    (conteo de referencias) y los que quedan sin uso se desalojan en orden LRU cuando se
+    supera el presupuesto de memoria.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading: Dict[str, threading.Lock] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _live_refs(self, entry: _Entry, now: float) -> int:
+        # Las referencias de sesiones inactivas por más de idle_ttl se descartan
+        for session_id, last_seen in list(entry.refs.items()):
+            if now - last_seen > self.idle_ttl:
+                del entry.refs[session_id]
+        return len(entry.refs)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for fingerprint in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            entry = self._entries[fingerprint]
+            if self._live_refs(entry, now) == 0:
+                del self._entries[fingerprint]
+                self._bytes -= entry.size
+                self.evictions += 1
+
+    def acquire(self, fingerprint: str, session_id: Optional[str], loader: Callable[[], Any]) -> Any:
+        """
+        Devuelve el dataset con esa huella, cargándolo con `loader` solo si ninguna otra sesión
+        lo tiene en memoria. Si varias sesiones piden el mismo dataset a la vez, se carga una vez.
+        Con session_id None no se toma referencia: el dataset se comparte pero queda disponible
+        para desalojo (para usos de una sola ejecución, que no tienen cuándo liberarlo).
+        El valor devuelto es compartido: no debe modificarse.
+        """
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                self.hits += 1
+                if session_id is not None:
+                    entry.refs[session_id] = time.monotonic()
+                self._entries.move_to_end(fingerprint)
+                return entry.value
+            key_lock = self._loading.setdefault(fingerprint, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(fingerprint)
+                if entry is not None:
+                    # Otra sesión lo terminó de cargar mientras esperábamos
+                    self.hits += 1
+                    if session_id is not None:
+                        entry.refs[session_id] = time.monotonic()
+                    self._entries.move_to_end(fingerprint)
+                    return entry.value
+                self.misses += 1
+
+            try:
+                value = loader()
+                # El tamaño se mide todavía con key_lock tomado: quien llegue ahora espera acá
+                entry = _Entry(value, estimate_bytes(value))
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(fingerprint, None)
+                raise
+
+            if session_id is not None:
+                entry.refs[session_id] = time.monotonic()
+            with self._lock:
+                # La entrada aparece y el lock de carga desaparece a la vez: nadie ve el hueco entre ambos
+                self._entries[fingerprint] = entry
+                self._bytes += entry.size
+                self._loading.pop(fingerprint, None)
+                self._evict()
+            return value
+
+    def touch(self, fingerprint: str, session_id: str) -> None:
+        """Marca el dataset como en uso por la sesión (mantiene viva su referencia)."""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                entry.refs[session_id] = time.monotonic()
+                self._entries.move_to_end(fingerprint)
+
+    def release(self, fingerprint: str, session_id: str) -> None:
+        """La sesión deja de usar el dataset; si nadie más lo usa queda disponible para desalojo."""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is not None:
+                entry.refs.pop(session_id, None)
+            self._evict()
+
+    def get(self, fingerprint: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            return entry.value if entry is not None else None
+
+    def held_by(self, session_id: str) -> List[str]:
+        """Huellas de los datasets que la sesión tiene adquiridos (y siguen en memoria)."""
+        with self._lock:
+            return [fingerprint for fingerprint, entry in self._entries.items() if session_id in entry.refs]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'entradas': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'referencias': sum(self._live_refs(e, now) for e in self._entries.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# Registro único del proceso: todas las sesiones de Streamlit lo comparten
+dataset_registry = DatasetRegistry()
@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from functions import arrow_store
+from functions.result_cache import derive_fingerprint
+from utils.format_detect import month_from_filename
+
+# Columnas de hechos que identifican una fila de venta (las que existan en el dataset)
+FACT_COLUMNS = [
+    'cliente', 'nombre_cliente', 'localidad', 'codigo_del_articulo', 'descripcion_del_producto',
+    'cantidad_vendida', 'total', 'fecha_de_la_venta',
+]
+
+_lock = threading.Lock()
+
+
+def _dedup_dir() -> str:
+    path = os.path.join(arrow_store.store_dir(), "dedup")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _canonical_column(s: pd.Series) -> np.ndarray:
+    # Misma representación para columnas numpy y Arrow: así la huella de una fila no depende
+    # de si el dataset viene recién parseado o abierto desde el almacén
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return pd.to_datetime(s).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        return s.to_numpy(dtype='float64', na_value=np.nan)
+    return s.astype(object).where(s.notna(), None).astype(str).to_numpy(dtype=object)
+
+
+def source_scope(file_type: Optional[str], original_name: Optional[str], fingerprint: str) -> str:
+    """
+    Lo que identifica a las filas de un archivo y no está en sus columnas: el local de los archivos
+    'locales:<local>' (sus filas no traen el local) y el mes de los 'articulos_mes' (no traen fecha).
+    Solo se quitan repetidas entre archivos del mismo ámbito; si el local o el mes no se conocen,
+    el ámbito es el propio archivo y solo cuenta como repetida una subida del mismo contenido.
+    """
+    ft = (file_type or "").lower()
+    if ft == 'articulos_mes':
+        mes = month_from_filename(original_name or "")
+        if mes:
+            return f"articulos_mes:{mes}"
+    elif ft == 'temporada' or (ft.startswith('locales:') and ft != 'locales:'):
+        return ft
+    return f"archivo:{fingerprint}"
+
+
+def row_keys(df: pd.DataFrame, columns: Optional[List[str]] = None, scope: str = "") -> np.ndarray:
+    """
+    Huella de 64 bits de cada fila sobre las columnas de hechos y el ámbito del archivo (ver
+    source_scope), más el número de aparición de esa misma fila dentro del archivo: dos ventas
+    idénticas en un archivo son dos filas distintas, pero las mismas dos filas en otro archivo del
+    mismo ámbito (una exportación repetida) son duplicadas.
+    """
+    columns = [c for c in (columns or FACT_COLUMNS) if c in df.columns]
+    canonico = pd.DataFrame({c: _canonical_column(df[c]) for c in columns})
+    h = pd.util.hash_pandas_object(canonico, index=False).to_numpy(dtype=np.uint64)
+    aparicion = pd.Series(h).groupby(h).cumcount().to_numpy(dtype=np.uint64)
+    claves = pd.DataFrame({'h': h, 'n': aparicion})
+    if scope:
+        claves['s'] = pd.util.hash_array(np.array([scope], dtype=object))[0]
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy(dtype=np.uint64)
+
+
+def _isin_sorted(keys: np.ndarray, sorted_set: np.ndarray) -> np.ndarray:
+    if len(sorted_set) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.searchsorted(sorted_set, keys)
+    pos[pos == len(sorted_set)] = 0
+    return sorted_set[pos] == keys
+
+
+class Consolidation:
+    """
+    Unión sin filas repetidas de varios archivos. Persiste el conjunto de huellas de filas ya vistas
+    y, por archivo, las filas que aportó: al sumar un archivo nuevo solo se hashean sus filas.
+    Lo que no se usa en [datasets] arrow_max_age se borra con el resto del almacén.
+    """
+
+    def __init__(self, key: str, fuentes: Optional[List[dict]] = None, claves: Optional[np.ndarray] = None):
+        self.key = key
+        self.fuentes: List[dict] = fuentes or []    # {'fingerprint', 'scope', 'part', 'filas', 'duplicadas'}
+        self.claves = claves if claves is not None else np.empty(0, dtype=np.uint64)
+        # Partes que no se pudieron escribir a disco: la consolidación vale solo para esta llamada
+        self._en_memoria: Dict[str, pd.DataFrame] = {}
+        self.persistible = True
+
+    @property
+    def identities(self) -> List[str]:
+        return [_identity(f['fingerprint'], f.get('scope', "")) for f in self.fuentes]
+
+    def add(self, fingerprint: str, df: pd.DataFrame, scope: str = "") -> dict:
+        """Agrega las filas del archivo que no estaban ya en su ámbito; devuelve sus estadísticas."""
+        keys = row_keys(df, scope=scope)
+        repetidas = _isin_sorted(keys, self.claves)
+        nuevas = df[~repetidas]
+        part = os.path.join(_dedup_dir(), f"part_{derive_fingerprint(self.key, _identity(fingerprint, scope))}.arrow")
+        if arrow_store.write_ipc(part, nuevas) is None:
+            part = None
+            self._en_memoria[fingerprint] = nuevas
+            self.persistible = False
+        self.claves = np.union1d(self.claves, keys[~repetidas])
+        fuente = {'fingerprint': fingerprint, 'scope': scope, 'part': part, 'filas': int(len(df)), 'duplicadas': int(repetidas.sum())}
+        self.fuentes.append(fuente)
+        return fuente
+
+    def frame(self) -> pd.DataFrame:
+        partes = [
+            arrow_store.read_ipc(f['part']) if f.get('part') else self._en_memoria.get(f['fingerprint'])
+            for f in self.fuentes
+        ]
+        partes = [p for p in partes if p is not None]
+        return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    def save(self) -> None:
+        # Escrituras atómicas: otro proceso puede estar leyendo el mismo estado
+        directory = _dedup_dir()
+        sufijo = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        claves_path = os.path.join(directory, f"claves_{self.key}.npy")
+        with open(f"{claves_path}.{sufijo}", 'wb') as f:
+            np.save(f, self.claves)
+        os.replace(f"{claves_path}.{sufijo}", claves_path)
+        state_path = os.path.join(directory, f"state_{self.key}.json")
+        with open(f"{state_path}.{sufijo}", 'w', encoding='utf-8') as f:
+            json.dump({'key': self.key, 'fuentes': self.fuentes}, f)
+        os.replace(f"{state_path}.{sufijo}", state_path)
+
+    @classmethod
+    def load(cls, key: str) -> Optional["Consolidation"]:
+        directory = _dedup_dir()
+        try:
+            with open(os.path.join(directory, f"state_{key}.json"), encoding='utf-8') as f:
+                state = json.load(f)
+            claves = np.load(os.path.join(directory, f"claves_{key}.npy"))
+        except (OSError, ValueError):
+            return None
+        # Si falta alguna parte (limpieza del disco) el estado ya no sirve
+        if any(not f.get('part') or not os.path.exists(f['part']) for f in state['fuentes']):
+            return None
+        # Las consolidaciones en uso no vencen en la limpieza del almacén (arrow_store.cleanup_orphans)
+        arrow_store.touch(
+            os.path.join(directory, f"state_{key}.json"), os.path.join(directory, f"claves_{key}.npy"),
+            *(f['part'] for f in state['fuentes']),
+        )
+        return cls(key, state['fuentes'], claves)
+
+
+def _identity(fingerprint: str, scope: str) -> str:
+    return f"{scope}={fingerprint}" if scope else fingerprint
+
+
+def consolidation_key(identities: List[str]) -> str:
+    """Huella del consolidado de esos archivos (en ese orden), cada uno como 'ámbito=huella'."""
+    return derive_fingerprint("dedup", *identities)
+
+
+def _best_base(identities: List[str]) -> Optional[Consolidation]:
+    # El estado guardado más grande cuyos archivos estén todos en la selección (en el mismo orden)
+    best = None
+    for i in range(len(identities), 0, -1):
+        best = Consolidation.load(consolidation_key(identities[:i]))
+        if best is not None:
+            return best
+    return None
+
+
+def consolidate(sources: List[Tuple[str, str, Callable[[], pd.DataFrame]]]) -> Tuple[str, pd.DataFrame, Dict[str, int]]:
+    """
+    Une los archivos (huella, ámbito de source_scope, función que carga el dataset) quitando las
+    filas repetidas entre archivos del mismo ámbito. Reutiliza la consolidación guardada del prefijo
+    más largo de la lista, así solo se cargan y hashean los archivos nuevos.
+    Devuelve (clave, dataset, {'archivos', 'filas', 'duplicadas', 'hasheadas'}); la clave es la de
+    los archivos que se pudieron cargar, así un consolidado parcial no ocupa la clave del completo.
+    """
+    identities = [_identity(fp, scope) for fp, scope, _ in sources]
+    # El lock cubre solo leer y guardar el estado: las descargas y el parseo de cada archivo
+    # corren fuera, así las consolidaciones de distintas sesiones no se esperan entre sí
+    with _lock:
+        base = _best_base(identities)
+    if base is not None and base.identities == identities:
+        consolidation, hasheadas = base, 0
+    else:
+        consolidation = Consolidation(
+            consolidation_key(identities),
+            list(base.fuentes) if base else [],
+            base.claves if base else None,
+        )
+        hasheadas = 0
+        for fingerprint, scope, cargar in sources[len(consolidation.fuentes):]:
+            df = cargar()
+            if df is None:
+                # Archivo no disponible: se consolida el resto, pero este estado no se guarda
+                consolidation.persistible = False
+                continue
+            hasheadas += len(df)
+            consolidation.add(fingerprint, df, scope)
+        if consolidation.persistible:
+            with _lock:
+                try:
+                    consolidation.save()
+                except OSError:
+                    pass
+
+    stats = {
+        'archivos': len(consolidation.fuentes),
+        'filas': sum(f['filas'] - f['duplicadas'] for f in consolidation.fuentes),
+        'duplicadas': sum(f['duplicadas'] for f in consolidation.fuentes),
+        'hasheadas': hasheadas,
+    }
+    return consolidation_key(consolidation.identities), consolidation.frame(), stats
@@ -0,0 +1,234 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from functions.client_analysis import client_share_of_sales, client_returns_count
+from functions.data_repo import DataRepository
+from functions.product_analysis import top_selling_products
+from functions.schemas import normalize_text
+from functions.typology_analysis import top_selling_typologies, get_sales_by_gender
+
+
+def _table_name(original_name: str, taken: set) -> str:
+    base = re.sub(r'\W+', '_', normalize_text(original_name).rsplit('.', 1)[0]).strip('_') or 'dataset'
+    if base[0].isdigit():
+        base = f"t_{base}"
+    name, i = base, 2
+    while name in taken:
+        name, i = f"{base}_{i}", i + 1
+    return name
+
+
+def _sql_str(value: Optional[str]) -> str:
+    return 'NULL' if value is None else "'" + str(value).replace("'", "''") + "'"
+
+
+def _local_from_type(file_type: str) -> Optional[str]:
+    # "locales:centenario" -> "centenario"
+    file_type = (file_type or "").lower()
+    return file_type.split(':', 1)[1] if file_type.startswith('locales:') else None
+
+
+class DuckDBCatalog:
+    """
+    Motor DuckDB embebido (en proceso, sin servicio externo) sobre los datasets canónicos.
+    Cada dataset se registra como vista sobre una tabla Arrow que DuckDB lee directamente. Las
+    columnas que ya están en Arrow (las de un dataset abierto del almacén, ver arrow_store) pasan sin
+    copiarse; las de un dataset recién parseado se convierten una vez al registrarlo. La tabla `catalogo` describe cada vista con los metadatos de la tabla `files`.
+    La vista `ventas` une todos los datasets registrados para consultas entre archivos.
+    """
+
+    def __init__(self, database: str = ':memory:'):
+        self.con = duckdb.connect(database)
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS catalogo (
+                tabla VARCHAR, file_type VARCHAR, local VARCHAR, original_name VARCHAR,
+                storage_key VARCHAR, uploaded_at VARCHAR, filas BIGINT
+            )
+        """)
+        self._sources: Dict[str, pa.Table] = {}
+
+    @property
+    def tables(self) -> List[str]:
+        return list(self._sources)
+
+    def register_dataframe(self, df: pd.DataFrame, original_name: str, meta: Optional[Dict[str, Any]] = None) -> str:
+        """Registra un dataset preparado como vista y lo agrega al catálogo. Devuelve el nombre de la vista."""
+        meta = meta or {}
+        tabla = _table_name(original_name, set(self._sources))
+        # _fila conserva el orden original de las filas, necesario para reproducir 'first' de pandas
+        source = pa.Table.from_pandas(df, preserve_index=False)
+        source = source.append_column('_fila', pa.array(np.arange(len(df), dtype=np.int64)))
+        self._sources[tabla] = source
+        self.con.register(f"_src_{tabla}", source)
+        self.con.execute(f'CREATE OR REPLACE VIEW "{tabla}" AS SELECT * FROM "_src_{tabla}"')
+        file_type = meta.get('file_type') or ''
+        self.con.execute(
+            "INSERT INTO catalogo VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [tabla, file_type, _local_from_type(file_type), original_name,
+             meta.get('storage_key'), str(meta.get('uploaded_at') or ''), len(df)]
+        )
+        self._refresh_union()
+        return tabla
+
+    def build_from_files(self, rows: List[Dict[str, Any]], download: Callable[[str], Optional[bytes]],
+                         repo: Optional[DataRepository] = None) -> List[str]:
+        """
+        Registra cada archivo de la tabla `files` (filas de list_files). Los datasets ya preparados
+        en el almacén Arrow se abren mapeados; el resto se descarga y parsea una vez.
+        """
+        repo = repo or DataRepository()
+        registered = []
+        for row in rows:
+            content = download(row.get('storage_key', ''))
+            if content is None:
+                continue
+            preparado = repo.load_prepared_bytes(row.get('original_name', 'archivo.xlsx'), content)
+            if preparado['df'] is None:
+                continue
+            registered.append(self.register_dataframe(preparado['df'], row.get('original_name', 'archivo'), row))
+        return registered
+
+    def _refresh_union(self) -> None:
+        selects = []
+        for tabla, file_type, local in self.con.execute("SELECT tabla, file_type, local FROM catalogo").fetchall():
+            selects.append(
+                f"SELECT {_sql_str(tabla)} AS tabla, {_sql_str(file_type)} AS file_type, "
+                f"{_sql_str(local)}::VARCHAR AS local, * EXCLUDE (_fila) FROM \"{tabla}\""
+            )
+        if not selects:
+            return
+        self.con.execute(f"CREATE OR REPLACE VIEW ventas AS {' UNION ALL BY NAME '.join(selects)}")
+
+    def query(self, sql: str, params: Optional[list] = None) -> pd.DataFrame:
+        return self.con.execute(sql, params or []).df()
+
+    def columns(self, tabla: str) -> List[str]:
+        return [c for c in self._sources[tabla].column_names if c != '_fila']
+
+
+# =============================
+# Análisis con pushdown: la agregación pesada corre en DuckDB y la función de pandas
+# solo aplica ranking y formato sobre el resultado ya agregado (mismo esquema de salida).
+# =============================
+
+def _first(col: str) -> str:
+    # 'first' de pandas: primer valor no nulo en el orden original de las filas
+    return f'arg_min("{col}", _fila) FILTER (WHERE "{col}" IS NOT NULL) AS "{col}"'
+
+
+def _where_ventas(catalog: DuckDBCatalog, tabla: str, extra: str = "") -> str:
+    conds = ['cuenta_ventas'] if 'cuenta_ventas' in catalog.columns(tabla) else []
+    if extra:
+        conds.append(extra)
+    return f"WHERE {' AND '.join(conds)}" if conds else ""
+
+
+def _grouped(catalog: DuckDBCatalog, tabla: str, keys: List[str], first_cols: List[str] = (), where: str = "",
+             null_keys: bool = False) -> pd.DataFrame:
+    # Con null_keys las filas de clave nula quedan como un grupo más: la función de pandas las
+    # descarta al agrupar, pero las cuenta en los totales (p. ej. el total de client_share_of_sales)
+    present = catalog.columns(tabla)
+    first_cols = [c for c in first_cols if c in present]
+    if not null_keys:
+        not_null = " AND ".join(f'"{k}" IS NOT NULL' for k in keys)
+        where = f"{where} AND {not_null}" if where else f"WHERE {not_null}"
+    select = ", ".join([f'"{k}"' for k in keys] + ['COALESCE(SUM(cantidad_vendida), 0) AS cantidad_vendida'] + [_first(c) for c in first_cols])
+    group = ", ".join(f'"{k}"' for k in keys)
+    return catalog.query(f'SELECT {select} FROM "{tabla}" {where} GROUP BY {group} ORDER BY {group}')
+
+
+def top_selling_products_sql(catalog: DuckDBCatalog, tabla: str, n: int = 10) -> pd.DataFrame:
+    keys = [c for c in ['codigo_del_articulo', 'descripcion_del_producto'] if c in catalog.columns(tabla)]
+    return top_selling_products(_grouped(catalog, tabla, keys, where=_where_ventas(catalog, tabla)), n)
+
+
+def client_share_of_sales_sql(catalog: DuckDBCatalog, tabla: str) -> pd.DataFrame:
+    agregado = _grouped(catalog, tabla, ['cliente'], ['nombre_cliente', 'localidad'], _where_ventas(catalog, tabla),
+                        null_keys=True)
+    return client_share_of_sales(agregado)
+
+
+def client_returns_count_sql(catalog: DuckDBCatalog, tabla: str) -> pd.DataFrame:
+    present = catalog.columns(tabla)
+    first_cols = [c for c in ['nombre_cliente', 'localidad'] if c in present]
+    select = ", ".join(['cliente', 'SUM(cantidad_vendida) AS cantidad_vendida'] + [_first(c) for c in first_cols])
+    # Una fila de devoluciones y otra de ventas por cliente reproducen exactamente client_returns_count
+    agregado = catalog.query(f'''
+        SELECT {select} FROM "{tabla}"
+        WHERE cliente IS NOT NULL AND cantidad_vendida <> 0
+        GROUP BY cliente, sign(cantidad_vendida)
+        ORDER BY cliente
+    ''')
+    return client_returns_count(agregado)
+
+
+def top_selling_typologies_sql(catalog: DuckDBCatalog, tabla: str, n: int = 5) -> pd.DataFrame:
+    agregado = _grouped(catalog, tabla, ['tipologia'], where=_where_ventas(catalog, tabla))
+    return top_selling_typologies(agregado.assign(cuenta_ventas=True), n)
+
+
+def get_sales_by_gender_sql(catalog: DuckDBCatalog, tabla: str) -> pd.DataFrame:
+    agregado = _grouped(catalog, tabla, ['genero'], where=_where_ventas(catalog, tabla))
+    return get_sales_by_gender(agregado.assign(cuenta_ventas=True))
+
+
+SQL_ANALYSES: Dict[str, Callable[..., pd.DataFrame]] = {
+    'top_selling_products': top_selling_products_sql,
+    'client_share_of_sales': client_share_of_sales_sql,
+    'client_returns_count': client_returns_count_sql,
+    'top_selling_typologies': top_selling_typologies_sql,
+    'get_sales_by_gender': get_sales_by_gender_sql,
+}
+
+
+# =============================
+# Consultas entre archivos sobre la vista `ventas`
+# =============================
+
+def _any_has(catalog: DuckDBCatalog, *columns: str) -> bool:
+    # La vista `ventas` solo tiene las columnas de algún dataset registrado: sin ellas la consulta no compila
+    return any(all(c in catalog.columns(tabla) for c in columns) for tabla in catalog.tables)
+
+
+def units_by_typology_across(catalog: DuckDBCatalog, file_type: str = 'temporada') -> pd.DataFrame:
+    """Unidades vendidas por tipología sumando todos los archivos de ese tipo (y en cuántos archivos aparece)."""
+    if not _any_has(catalog, 'tipologia', 'cuenta_ventas'):
+        return pd.DataFrame(columns=['tipologia', 'cantidad_vendida', 'archivos'])
+    return catalog.query('''
+        SELECT tipologia,
+               SUM(cantidad_vendida) AS cantidad_vendida,
+               COUNT(DISTINCT tabla) AS archivos
+        FROM ventas
+        WHERE cuenta_ventas AND tipologia IS NOT NULL AND split_part(file_type, ':', 1) = ?
+        GROUP BY tipologia
+        ORDER BY cantidad_vendida DESC, tipologia
+    ''', [file_type])
+
+
+def clients_in_every_locale(catalog: DuckDBCatalog) -> pd.DataFrame:
+    """
+    Clientes que aparecen en todos los locales cargados en el catálogo. Vacío si ningún archivo
+    tiene la columna cliente (los de locales suelen no traerla).
+    """
+    if not _any_has(catalog, 'cliente'):
+        return pd.DataFrame(columns=['cliente', 'locales', 'cantidad_vendida'])
+    return catalog.query('''
+        SELECT cliente, COUNT(DISTINCT local) AS locales, SUM(cantidad_vendida) AS cantidad_vendida
+        FROM ventas
+        WHERE local IS NOT NULL AND cliente IS NOT NULL
+        GROUP BY cliente
+        HAVING COUNT(DISTINCT local) = (SELECT COUNT(DISTINCT local) FROM ventas WHERE local IS NOT NULL)
+        ORDER BY cantidad_vendida DESC, cliente
+    ''')
+
+
+# Consultas entre archivos disponibles desde la línea de comandos (cli.py --across)
+ACROSS_QUERIES: Dict[str, Callable[[DuckDBCatalog], pd.DataFrame]] = {
+    'units_by_typology_across': units_by_typology_across,
+    'clients_in_every_locale': clients_in_every_locale,
+}
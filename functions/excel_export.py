@@ -0,0 +1,181 @@
+import io
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from functions.backends import analysis_functions
+from functions.result_cache import dataset_key, result_cache
+from functions.typology_analysis import get_special_categories_summary
+
+# Filas que se pasan a listas de Python por vez (el resto del resultado no se duplica)
+CHUNK_ROWS = 10_000
+
+# Hoja de cada categoría especial (las que no estén acá usan su clave capitalizada)
+SPECIAL_SHEETS = {
+    'cierres': "Cierres",
+    'ch': "Cheques",
+    'sorteos': "Sorteos",
+    'perfuminas': "Perfuminas",
+    'otros_codigos': "Otros códigos",
+}
+
+_INVALID_SHEET_CHARS = str.maketrans({c: " " for c in '[]:*?/\\'})
+
+
+@dataclass
+class ExcelReport:
+    """Libro .xlsx generado, con sus hojas y filas, y lo que tardó; se cachea por dataset."""
+    data: bytes
+    hojas: Dict[str, int] = field(default_factory=dict)     # hoja -> filas escritas
+    omitidas: Dict[str, str] = field(default_factory=dict)  # hoja -> motivo
+    build_ms: float = 0.0
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+
+def _sheet_name(nombre: str, usados: set) -> str:
+    # Excel: hasta 31 caracteres, sin []:*?/\ y sin repetir (sin distinguir mayúsculas)
+    base = nombre.translate(_INVALID_SHEET_CHARS).strip()[:31] or "Hoja"
+    candidato, i = base, 2
+    while candidato.lower() in usados:
+        sufijo = f" ({i})"
+        candidato, i = base[:31 - len(sufijo)] + sufijo, i + 1
+    usados.add(candidato.lower())
+    return candidato
+
+
+def iter_rows(df: pd.DataFrame, chunk_rows: int = CHUNK_ROWS) -> Iterator[list]:
+    """Filas del DataFrame como listas de valores de Python (NaN y NaT como None), por tramos."""
+    for inicio in range(0, len(df), chunk_rows):
+        tramo = df.iloc[inicio:inicio + chunk_rows]
+        columnas = []
+        for c in tramo.columns:
+            serie = tramo[c]
+            if pd.api.types.is_datetime64_any_dtype(serie):
+                valores = np.array(serie.dt.to_pydatetime(), dtype=object)
+            else:
+                valores = serie.to_numpy(dtype=object)
+            valores[pd.isna(valores)] = None
+            columnas.append(valores)
+        yield from (list(fila) for fila in zip(*columnas))
+
+
+def report_sheets(df: pd.DataFrame) -> List[Tuple[str, Callable[[], pd.DataFrame]]]:
+    """Hojas del reporte completo de un dataset: cada análisis con todas sus filas (sin recortar a un top)."""
+    analisis = analysis_functions()
+    todas = max(len(df), 1)
+
+    def especiales() -> pd.DataFrame:
+        resumen = get_special_categories_summary(df)
+        return pd.DataFrame(
+            [{'categoria': SPECIAL_SHEETS.get(k, k.replace('_', ' ').capitalize()),
+              'registros': v['cantidad'], 'unidades': v['unidades']} for k, v in resumen.items()],
+            columns=['categoria', 'registros', 'unidades'],
+        )
+
+    hojas = [
+        ("Top productos", lambda: analisis['top_selling_products'](df, todas)),
+        ("Peso clientes", lambda: analisis['client_share_of_sales'](df)),
+        ("Devoluciones", lambda: analisis['client_returns_count'](df)),
+        ("Tipologías", lambda: analisis['top_selling_typologies'](df, todas)),
+        ("Género", lambda: analisis['get_sales_by_gender'](df)),
+        ("Categorías especiales", especiales),
+    ]
+    for key, nombre in SPECIAL_SHEETS.items():
+        hojas.append((nombre, lambda key=key: get_special_categories_summary(df)[key]['detalle']))
+    return hojas
+
+
+class _XlsxWriterBook:
+    # xlsxwriter en modo constant_memory: cada fila se escribe a disco y se libera
+    def __init__(self, buffer):
+        import xlsxwriter
+        self.book = xlsxwriter.Workbook(buffer, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd',
+            'strings_to_urls': False,
+        })
+        self.header = self.book.add_format({'bold': True})
+
+    def add_sheet(self, nombre: str, columnas: List[str], filas: Iterator[list]) -> int:
+        sheet = self.book.add_worksheet(nombre)
+        sheet.write_row(0, 0, columnas, self.header)
+        sheet.freeze_panes(1, 0)
+        n = 0
+        for n, fila in enumerate(filas, start=1):
+            sheet.write_row(n, 0, fila)
+        return n
+
+    def close(self) -> None:
+        self.book.close()
+
+
+class _OpenpyxlBook:
+    # Sin xlsxwriter: openpyxl en modo write_only también escribe fila por fila
+    def __init__(self, buffer):
+        from openpyxl import Workbook
+        self.buffer = buffer
+        self.book = Workbook(write_only=True)
+
+    def add_sheet(self, nombre: str, columnas: List[str], filas: Iterator[list]) -> int:
+        sheet = self.book.create_sheet(nombre)
+        sheet.freeze_panes = "A2"
+        sheet.append(columnas)
+        n = 0
+        for n, fila in enumerate(filas, start=1):
+            sheet.append(fila)
+        return n
+
+    def close(self) -> None:
+        self.book.save(self.buffer)
+
+
+def _open_book(buffer):
+    try:
+        return _XlsxWriterBook(buffer)
+    except ImportError:
+        return _OpenpyxlBook(buffer)
+
+
+def build_report(df: pd.DataFrame, sheets: Optional[List[Tuple[str, Callable[[], pd.DataFrame]]]] = None) -> ExcelReport:
+    """
+    Escribe todas las hojas en un solo .xlsx, fila por fila, sin armar el libro en memoria.
+    Un análisis que no aplica al dataset (p. ej. clientes en un archivo de locales) se omite.
+    Con dataset_key disponible el libro queda en la cache de resultados.
+    """
+    key = dataset_key(df, 'excel_report')
+    if key is not None and sheets is None:
+        cached = result_cache.get(('export',) + key)
+        if cached is not result_cache._MISSING:
+            return cached
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    book = _open_book(buffer)
+    report = ExcelReport(b"")
+    usados: set = set()
+    for nombre, calcular in sheets or report_sheets(df):
+        try:
+            resultado = calcular()
+        except KeyError as e:
+            report.omitidas[nombre] = f"falta la columna {e}"
+            continue
+        if resultado is None or resultado.empty:
+            report.omitidas[nombre] = "sin datos"
+            continue
+        hoja = _sheet_name(nombre, usados)
+        report.hojas[hoja] = book.add_sheet(hoja, [str(c) for c in resultado.columns], iter_rows(resultado))
+    if not report.hojas:
+        # Un libro necesita al menos una hoja
+        book.add_sheet("Sin datos", ["mensaje"], iter([["No hay análisis disponibles para este dataset"]]))
+    book.close()
+    report.data = buffer.getvalue()
+    report.build_ms = (time.perf_counter() - start) * 1000
+    if key is not None and sheets is None:
+        result_cache.put(('export',) + key, report)
+    return report
@@ -0,0 +1,176 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from functions.result_cache import derive_fingerprint, get_fingerprint, memoize_by_fingerprint, memoized_result, set_fingerprint
+from utils.settings import get_setting
+
+# Columnas que usa la comparación; el resto de cada archivo no se copia al frame combinado
+_COLUMNAS = ['codigo_del_articulo', 'descripcion_del_producto', 'tipologia', 'cantidad_vendida', 'cuenta_ventas']
+
+
+def _matches_locale(row: dict, local: str) -> bool:
+    # file_type exacto ('locales:55') o el local como palabra en el nombre: '5' no debe tomar archivos de '55'
+    ft = (row.get("file_type") or "").lower()
+    if not ft.startswith("locales"):
+        return False
+    local = local.lower()
+    if ft == f"locales:{local}":
+        return True
+    patron = rf"(?<![0-9a-z]){re.escape(local)}(?![0-9a-z])"
+    return ft == "locales" and re.search(patron, (row.get("original_name") or "").lower()) is not None
+
+
+def latest_per_locale(rows: List[dict], locales: List[str]) -> Dict[str, Optional[dict]]:
+    """Último archivo subido de cada local (list_files ya viene ordenado del más nuevo al más viejo)."""
+    return {local: next((r for r in rows if _matches_locale(r, local)), None) for local in locales}
+
+
+def load_concurrently(archivos: Dict[str, dict], descargar: Callable[[dict], Optional[Tuple[str, Optional[bytes]]]],
+                      abrir: Callable[[dict, Optional[bytes]], Optional[pd.DataFrame]],
+                      max_workers: Optional[int] = None) -> Dict[str, Optional[pd.DataFrame]]:
+    """
+    Carga los archivos de cada local. Solo las descargas corren en paralelo (hilos: son I/O):
+    `descargar(row)` devuelve (huella, contenido), con contenido None si el archivo ya está en el
+    almacén Arrow del host, o None si no se pudo descargar. Después `abrir(row, contenido)`
+    devuelve el dataset de a un local por vez: el parseo de Excel no libera el GIL, así que en hilos
+    no se aceleraba, y un pool de procesos volvería a ejecutar el script de Streamlit en cada hijo.
+    Un error en un local no frena a los demás: su dataset queda en None.
+    """
+    max_workers = max_workers or int(get_setting("comparison", "workers", 4))
+
+    def _seguro(func, *args):
+        try:
+            return func(*args)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(archivos) or 1))) as pool:
+        futuros = {local: pool.submit(_seguro, descargar, row) for local, row in archivos.items()}
+    descargas = {local: futuro.result() for local, futuro in futuros.items()}
+    return {
+        local: _seguro(abrir, archivos[local], descarga[1]) if descarga is not None else None
+        for local, descarga in descargas.items()
+    }
+
+
+def tag_locales(datasets: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Un solo DataFrame con las filas de todos los locales y la columna 'local' (categoría, en el orden
+    recibido). Queda registrado con una huella derivada de las huellas de cada local.
+    """
+    locales = [local for local, df in datasets.items() if df is not None]
+    categorias = pd.CategoricalDtype(locales, ordered=True)
+    partes = []
+    for codigo, local in enumerate(locales):
+        df = datasets[local]
+        parte = df[[c for c in _COLUMNAS if c in df.columns]]
+        partes.append(parte.assign(local=pd.Categorical.from_codes(np.full(len(parte), codigo), dtype=categorias)))
+    combinado = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame({'local': pd.Categorical([], dtype=categorias)})
+
+    huella = locales_fingerprint(datasets)
+    if huella is not None:
+        set_fingerprint(combinado, huella)
+    return combinado
+
+
+def locales_fingerprint(datasets: Dict[str, pd.DataFrame]) -> Optional[str]:
+    """Huella del frame que armaría tag_locales con esos datasets (None si alguno no tiene huella)."""
+    locales = [local for local, df in datasets.items() if df is not None]
+    huellas = [get_fingerprint(datasets[local]) for local in locales]
+    if not locales or not all(huellas):
+        return None
+    return derive_fingerprint("locales", *[f"{l}={h}" for l, h in zip(locales, huellas)])
+
+
+@memoize_by_fingerprint
+def _locale_aggregates(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Agregados lado a lado de un frame etiquetado por local (ver tag_locales), con una sola pasada
+    de groupby por local, artículo y tipología. Memoizado por dataset con el ranking completo de
+    productos: cambiar n solo recorta, no recalcula.
+    """
+    keys = ['local'] + [c for c in ['codigo_del_articulo', 'descripcion_del_producto', 'tipologia'] if c in df.columns]
+    cantidad = df['cantidad_vendida']
+    if 'cuenta_ventas' in df.columns:
+        cuenta = (df['cuenta_ventas'] == True).fillna(False).astype(bool)  # noqa: E712
+    else:
+        cuenta = pd.Series(True, index=df.index)
+    medidas = pd.DataFrame({
+        'ventas': cantidad.where(cuenta, 0),
+        'filas_venta': cuenta.astype('int64'),
+        'devoluciones': (-cantidad).clip(lower=0),
+    })
+    medidas[keys] = df[keys]
+    # Única pasada sobre las filas; lo demás se arma sobre este resultado (mucho más chico)
+    grupos = medidas.groupby(keys, observed=True, dropna=False)[['ventas', 'filas_venta', 'devoluciones']].sum()
+
+    locales = list(df['local'].cat.categories)
+    por_local = grupos.groupby(level='local', observed=False).sum().reindex(locales, fill_value=0)
+    resumen = pd.DataFrame({
+        'local': locales,
+        'unidades_vendidas': por_local['ventas'].to_numpy(),
+        'devoluciones': por_local['devoluciones'].to_numpy(),
+    })
+    ventas = grupos[grupos['filas_venta'] > 0]
+    if 'codigo_del_articulo' in keys:
+        articulos = ventas.reset_index().groupby('local', observed=False)['codigo_del_articulo'].nunique()
+        resumen['articulos'] = articulos.reindex(locales, fill_value=0).to_numpy()
+    total = resumen['unidades_vendidas'].sum()
+    resumen['Participación'] = (resumen['unidades_vendidas'] / total * 100 if total else resumen['unidades_vendidas'] * 0).apply(lambda x: f"{x:.1f}%")
+
+    producto = [k for k in ['codigo_del_articulo', 'descripcion_del_producto'] if k in keys]
+    productos = pd.DataFrame(columns=['local'] + producto + ['cantidad_vendida'])
+    if producto:
+        # groupby ordena por local y artículo; el sort estable por unidades deja el orden de top_selling_products
+        totales = (
+            ventas['ventas'].groupby(level=['local'] + producto, observed=True).sum()
+            .rename('cantidad_vendida').reset_index().dropna(subset=producto)
+        )
+        productos = totales.sort_values(['local', 'cantidad_vendida'], ascending=[True, False], kind='stable')
+
+    tipologias = pd.DataFrame(columns=locales)
+    if 'tipologia' in keys:
+        tipologias = (
+            ventas['ventas'].groupby(level=['tipologia', 'local'], observed=True).sum()
+            .unstack('local').reindex(columns=locales).fillna(0)
+        )
+        tipologias = tipologias.loc[tipologias.index.notna()]
+        tipologias = tipologias.loc[tipologias.sum(axis=1).sort_values(ascending=False, kind='stable').index]
+        tipologias.columns = tipologias.columns.astype(str)
+
+    return {'resumen': resumen, 'productos': productos, 'tipologias': tipologias}
+
+
+def _top_per_local(agregados: Dict[str, pd.DataFrame], n: int) -> Dict[str, pd.DataFrame]:
+    # Los n primeros del ranking completo de cada local
+    productos = agregados['productos'].groupby('local', observed=True).head(n).reset_index(drop=True)
+    productos.insert(1, 'Ranking', productos.groupby('local', observed=True).cumcount() + 1)
+    return {**agregados, 'productos': productos}
+
+
+def compare_locales(df: pd.DataFrame, n: int = 10) -> Dict[str, pd.DataFrame]:
+    """
+    Comparación de un frame etiquetado por local (ver tag_locales). Devuelve:
+      'resumen': unidades vendidas, devoluciones, artículos y participación de cada local
+      'productos': los n productos más vendidos de cada local (mismo orden que top_selling_products)
+      'tipologias': unidades por tipología (filas) y local (columnas)
+    Como en el resto de los análisis, las ventas solo cuentan las filas con cuenta_ventas.
+    """
+    return _top_per_local(_locale_aggregates(df), n)
+
+
+def compare_locale_datasets(datasets: Dict[str, pd.DataFrame], n: int = 10) -> Dict[str, pd.DataFrame]:
+    """
+    compare_locales(tag_locales(datasets), n) sin armar el frame combinado si los agregados de esos
+    mismos datasets ya están en la cache: tag_locales copia todas las filas, y los reruns del
+    fragment (p. ej. mover la cantidad de productos) no deberían pagar esa copia.
+    """
+    huella = locales_fingerprint(datasets)
+    agregados = memoized_result(_locale_aggregates, huella) if huella is not None else None
+    if agregados is None:
+        return compare_locales(tag_locales(datasets), n)
+    return _top_per_local(agregados, n)
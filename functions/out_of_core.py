@@ -0,0 +1,271 @@
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from functions.client_analysis import client_share_of_sales, client_returns_count
+from functions.data_repo import DataRepository
+from functions.product_analysis import top_selling_products
+from functions.typology_analysis import add_typology_column, top_selling_typologies, get_sales_by_gender
+from utils.settings import get_setting
+
+# Filas por bloque al convertir el archivo de entrada
+DEFAULT_CHUNK_ROWS = 200_000
+
+# Máximo de filas de agregados parciales en memoria antes de volcarlos a disco
+DEFAULT_SPILL_ROWS = 2_000_000
+
+# Particiones por hash de clave de cada volcado: al combinar, se lee una por vez
+DEFAULT_SPILL_PARTITIONS = 16
+
+
+@dataclass
+class ChunkedDataset:
+    """Dataset canónico (ya parseado y con tipologías) guardado en bloques Parquet en disco."""
+    directory: str
+    parts: List[str] = field(default_factory=list)
+    columns: List[str] = field(default_factory=list)
+    filas: int = 0
+
+
+def _work_dir(prefix: str) -> str:
+    base = get_setting("datasets", "spill_dir") or tempfile.gettempdir()
+    os.makedirs(base, exist_ok=True)
+    return tempfile.mkdtemp(prefix=prefix, dir=base)
+
+
+def _excel_value(value):
+    # Igual que pandas con openpyxl: los números enteros guardados como float vuelven a int
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return np.nan if value is None else value
+
+
+def _iter_raw_chunks(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Lee el archivo de entrada por bloques sin cargarlo entero (xlsx en modo read_only, csv por chunks)."""
+    name = path.lower()
+    if name.endswith('.csv'):
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+        return
+    if name.endswith('.xls'):
+        # xlrd no permite lectura incremental: se lee entero y se parte en bloques
+        df = pd.read_excel(path, engine='xlrd')
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"Unnamed: {i}" for i, c in enumerate(header)]
+        buffer = []
+        for row in rows:
+            buffer.append([_excel_value(v) for v in row])
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        wb.close()
+
+
+def convert_to_chunks(path: str, out_dir: Optional[str] = None, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> ChunkedDataset:
+    """
+    Convierte un archivo (xlsx, xls o csv) más grande que la RAM a bloques Parquet canónicos.
+    Cada bloque pasa por el mismo parser y add_typology_column que el camino en memoria.
+    """
+    out_dir = out_dir or _work_dir("chunks_")
+    os.makedirs(out_dir, exist_ok=True)
+    repo = DataRepository()
+    dataset = ChunkedDataset(directory=out_dir)
+
+    for i, raw in enumerate(_iter_raw_chunks(path, chunk_rows)):
+        df = add_typology_column(repo._parse_by_format(raw, os.path.basename(path)))
+        if not dataset.columns:
+            dataset.columns = list(df.columns)
+        # Cada bloque se escribe con su propio esquema (se leen de a uno, no hace falta unificarlos)
+        part = os.path.join(out_dir, f"part-{i:05d}.parquet")
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), part)
+        dataset.parts.append(part)
+        dataset.filas += len(df)
+
+    return dataset
+
+
+def iter_chunks(dataset: ChunkedDataset, columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """Recorre los bloques en orden, leyendo solo las columnas pedidas."""
+    for part in dataset.parts:
+        cols = [c for c in columns if c in dataset.columns] if columns else None
+        yield pq.read_table(part, columns=cols).to_pandas()
+
+
+def _partitions(df: pd.DataFrame, keys: List[str], partitions: int) -> np.ndarray:
+    # hash() de Python: 5, 5.0 y np.int64(5) son la misma clave para groupby y caen en la misma partición
+    # aunque la columna sea int en un volcado y float u object en otro
+    h = np.zeros(len(df), dtype=np.uint64)
+    for key in keys:
+        # Los nulos forman un solo grupo (dropna=False) y hash(nan) no es estable: van todos a la misma
+        valores = df[key].map(hash).where(df[key].notna(), 0)
+        h = h * np.uint64(1_000_003) ^ valores.to_numpy(dtype=np.int64).view(np.uint64)
+    return (h % np.uint64(partitions)).astype(np.int64)
+
+
+class _PartialAggregator:
+    """
+    Acumula agregados parciales por bloque y los combina con `reduce`. Si lo acumulado supera
+    `spill_rows`, se combina y se vuelca a disco repartido en `partitions` archivos por hash de
+    `keys`. Al final se combina una partición por vez (cada clave está siempre en la misma), así
+    en memoria solo hay una fracción de los volcados además del resultado.
+    """
+
+    def __init__(self, reduce: Callable[[pd.DataFrame], pd.DataFrame], keys: List[str],
+                 spill_rows: int = DEFAULT_SPILL_ROWS, partitions: int = DEFAULT_SPILL_PARTITIONS):
+        self.reduce = reduce
+        self.keys = keys
+        self.spill_rows = spill_rows
+        self.partitions = partitions
+        self._pending: List[pd.DataFrame] = []
+        self._pending_rows = 0
+        self._spilled: List[List[str]] = [[] for _ in range(partitions)]
+        self._spills = 0
+        self._spill_dir: Optional[str] = None
+
+    def add(self, partial: pd.DataFrame) -> None:
+        self._pending.append(partial)
+        self._pending_rows += len(partial)
+        if self._pending_rows > self.spill_rows:
+            merged = self.reduce(pd.concat(self._pending, ignore_index=True))
+            self._pending = [merged]
+            self._pending_rows = len(merged)
+            if self._pending_rows > self.spill_rows:
+                self._spill(merged)
+
+    def _spill(self, merged: pd.DataFrame) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = _work_dir("spill_")
+        particion = _partitions(merged, self.keys, self.partitions)
+        for i in range(self.partitions):
+            parte = merged[particion == i]
+            if len(parte):
+                path = os.path.join(self._spill_dir, f"spill-{self._spills:05d}-p{i:03d}.parquet")
+                parte.to_parquet(path, index=False)
+                self._spilled[i].append(path)
+        self._spills += 1
+        self._pending = []
+        self._pending_rows = 0
+
+    def result(self) -> pd.DataFrame:
+        pending = pd.concat(self._pending, ignore_index=True) if self._pending else None
+        if not self._spills:
+            return self.reduce(pending) if pending is not None else pd.DataFrame()
+        try:
+            particion = _partitions(pending, self.keys, self.partitions) if pending is not None else None
+            reducidas = []
+            for i in range(self.partitions):
+                # El orden (volcados primero, luego lo pendiente) respeta el orden de los bloques para 'first'
+                frames = [pd.read_parquet(p) for p in self._spilled[i]]
+                if pending is not None:
+                    frames.append(pending[particion == i])
+                frames = [f for f in frames if len(f)]
+                if frames:
+                    reducidas.append(self.reduce(pd.concat(frames, ignore_index=True)))
+        finally:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+        if not reducidas:
+            return pd.DataFrame()
+        # Cada clave aparece una sola vez: este reduce solo deja las filas ordenadas por clave como antes
+        return self.reduce(pd.concat(reducidas, ignore_index=True))
+
+
+def _sum_by(keys: List[str], first_cols: List[str] = ()) -> Callable[[pd.DataFrame], pd.DataFrame]:
+    # sum y first son descomponibles: aplicar la misma agregación a los parciales da el total exacto.
+    # Las claves nulas se conservan: las funciones en memoria las suman al total (p. ej. el peso de
+    # cada cliente) aunque después no las muestren
+    def reduce(df: pd.DataFrame) -> pd.DataFrame:
+        agg = {'cantidad_vendida': 'sum'}
+        for col in first_cols:
+            if col in df.columns:
+                agg[col] = 'first'
+        return df.groupby(keys, dropna=False).agg(agg).reset_index()
+    return reduce
+
+
+def _solo_ventas(df: pd.DataFrame) -> pd.DataFrame:
+    return df[df['cuenta_ventas'] == True] if 'cuenta_ventas' in df.columns else df
+
+
+def _aggregate(dataset: ChunkedDataset, columns: List[str], prepare: Callable[[pd.DataFrame], pd.DataFrame],
+               keys: List[str], first_cols: List[str], spill_rows: int) -> pd.DataFrame:
+    reduce = _sum_by(keys, first_cols)
+    aggregator = _PartialAggregator(reduce, keys, spill_rows)
+    for chunk in iter_chunks(dataset, columns):
+        aggregator.add(reduce(prepare(chunk)))
+    merged = aggregator.result()
+    if merged.empty:
+        merged = pd.DataFrame(columns=[c for c in columns if c in dataset.columns and c != 'cuenta_ventas'])
+    return merged
+
+
+def top_selling_products_chunked(dataset: ChunkedDataset, n: int = 10, spill_rows: int = DEFAULT_SPILL_ROWS) -> pd.DataFrame:
+    """Versión por bloques de top_selling_products: mismo resultado sin cargar el dataset entero."""
+    keys = [c for c in ['codigo_del_articulo', 'descripcion_del_producto'] if c in dataset.columns]
+    merged = _aggregate(dataset, keys + ['cantidad_vendida', 'cuenta_ventas'], _solo_ventas, keys, [], spill_rows)
+    # Sobre los parciales ya combinados, la función en memoria produce el mismo ranking y formato
+    return top_selling_products(merged, n)
+
+
+def client_share_of_sales_chunked(dataset: ChunkedDataset, spill_rows: int = DEFAULT_SPILL_ROWS) -> pd.DataFrame:
+    """Versión por bloques de client_share_of_sales."""
+    first_cols = ['nombre_cliente', 'localidad']
+    columns = ['cliente', 'cantidad_vendida', 'cuenta_ventas'] + first_cols
+    merged = _aggregate(dataset, columns, _solo_ventas, ['cliente'], first_cols, spill_rows)
+    return client_share_of_sales(merged)
+
+
+def _con_signo(df: pd.DataFrame) -> pd.DataFrame:
+    # Devoluciones y ventas por separado: client_returns_count solo mira el signo de cada fila
+    df = df[(df['cantidad_vendida'] < 0) | (df['cantidad_vendida'] > 0)]
+    return df.assign(_signo=np.sign(df['cantidad_vendida']))
+
+
+def client_returns_count_chunked(dataset: ChunkedDataset, spill_rows: int = DEFAULT_SPILL_ROWS) -> pd.DataFrame:
+    """
+    Versión por bloques de client_returns_count. Se agrega una fila de devoluciones y otra de ventas
+    por cliente (con el primer nombre/localidad de cada lado), que reproduce exactamente el resultado.
+    """
+    first_cols = ['nombre_cliente', 'localidad']
+    columns = ['cliente', 'cantidad_vendida'] + first_cols
+    merged = _aggregate(dataset, columns, _con_signo, ['cliente', '_signo'], first_cols, spill_rows)
+    return client_returns_count(merged.drop(columns=['_signo'], errors='ignore'))
+
+
+def top_selling_typologies_chunked(dataset: ChunkedDataset, n: int = 5, spill_rows: int = DEFAULT_SPILL_ROWS) -> pd.DataFrame:
+    """Versión por bloques de top_selling_typologies."""
+    merged = _aggregate(dataset, ['tipologia', 'cantidad_vendida', 'cuenta_ventas'], _solo_ventas, ['tipologia'], [], spill_rows)
+    return top_selling_typologies(merged.assign(cuenta_ventas=True), n)
+
+
+def get_sales_by_gender_chunked(dataset: ChunkedDataset, spill_rows: int = DEFAULT_SPILL_ROWS) -> pd.DataFrame:
+    """Versión por bloques de get_sales_by_gender."""
+    merged = _aggregate(dataset, ['genero', 'cantidad_vendida', 'cuenta_ventas'], _solo_ventas, ['genero'], [], spill_rows)
+    return get_sales_by_gender(merged.assign(cuenta_ventas=True))
+
+
+CHUNKED_ANALYSES: Dict[str, Callable[..., pd.DataFrame]] = {
+    'top_selling_products': top_selling_products_chunked,
+    'client_share_of_sales': client_share_of_sales_chunked,
+    'client_returns_count': client_returns_count_chunked,
+    'top_selling_typologies': top_selling_typologies_chunked,
+    'get_sales_by_gender': get_sales_by_gender_chunked,
+}
@@ -0,0 +1,186 @@
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+import polars as pl
+
+from functions import client_analysis, product_analysis, typology_analysis
+from functions.result_cache import memoize_by_fingerprint
+
+# Columnas que usan los análisis; el resto del dataset no se convierte a Polars
+_COLUMNAS = [
+    'cliente', 'nombre_cliente', 'localidad', 'codigo_del_articulo', 'descripcion_del_producto',
+    'cantidad_vendida', 'cuenta_ventas', 'tipologia', 'genero',
+]
+
+
+@memoize_by_fingerprint
+def _to_polars(df: pd.DataFrame) -> Optional[pl.DataFrame]:
+    # Una conversión por dataset (memoizada por huella); con columnas Arrow no se copian los datos.
+    # Si alguna columna no se puede representar (p. ej. tipos mezclados) se devuelve None
+    # y el análisis usa la versión de pandas.
+    try:
+        return pl.from_pandas(df[[c for c in _COLUMNAS if c in df.columns]])
+    except (pl.exceptions.PolarsError, TypeError, ValueError):
+        # pyarrow.ArrowInvalid / ArrowTypeError heredan de ValueError / TypeError
+        return None
+
+
+def _solo_ventas(lf: pl.LazyFrame, columns: List[str]) -> pl.LazyFrame:
+    return lf.filter(pl.col('cuenta_ventas') == True) if 'cuenta_ventas' in columns else lf  # noqa: E712
+
+
+def _first(col: str) -> pl.Expr:
+    # 'first' de pandas: primer valor no nulo del grupo
+    return pl.col(col).drop_nulls().first()
+
+
+def _ranked_sum(lf: pl.LazyFrame, keys: List[str]) -> pd.DataFrame:
+    """
+    Suma de cantidad_vendida por `keys` ordenada de mayor a menor, igual que
+    groupby(keys).sum().reset_index().sort_values(kind='stable') en pandas (incluido el índice).
+    """
+    result = (
+        lf.drop_nulls(keys)
+        .group_by(keys)
+        .agg(pl.col('cantidad_vendida').sum())
+        .sort(keys)
+        .with_row_index('_orden')
+        .sort('cantidad_vendida', descending=True, maintain_order=True)
+        .collect()
+        .to_pandas()
+    )
+    result.index = pd.Index(result.pop('_orden').to_numpy(dtype='int64'))
+    return result
+
+
+def _formatear_porcentaje(serie: pd.Series) -> pd.Series:
+    # El formato se aplica en Python para que el redondeo sea idéntico al de pandas
+    return serie.apply(lambda x: f"{x:.1f}%")
+
+
+@memoize_by_fingerprint
+def _ranked_products(df: pd.DataFrame) -> pd.DataFrame:
+    pdf = _to_polars(df)
+    if pdf is None:
+        return product_analysis._ranked_products(df)
+    keys = ['codigo_del_articulo'] + (['descripcion_del_producto'] if 'descripcion_del_producto' in pdf.columns else [])
+    return _ranked_sum(_solo_ventas(pdf.lazy(), pdf.columns), keys)
+
+
+def top_selling_products(df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    """
+    Devuelve los n productos más vendidos en general. Solo cuenta ventas normales.
+    """
+    return _ranked_products(df).head(n)
+
+
+@memoize_by_fingerprint
+def client_share_of_sales(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Devuelve el peso (porcentaje) de cada cliente sobre el total neto de unidades vendidas.
+    Mismo esquema de salida que client_analysis.client_share_of_sales.
+    """
+    pdf = _to_polars(df)
+    if pdf is None:
+        return client_analysis.client_share_of_sales(df)
+
+    ventas = _solo_ventas(pdf.lazy(), pdf.columns)
+    extras = [c for c in ['nombre_cliente', 'localidad'] if c in pdf.columns]
+    total_unidades = ventas.select(pl.col('cantidad_vendida').sum()).collect().item()
+
+    resumen = (
+        ventas.drop_nulls('cliente')
+        .group_by('cliente')
+        .agg([pl.col('cantidad_vendida').sum()] + [_first(c) for c in extras])
+        .sort('cliente')
+        .sort('cantidad_vendida', descending=True, maintain_order=True)
+        .with_columns(
+            (100 * pl.col('cantidad_vendida') / total_unidades if total_unidades > 0 else pl.lit(0)).alias('porcentaje')
+        )
+        .with_row_index('Ranking', offset=1)
+        .collect()
+        .to_pandas()
+    )
+    resumen['Ranking'] = resumen['Ranking'].astype('int64')
+    resumen['Porcentaje'] = _formatear_porcentaje(resumen['porcentaje'])
+    return resumen[['Ranking', 'cliente'] + extras + ['cantidad_vendida', 'Porcentaje']]
+
+
+@memoize_by_fingerprint
+def client_returns_count(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Devuelve la cantidad de devoluciones por cliente con porcentaje, nombre del cliente, localidad y ranking.
+    Mismo esquema de salida que client_analysis.client_returns_count.
+    """
+    pdf = _to_polars(df)
+    if pdf is None:
+        return client_analysis.client_returns_count(df)
+
+    lf = pdf.lazy().drop_nulls('cliente')
+    extras = [c for c in ['nombre_cliente', 'localidad'] if c in pdf.columns]
+    devoluciones = (
+        lf.filter(pl.col('cantidad_vendida') < 0)
+        .group_by('cliente')
+        .agg([pl.col('cantidad_vendida').abs().sum().alias('cantidad_devoluciones')] + [_first(c) for c in extras])
+        .sort('cliente')
+    )
+    ventas = (
+        lf.filter(pl.col('cantidad_vendida') > 0)
+        .group_by('cliente')
+        .agg(pl.col('cantidad_vendida').sum().alias('total_vendido'))
+    )
+    result = (
+        devoluciones.join(ventas, on='cliente', how='left', maintain_order='left')
+        .with_columns(pl.col('total_vendido').fill_null(0))
+        .with_columns((pl.col('cantidad_devoluciones') / pl.col('total_vendido') * 100).fill_nan(0).alias('porcentaje_devolucion'))
+        .sort('porcentaje_devolucion', descending=True, maintain_order=True)
+        .with_row_index('Ranking', offset=1)
+        .collect()
+        .to_pandas()
+    )
+    if result.empty:
+        # Mismo DataFrame vacío (y mismas columnas) que la versión de pandas
+        return client_analysis.client_returns_count(df.head(0))
+
+    result['Ranking'] = result['Ranking'].astype('int64')
+    result['Porcentaje devoluciones'] = _formatear_porcentaje(result['porcentaje_devolucion'])
+    return result[['Ranking', 'cliente'] + extras + ['cantidad_devoluciones', 'total_vendido', 'Porcentaje devoluciones']]
+
+
+@memoize_by_fingerprint
+def _ranked_typologies(df: pd.DataFrame) -> pd.DataFrame:
+    if 'tipologia' not in df.columns:
+        df = typology_analysis.add_typology_column(df)
+    pdf = _to_polars(df)
+    if pdf is None:
+        return typology_analysis._ranked_typologies(df)
+    return _ranked_sum(_solo_ventas(pdf.lazy(), pdf.columns), ['tipologia'])
+
+
+def top_selling_typologies(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
+    """
+    Devuelve las n tipologías más vendidas (solo cuenta ventas normales).
+    """
+    return _ranked_typologies(df).head(n)
+
+
+@memoize_by_fingerprint
+def get_sales_by_gender(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Devuelve las ventas agrupadas por género (solo ventas normales).
+    """
+    if 'genero' not in df.columns:
+        df = typology_analysis.add_typology_column(df)
+    pdf = _to_polars(df)
+    if pdf is None:
+        return typology_analysis.get_sales_by_gender(df)
+    return _ranked_sum(_solo_ventas(pdf.lazy(), pdf.columns), ['genero'])
+
+
+POLARS_ANALYSES: Dict[str, Callable[..., pd.DataFrame]] = {
+    'top_selling_products': top_selling_products,
+    'client_share_of_sales': client_share_of_sales,
+    'client_returns_count': client_returns_count,
+    'top_selling_typologies': top_selling_typologies,
+    'get_sales_by_gender': get_sales_by_gender,
+}
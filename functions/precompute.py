@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from utils.settings import get_setting
+
+# Hilos del proceso dedicados a precalcular (compartidos por todas las sesiones)
+DEFAULT_WORKERS = 2
+
+
+class _Job:
+    def __init__(self, clave: str, tasks: Dict[str, Callable[[], Any]]):
+        self.clave = clave
+        self.tasks = tasks
+        self.total = len(tasks)
+        self.done: Dict[str, float] = {}        # análisis -> segundos que tardó
+        self.errors: Dict[str, str] = {}
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+
+class Precomputer:
+    """
+    Precalcula en segundo plano los análisis de un dataset apenas se carga, para que sus resultados
+    ya estén en la cache de resultados cuando el usuario cambia de vista. Hay un trabajo por sesión:
+    al abrir otro dataset el anterior se cancela (lo que está corriendo termina, lo pendiente no se
+    ejecuta). Cada trabajo corre sus análisis en orden en un único hilo del pool.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, _Job] = {}
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # El pool se crea recién con el primer trabajo
+        if self._pool is None:
+            max_workers = self.max_workers or int(get_setting("precompute", "workers", DEFAULT_WORKERS))
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="precompute")
+        return self._pool
+
+    def _run(self, job: _Job) -> None:
+        try:
+            for nombre, task in job.tasks.items():
+                if job.cancelled.is_set():
+                    break
+                start = time.perf_counter()
+                try:
+                    task()
+                except Exception as e:
+                    # Un análisis que falla acá se volverá a intentar (y a mostrar) desde la vista
+                    job.errors[nombre] = str(e)
+                job.done[nombre] = time.perf_counter() - start
+        finally:
+            # Soltar las referencias al dataset que tienen las tareas
+            job.tasks = {}
+            job.finished.set()
+
+    def start(self, session_id: str, clave: str, tasks: Dict[str, Callable[[], Any]]) -> None:
+        """
+        Lanza el precálculo del dataset `clave` para la sesión. Si la sesión ya tenía un trabajo para
+        ese mismo dataset no hace nada; si era de otro dataset, lo cancela.
+        """
+        with self._lock:
+            anterior = self._jobs.get(session_id)
+            if anterior is not None and anterior.clave == clave:
+                return
+            if anterior is not None:
+                anterior.cancelled.set()
+            job = _Job(clave, tasks)
+            self._jobs[session_id] = job
+            self._executor().submit(self._run, job)
+
+    def cancel(self, session_id: str) -> None:
+        """Cancela el trabajo de la sesión (p. ej. cuando descarta su dataset)."""
+        with self._lock:
+            job = self._jobs.pop(session_id, None)
+        if job is not None:
+            job.cancelled.set()
+
+    def status(self, session_id: str) -> Optional[dict]:
+        """Avance del trabajo de la sesión: {'clave', 'hechos', 'total', 'terminado', 'cancelado', 'tiempos', 'errores'}."""
+        with self._lock:
+            job = self._jobs.get(session_id)
+        if job is None:
+            return None
+        return {
+            'clave': job.clave,
+            'hechos': len(job.done),
+            'total': job.total,
+            'terminado': job.finished.is_set(),
+            'cancelado': job.cancelled.is_set(),
+            'tiempos': dict(job.done),
+            'errores': dict(job.errors),
+        }
+
+    def wait(self, session_id: str, timeout: Optional[float] = None) -> bool:
+        """Espera a que termine el trabajo de la sesión (para scripts y benchmarks)."""
+        with self._lock:
+            job = self._jobs.get(session_id)
+        return job is None or job.finished.wait(timeout)
+
+
+# Instancia única por proceso (compartida por todas las sesiones de Streamlit)
+precomputer = Precomputer()
@@ -1,19 +1,20 @@
 import pandas as pd
 from typing import Optional
+from functions.result_cache import memoize_by_fingerprint
+from functions.trend_analysis import monthly_rollup, rollup_for_month
 
 def top_selling_product_by_month(df: pd.DataFrame, month: int, year: int) -> pd.DataFrame:
     """
     Devuelve el producto más vendido en un mes y año específico.
+    Usa el rollup mensual precalculado al cargar (no modifica df ni recorre los otros meses).
     """
-    df['fecha_de_la_venta'] = pd.to_datetime(df['fecha_de_la_venta'])
-    filtered = df[(df['fecha_de_la_venta'].dt.month == month) & (df['fecha_de_la_venta'].dt.year == year)]
-    result = filtered.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
-    return result.sort_values('cantidad_vendida', ascending=False).head(1)
+    keys = ('codigo_del_articulo', 'descripcion_del_producto')
+    result = rollup_for_month(monthly_rollup(df, keys), f"{int(year):04d}-{int(month):02d}")
+    return result.sort_values('cantidad_vendida', ascending=False, kind='stable').head(1)
 
-def top_selling_products(df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
-    """
-    Devuelve los n productos más vendidos en general. Solo cuenta ventas normales.
-    """
+@memoize_by_fingerprint
+def _ranked_products(df: pd.DataFrame) -> pd.DataFrame:
+    # Ranking completo memoizado por dataset: cambiar n solo recorta, no recalcula
     # Filtrar solo las ventas que cuentan (excluir categorías especiales)
     if 'cuenta_ventas' in df.columns:
         df_ventas = df[df['cuenta_ventas'] == True]
@@ -26,4 +27,10 @@ def top_selling_products(df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
         groupby_cols.append('descripcion_del_producto')
         
     result = df_ventas.groupby(groupby_cols)['cantidad_vendida'].sum().reset_index()
-    return result.sort_values('cantidad_vendida', ascending=False).head(n) 
\ No newline at end of file
+    return result.sort_values('cantidad_vendida', ascending=False, kind='stable')
+
+def top_selling_products(df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    """
+    Devuelve los n productos más vendidos en general. Solo cuenta ventas normales.
+    """
+    return _ranked_products(df).head(n)
@@ -0,0 +1,253 @@
+import functools
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from functions.schemas import PARSER_VERSION
+from utils.tracing import span
+
+# Huella (fingerprint) de cada DataFrame cargado, indexada por id del objeto.
+# Solo el objeto registrado tiene huella: los DataFrames derivados (filtros, copias)
+# no la heredan, así nunca se confunde un subconjunto con el dataset completo.
+_fingerprints: Dict[int, Tuple[weakref.ref, str]] = {}
+
+# Columnas mapeadas (memory map) de cada DataFrame abierto del almacén Arrow, con el mismo esquema
+_mapped: Dict[int, Tuple[weakref.ref, frozenset]] = {}
+
+# Presupuesto de memoria por defecto para los resultados memoizados (bytes)
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def content_fingerprint(content: bytes, parser_version: str = PARSER_VERSION) -> str:
+    """Huella barata del archivo: hash del contenido crudo más la versión de los parsers."""
+    h = hashlib.blake2b(content, digest_size=16)
+    h.update(str(parser_version).encode())
+    return h.hexdigest()
+
+
+def derive_fingerprint(base: str, *parts: Any) -> str:
+    """Huella de un dataset derivado (preprocesado o filtrado) a partir de la huella base."""
+    h = hashlib.blake2b(str(base).encode(), digest_size=16)
+    for part in parts:
+        h.update(b'\x1f')
+        h.update(repr(part).encode())
+    return h.hexdigest()
+
+
+def set_fingerprint(df: pd.DataFrame, fingerprint: str) -> pd.DataFrame:
+    """Asocia la huella al DataFrame (sin copiarlo) y lo devuelve."""
+    key = id(df)
+
+    def _drop(_ref, key=key):
+        _fingerprints.pop(key, None)
+
+    _fingerprints[key] = (weakref.ref(df, _drop), fingerprint)
+    return df
+
+
+def get_fingerprint(df: pd.DataFrame) -> Optional[str]:
+    """Devuelve la huella registrada para este objeto, o None si no tiene."""
+    entry = _fingerprints.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return None
+
+
+def mark_mapped(df: pd.DataFrame, columns) -> pd.DataFrame:
+    """
+    Registra qué columnas de este objeto están respaldadas por un archivo mapeado en memoria (page
+    cache compartido, no memoria propia del proceso). Como la huella, no pasa a los derivados.
+    """
+    key = id(df)
+
+    def _drop(_ref, key=key):
+        _mapped.pop(key, None)
+
+    _mapped[key] = (weakref.ref(df, _drop), frozenset(columns))
+    return df
+
+
+def _mapped_columns(df: pd.DataFrame) -> frozenset:
+    entry = _mapped.get(id(df))
+    if entry is not None and entry[0]() is df:
+        return entry[1]
+    return frozenset()
+
+
+def estimate_bytes(value: Any) -> int:
+    """Estimación del tamaño en memoria de un resultado (DataFrames, matrices, dicts y dataclasses)."""
+    if isinstance(value, pd.DataFrame):
+        mapeadas = _mapped_columns(value)
+        if mapeadas:
+            # Las páginas mapeadas las comparte el page cache; solo cuenta lo que vive en el heap
+            propias = [c for c in value.columns if c not in mapeadas]
+            return int(value[propias].memory_usage(index=True, deep=True).sum())
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, pd.Index):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sum(estimate_bytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_bytes(v) for v in value)
+    if hasattr(value, 'estimated_size'):
+        # DataFrames de Polars
+        return int(value.estimated_size())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if hasattr(value, 'data') and hasattr(value, 'indices') and hasattr(value, 'indptr'):
+        # matrices dispersas de scipy (csr/csc)
+        return int(value.data.nbytes + value.indices.nbytes + value.indptr.nbytes)
+    if hasattr(value, '__dict__'):
+        return sum(estimate_bytes(v) for v in vars(value).values())
+    return 64
+
+
+def _copy_result(value: Any) -> Any:
+    # Los resultados cacheados se entregan como copia para que la UI pueda modificarlos
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: _copy_result(v) for k, v in value.items()}
+    return value
+
+
+class ResultCache:
+    """
+    Cache LRU de resultados de análisis con presupuesto de memoria en bytes.
+    Las claves son (función, huella del dataset, parámetros normalizados).
+    """
+
+    _MISSING = object()
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple) -> Any:
+        """Devuelve el valor cacheado o ResultCache._MISSING, actualizando estadísticas y orden LRU."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return self._MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __contains__(self, key: tuple) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def put(self, key: tuple, value: Any) -> None:
+        size = estimate_bytes(value)
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Un resultado más grande que todo el presupuesto no se guarda
+                return
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'entradas': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / consultas if consultas else 0.0,
+            }
+
+
+# Cache compartida por todas las funciones de análisis del proceso
+result_cache = ResultCache()
+
+
+def _normalize_param(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_normalize_param(v) for v in value]
+        return tuple(sorted(items, key=repr)) if isinstance(value, (set, frozenset)) else tuple(items)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _normalize_param(v)) for k, v in value.items()))
+    return value
+
+
+def normalize_filters(**filters: Any) -> tuple:
+    """Normaliza parámetros de filtro (espacios, mayúsculas, orden) para usarlos en claves de cache."""
+    normalized = ((k, _normalize_param(v)) for k, v in filters.items())
+    return tuple(sorted((k, v) for k, v in normalized if v not in (None, '', 'todas')))
+
+
+def dataset_key(df: pd.DataFrame, *params: Any) -> Optional[tuple]:
+    """Clave de cache para algo derivado de ese dataset; None si el DataFrame no tiene huella."""
+    fingerprint = get_fingerprint(df)
+    return None if fingerprint is None else (fingerprint,) + params
+
+
+def cache_key(func: Callable, fingerprint: str, *args, **kwargs) -> tuple:
+    return (func.__module__, func.__qualname__, fingerprint, args, tuple(sorted(kwargs.items())))
+
+
+def memoized_result(func: Callable, fingerprint: str, *args, **kwargs) -> Optional[Any]:
+    """
+    Resultado ya memoizado de `func` (ver memoize_by_fingerprint) para esa huella y parámetros, sin
+    necesitar el DataFrame; None si no está en la cache. Sirve para no armar un frame derivado caro
+    cuando su resultado ya se conoce.
+    """
+    key = cache_key(func, fingerprint, *args, **kwargs)
+    if key not in result_cache:
+        return None
+    value = result_cache.get(key)
+    return None if value is ResultCache._MISSING else _copy_result(value)
+
+
+def memoize_by_fingerprint(func: Callable) -> Callable:
+    """
+    Memoiza una función de análisis cuyo primer argumento es un DataFrame.
+    La clave es la huella del dataset más los parámetros; si el DataFrame no tiene huella
+    registrada se calcula directamente (nunca se hashea el DataFrame completo).
+    """
+    @functools.wraps(func)
+    def wrapper(df: pd.DataFrame, *args, **kwargs):
+        fingerprint = get_fingerprint(df)
+        if fingerprint is None:
+            with span(func.__name__, cache="sin huella"):
+                return func(df, *args, **kwargs)
+
+        key = cache_key(func, fingerprint, *args, **kwargs)
+        with span(func.__name__) as registro:
+            value = result_cache.get(key)
+            if registro is not None:
+                registro.atributos['cache'] = "miss" if value is ResultCache._MISSING else "hit"
+            if value is ResultCache._MISSING:
+                value = func(df, *args, **kwargs)
+                result_cache.put(key, value)
+            return _copy_result(value)
+
+    return wrapper
@@ -1,11 +1,12 @@
 import unicodedata
 import pandas as pd
 from typing import Dict, List, Tuple
+from utils.tracing import traced
 
 CANONICAL_COLUMNS = [
     'cliente', 'nombre_cliente', 'localidad',
     'codigo_del_articulo', 'descripcion_del_producto',
-    'cantidad_vendida', 'total'
+    'cantidad_vendida', 'total', 'fecha_de_la_venta'
 ]
 
 ALIASES: Dict[str, List[str]] = {
@@ -15,11 +16,15 @@ ALIASES: Dict[str, List[str]] = {
     'codigo_del_articulo': ['artículo','articulo','codigo_articulo','cod_articulo','código_artículo','codigo','item','codigo_del_articulo'],
     'descripcion_del_producto': ['descripción_original','descripcion_original','descripción','descripcion','producto','desc_producto','articulo_desc','descripcion_del_producto','descripción_artículo','descripcion_artículo'],
     'cantidad_vendida': ['unidades','cantidad','cant','cantidad_vendida','units','qty'],
-    'total': ['total','importe','monto','precio_total']
+    'total': ['total','importe','monto','precio_total'],
+    'fecha_de_la_venta': ['fecha_de_la_venta','fecha','fecha_venta','fecha_de_venta','fecha_comprobante']
 }
 
 REQUIRED_BASE = {'cliente','cantidad_vendida'}
 
+# Subir cuando cambie la lógica de canonicalización o de los parsers: invalida las huellas de los datasets
+PARSER_VERSION = '3'
+
 
 def normalize_text(s: str) -> str:
     if s is None:
@@ -49,22 +54,33 @@ def map_aliases_to_canonical(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str,s
     return df, rename_map
 
 
+def _as_code(s: pd.Series) -> pd.Series:
+    # Una columna de códigos numéricos con celdas vacías llega como float: sin esto "2514001"
+    # se convertiría en "2514001.0" según haya o no vacíos en el archivo (o en el bloque leído)
+    if pd.api.types.is_float_dtype(s) and (s.dropna() % 1 == 0).all():
+        return s.astype('Int64').astype(str).where(s.notna(), s.astype(str)).str.strip()
+    return s.astype(str).str.strip()
+
+
 def coerce_types(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     if 'cliente' in df.columns:
-        df['cliente'] = df['cliente'].astype(str).str.strip()
+        df['cliente'] = _as_code(df['cliente'])
     if 'nombre_cliente' in df.columns:
         df['nombre_cliente'] = df['nombre_cliente'].astype(str).str.strip()
     if 'localidad' in df.columns:
         df['localidad'] = df['localidad'].astype(str).str.strip()
     if 'codigo_del_articulo' in df.columns:
-        df['codigo_del_articulo'] = df['codigo_del_articulo'].astype(str).str.strip()
+        df['codigo_del_articulo'] = _as_code(df['codigo_del_articulo'])
     if 'descripcion_del_producto' in df.columns:
         df['descripcion_del_producto'] = df['descripcion_del_producto'].astype(str).str.strip()
     if 'cantidad_vendida' in df.columns:
         df['cantidad_vendida'] = pd.to_numeric(df['cantidad_vendida'], errors='coerce')
     if 'total' in df.columns:
         df['total'] = pd.to_numeric(df['total'], errors='coerce')
+    if 'fecha_de_la_venta' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['fecha_de_la_venta']):
+        # Se parsea una sola vez al cargar; los análisis por mes usan la columna ya tipada
+        df['fecha_de_la_venta'] = pd.to_datetime(df['fecha_de_la_venta'], errors='coerce', dayfirst=True)
     return df
 
 
@@ -72,6 +88,7 @@ def validate_required(df: pd.DataFrame, required: List[str]) -> List[str]:
     return [c for c in required if c not in df.columns]
 
 
+@traced()
 def canonicalize(df: pd.DataFrame, required: List[str] = None) -> Tuple[pd.DataFrame, List[str]]:
     df = normalize_columns(df)
     df, _ = map_aliases_to_canonical(df)
@@ -0,0 +1,484 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from functions import arrow_store
+from utils.settings import get_setting
+
+# Claves que guarda cada resumen por archivo (más capacidad = menos error al combinar)
+DEFAULT_CAPACITY = 1000
+
+# Subir si cambia el formato de los resúmenes guardados
+SKETCH_VERSION = 1
+
+# Precisión de los HyperLogLog de alcance de clientes: 2**p registros, error típico 1.04 / sqrt(2**p)
+DEFAULT_PRECISION = 11
+
+# dimensión de alcance -> columnas que forman la clave
+REACH_DIMENSIONS = {
+    'articulo': ['codigo_del_articulo'],
+    'tipologia': ['tipologia'],
+    'genero': ['genero'],
+    'localidad': ['localidad'],
+    'tipologia_localidad': ['tipologia', 'localidad'],
+}
+
+# Separador interno de las claves compuestas (no aparece en los datos)
+_SEP = '\x1f'
+
+# tipo de resumen -> (columna clave, columna con la etiqueta a mostrar)
+SKETCH_KINDS = {
+    'articulos': ('codigo_del_articulo', 'descripcion_del_producto'),
+    'clientes': ('cliente', 'nombre_cliente'),
+}
+
+
+@dataclass
+class TopKSketch:
+    """
+    Resumen combinable de los más vendidos (estilo Space-Saving) de uno o varios archivos.
+    Guarda a lo sumo `capacidad` claves con cotas [inferior, superior] de su total de unidades;
+    una clave ausente tiene su total entre `inferior_ausentes` y `superior_ausentes`.
+    Combinar resúmenes suma las cotas, así el error queda acotado y se informa por clave.
+    """
+    capacidad: int
+    superior: Dict[str, float] = field(default_factory=dict)
+    inferior: Dict[str, float] = field(default_factory=dict)
+    etiquetas: Dict[str, str] = field(default_factory=dict)
+    superior_ausentes: float = 0.0
+    inferior_ausentes: float = 0.0
+    total: float = 0.0
+    archivos: int = 0
+
+    @classmethod
+    def from_totals(cls, totales: pd.Series, capacidad: int = DEFAULT_CAPACITY,
+                    etiquetas: Optional[pd.Series] = None) -> "TopKSketch":
+        """
+        Resumen de un archivo a partir de sus totales exactos por clave (el archivo ya está en memoria
+        al ingerirlo, así que el resumen de un archivo no tiene error: solo la combinación lo agrega).
+        """
+        totales = totales.dropna().sort_values(ascending=False, kind='stable')
+        guardadas = totales.iloc[:capacidad]
+        resto = totales.iloc[capacidad:]
+        sketch = cls(capacidad=capacidad, total=float(totales.sum()), archivos=1)
+        sketch.superior = {str(k): float(v) for k, v in guardadas.items()}
+        sketch.inferior = dict(sketch.superior)
+        if etiquetas is not None:
+            sketch.etiquetas = {str(k): str(v) for k, v in etiquetas.reindex(guardadas.index).dropna().items()}
+        # Una clave que no está en el archivo suma 0; una descartada, entre el menor y el mayor total descartado
+        sketch.superior_ausentes = max(0.0, float(resto.max())) if len(resto) else 0.0
+        sketch.inferior_ausentes = min(0.0, float(resto.min())) if len(resto) else 0.0
+        return sketch
+
+    @classmethod
+    def merge(cls, sketches: Iterable["TopKSketch"], capacidad: Optional[int] = None) -> "TopKSketch":
+        """Combina resúmenes de distintos archivos (asociativo y conmutativo)."""
+        sketches = list(sketches)
+        capacidad = capacidad or max((s.capacidad for s in sketches), default=DEFAULT_CAPACITY)
+        claves = sorted(set().union(*(s.superior for s in sketches))) if sketches else []
+
+        superior = np.zeros(len(claves))
+        inferior = np.zeros(len(claves))
+        for s in sketches:
+            superior += [s.superior.get(k, s.superior_ausentes) for k in claves]
+            inferior += [s.inferior.get(k, s.inferior_ausentes) for k in claves]
+
+        orden = np.argsort(-superior, kind='stable')
+        guardadas, descartadas = orden[:capacidad], orden[capacidad:]
+        merged = cls(
+            capacidad=capacidad,
+            total=sum(s.total for s in sketches),
+            archivos=sum(s.archivos for s in sketches),
+        )
+        merged.superior = {claves[i]: float(superior[i]) for i in guardadas}
+        merged.inferior = {claves[i]: float(inferior[i]) for i in guardadas}
+        for s in sketches:
+            for k, v in s.etiquetas.items():
+                if k in merged.superior:
+                    merged.etiquetas.setdefault(k, v)
+        merged.superior_ausentes = max(
+            sum(s.superior_ausentes for s in sketches),
+            float(superior[descartadas].max()) if len(descartadas) else 0.0,
+        )
+        merged.inferior_ausentes = sum(s.inferior_ausentes for s in sketches)
+        return merged
+
+    def top(self, n: int = 10) -> pd.DataFrame:
+        """
+        Las n claves con mayor cota superior. 'cantidad_vendida' es la estimación (cota superior),
+        'cota_inferior' el mínimo garantizado y 'error' la diferencia entre ambas.
+        """
+        claves = sorted(self.superior, key=lambda k: (-self.superior[k], k))[:n]
+        return pd.DataFrame({
+            'Ranking': range(1, len(claves) + 1),
+            'clave': claves,
+            'etiqueta': [self.etiquetas.get(k) for k in claves],
+            'cantidad_vendida': [self.superior[k] for k in claves],
+            'cota_inferior': [self.inferior[k] for k in claves],
+            'error': [self.superior[k] - self.inferior[k] for k in claves],
+        })
+
+    def top_is_exact(self, n: int) -> bool:
+        """True si el top-n está garantizado: cada uno supera la cota superior de cualquier otra clave."""
+        ranking = self.top(len(self.superior))
+        if len(ranking) < n:
+            return ranking['error'].eq(0).all() and self.superior_ausentes <= 0
+        resto = max(ranking['cantidad_vendida'].iloc[n:].max() if len(ranking) > n else float('-inf'),
+                    self.superior_ausentes)
+        return bool(ranking['cota_inferior'].iloc[:n].min() >= resto)
+
+    def to_dict(self) -> dict:
+        claves = list(self.superior)
+        return {
+            'version': SKETCH_VERSION,
+            'capacidad': self.capacidad,
+            'claves': claves,
+            'superior': [self.superior[k] for k in claves],
+            'inferior': [self.inferior[k] for k in claves],
+            'etiquetas': self.etiquetas,
+            'superior_ausentes': self.superior_ausentes,
+            'inferior_ausentes': self.inferior_ausentes,
+            'total': self.total,
+            'archivos': self.archivos,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TopKSketch":
+        return cls(
+            capacidad=data['capacidad'],
+            superior=dict(zip(data['claves'], data['superior'])),
+            inferior=dict(zip(data['claves'], data['inferior'])),
+            etiquetas=data.get('etiquetas', {}),
+            superior_ausentes=data['superior_ausentes'],
+            inferior_ausentes=data['inferior_ausentes'],
+            total=data['total'],
+            archivos=data.get('archivos', 1),
+        )
+
+
+def _capacity() -> int:
+    return int(get_setting("sketches", "capacity", DEFAULT_CAPACITY))
+
+
+def _solo_ventas(df: pd.DataFrame) -> pd.DataFrame:
+    return df[df['cuenta_ventas'] == True] if 'cuenta_ventas' in df.columns else df
+
+
+def build_file_sketches(df: pd.DataFrame, capacidad: Optional[int] = None) -> Dict[str, TopKSketch]:
+    """Resúmenes de artículos y clientes de un dataset preparado (solo ventas normales)."""
+    capacidad = capacidad or _capacity()
+    df_ventas = _solo_ventas(df)
+    sketches = {}
+    for kind, (key, label) in SKETCH_KINDS.items():
+        if key not in df_ventas.columns:
+            continue
+        totales = df_ventas.groupby(key)['cantidad_vendida'].sum()
+        etiquetas = df_ventas.groupby(key)[label].first() if label in df_ventas.columns else None
+        sketches[kind] = TopKSketch.from_totals(totales, capacidad, etiquetas)
+    return sketches
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    # Cantidad de bits significativos de cada uint64 (búsqueda binaria vectorizada, sin pasar por float)
+    x = x.copy()
+    n = np.zeros(x.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = x >= (np.uint64(1) << np.uint64(shift))
+        n[mask] += shift
+        x[mask] >>= np.uint64(shift)
+    return n + (x > 0)
+
+
+def _hll_positions(clientes: pd.Series, precision: int):
+    """Registro y rango (posición del primer 1) de cada cliente, a partir de un hash de 64 bits."""
+    h = pd.util.hash_pandas_object(clientes.astype(str), index=False).to_numpy(dtype=np.uint64)
+    resto_bits = 64 - precision
+    registro = (h >> np.uint64(resto_bits)).astype(np.int64)
+    resto = h & np.uint64((1 << resto_bits) - 1)
+    rango = (resto_bits - _bit_length(resto) + 1).astype(np.uint8)
+    return registro, rango
+
+
+@dataclass
+class ReachSketch:
+    """
+    HyperLogLog por grupo (artículo, tipología, etc.): clientes distintos aproximados de cada clave.
+    Combinar resúmenes de varios archivos es el máximo registro a registro, así un cliente que
+    compró en varios archivos se cuenta una sola vez.
+    """
+    precision: int
+    claves: np.ndarray          # claves como texto (las compuestas unidas por _SEP)
+    registros: np.ndarray       # uint8, una fila de 2**precision registros por clave
+
+    @property
+    def error_relativo(self) -> float:
+        return 1.04 / np.sqrt(2 ** self.precision)
+
+    @classmethod
+    def build(cls, claves: pd.Series, clientes: pd.Series, precision: int = DEFAULT_PRECISION) -> "ReachSketch":
+        m = 2 ** precision
+        codigos, unicos = pd.factorize(claves, sort=True)
+        registro, rango = _hll_positions(clientes, precision)
+        celdas = pd.Series(rango).groupby(codigos * m + registro).max()
+        registros = np.zeros(len(unicos) * m, dtype=np.uint8)
+        registros[celdas.index.to_numpy()] = celdas.to_numpy()
+        return cls(precision, np.asarray(unicos, dtype=str), registros.reshape(len(unicos), m))
+
+    @classmethod
+    def merge(cls, sketches: Iterable["ReachSketch"]) -> "ReachSketch":
+        sketches = list(sketches)
+        precision = sketches[0].precision if sketches else DEFAULT_PRECISION
+        claves = pd.Index(np.concatenate([s.claves for s in sketches]) if sketches else []).unique().sort_values()
+        registros = np.zeros((len(claves), 2 ** precision), dtype=np.uint8)
+        for s in sketches:
+            filas = claves.get_indexer(s.claves)
+            registros[filas] = np.maximum(registros[filas], s.registros)
+        return cls(precision, np.asarray(claves, dtype=str), registros)
+
+    def estimate(self) -> np.ndarray:
+        """Clientes distintos estimados por clave (con la corrección de rango chico de HyperLogLog)."""
+        m = 2 ** self.precision
+        alpha = 0.7213 / (1 + 1.079 / m)
+        potencias = np.power(2.0, -np.arange(66))
+        estimado = np.empty(len(self.claves))
+        # Por bloques para no materializar una matriz de floats del tamaño de todos los registros
+        for inicio in range(0, len(self.claves), 512):
+            bloque = self.registros[inicio:inicio + 512]
+            crudo = alpha * m * m / potencias[bloque].sum(axis=1)
+            vacios = (bloque == 0).sum(axis=1)
+            chico = (crudo <= 2.5 * m) & (vacios > 0)
+            crudo[chico] = m * np.log(m / vacios[chico])
+            estimado[inicio:inicio + 512] = crudo
+        return estimado
+
+
+def _compras(df: pd.DataFrame) -> pd.DataFrame:
+    # Un cliente "alcanzado" compró al menos una unidad (ventas normales, sin devoluciones)
+    df = _solo_ventas(df)
+    return df[(df['cantidad_vendida'] > 0) & df['cliente'].notna()]
+
+
+def _reach_keys(df: pd.DataFrame, columnas: List[str]) -> pd.Series:
+    claves = df[columnas[0]].astype(str)
+    for col in columnas[1:]:
+        claves = claves + _SEP + df[col].astype(str)
+    return claves
+
+
+def build_reach_sketches(df: pd.DataFrame, precision: Optional[int] = None) -> Dict[str, ReachSketch]:
+    """HyperLogLog de clientes por cada dimensión de REACH_DIMENSIONS presente en el dataset."""
+    precision = precision or int(get_setting("sketches", "precision", DEFAULT_PRECISION))
+    if 'cliente' not in df.columns:
+        return {}
+    compras = _compras(df)
+    sketches = {}
+    for dim, columnas in REACH_DIMENSIONS.items():
+        if not all(c in compras.columns for c in columnas):
+            continue
+        parte = compras.dropna(subset=columnas)
+        sketches[dim] = ReachSketch.build(_reach_keys(parte, columnas), parte['cliente'], precision)
+    return sketches
+
+
+def _reach_table(claves: np.ndarray, clientes: np.ndarray, margen: np.ndarray, dim: str, metodo: str) -> pd.DataFrame:
+    columnas = REACH_DIMENSIONS[dim]
+    partes = pd.Series(claves, dtype=object).str.split(_SEP, expand=True) if len(claves) else pd.DataFrame(columns=range(len(columnas)))
+    tabla = pd.DataFrame({col: partes[i].to_numpy() for i, col in enumerate(columnas)})
+    tabla['clientes'] = np.rint(clientes).astype(np.int64)
+    tabla['margen'] = np.rint(margen).astype(np.int64)
+    tabla['Método'] = metodo
+    return tabla.sort_values('clientes', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def approximate_reach(sketches: List[Dict[str, ReachSketch]], dim: str = 'tipologia') -> pd.DataFrame:
+    """Alcance de clientes combinando HyperLogLog de uno o varios archivos; 'margen' es ±1 error típico."""
+    merged = ReachSketch.merge(s[dim] for s in sketches if dim in s)
+    estimado = merged.estimate()
+    return _reach_table(merged.claves, estimado, estimado * merged.error_relativo, dim, 'aproximado')
+
+
+def exact_reach(dfs: List[pd.DataFrame], dim: str = 'tipologia') -> pd.DataFrame:
+    """Alcance exacto (nunique) concatenando los archivos; mismo formato que approximate_reach."""
+    columnas = REACH_DIMENSIONS[dim]
+    partes = [_compras(df) for df in dfs if 'cliente' in df.columns and all(c in df.columns for c in columnas)]
+    if not partes:
+        return _reach_table(np.array([], dtype=str), np.array([]), np.array([]), dim, 'exacto')
+    todo = pd.concat([p[columnas + ['cliente']] for p in partes], ignore_index=True).dropna(subset=columnas)
+    claves = _reach_keys(todo, columnas)
+    conteo = todo['cliente'].astype(str).groupby(claves).nunique().sort_index()
+    return _reach_table(conteo.index.to_numpy(dtype=str), conteo.to_numpy(), np.zeros(len(conteo)), dim, 'exacto')
+
+
+# =============================
+# Persistencia por huella de contenido (junto al almacén Arrow)
+# =============================
+
+_loaded: Dict[str, Dict[str, TopKSketch]] = {}
+_lock = threading.Lock()
+
+
+def _sketch_path(fingerprint: str) -> str:
+    return os.path.join(arrow_store.store_dir(), f"{fingerprint}.sketches.json")
+
+
+def _ref_path(storage_key: str) -> str:
+    name = hashlib.blake2b(storage_key.encode(), digest_size=16).hexdigest()
+    return os.path.join(arrow_store.store_dir(), f"{name}.ref")
+
+
+def _write_atomic(path: str, text: str) -> None:
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Sin disco: el resumen se recalcula la próxima vez que se ingiera el archivo
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_sketches(fingerprint: str) -> Optional[Dict[str, TopKSketch]]:
+    """Resúmenes guardados para esa huella, o None si el archivo todavía no se ingirió."""
+    with _lock:
+        if fingerprint in _loaded:
+            return _loaded[fingerprint]
+    try:
+        with open(_sketch_path(fingerprint), encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('version') != SKETCH_VERSION:
+        return None
+    sketches = {kind: TopKSketch.from_dict(d) for kind, d in data['resumenes'].items()}
+    with _lock:
+        _loaded[fingerprint] = sketches
+    return sketches
+
+
+def ensure_sketches(fingerprint: str, df: pd.DataFrame) -> Dict[str, TopKSketch]:
+    """Construye y guarda los resúmenes del archivo si todavía no existen (se llama al ingerir)."""
+    # Si la limpieza del almacén borró el archivo se vuelve a escribir, aunque siga en memoria
+    sketches = load_sketches(fingerprint) if os.path.exists(_sketch_path(fingerprint)) else None
+    if sketches is None:
+        sketches = build_file_sketches(df)
+        data = {'version': SKETCH_VERSION, 'resumenes': {kind: s.to_dict() for kind, s in sketches.items()}}
+        _write_atomic(_sketch_path(fingerprint), json.dumps(data))
+        with _lock:
+            _loaded[fingerprint] = sketches
+    return sketches
+
+
+def _reach_path(fingerprint: str) -> str:
+    return os.path.join(arrow_store.store_dir(), f"{fingerprint}.reach.npz")
+
+
+def load_reach_sketches(fingerprint: str) -> Optional[Dict[str, ReachSketch]]:
+    """HyperLogLog de alcance guardados para esa huella (se leen del disco: pueden pesar varios MB)."""
+    try:
+        with np.load(_reach_path(fingerprint), allow_pickle=False) as data:
+            if int(data['version']) != SKETCH_VERSION:
+                return None
+            precision = int(data['precision'])
+            return {
+                dim: ReachSketch(precision, data[f"{dim}__claves"], data[f"{dim}__registros"])
+                for dim in REACH_DIMENSIONS if f"{dim}__claves" in data
+            }
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def ensure_reach_sketches(fingerprint: str, df: pd.DataFrame) -> Dict[str, ReachSketch]:
+    """Construye y guarda los HyperLogLog de alcance del archivo si todavía no existen."""
+    if os.path.exists(_reach_path(fingerprint)):
+        sketches = load_reach_sketches(fingerprint)
+        if sketches is not None:
+            return sketches
+    sketches = build_reach_sketches(df)
+    arrays = {'version': np.array(SKETCH_VERSION), 'precision': np.array(
+        next(iter(sketches.values())).precision if sketches else DEFAULT_PRECISION)}
+    for dim, sketch in sketches.items():
+        arrays[f"{dim}__claves"] = sketch.claves
+        arrays[f"{dim}__registros"] = sketch.registros
+    path = _reach_path(fingerprint)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return sketches
+
+
+def has_sketches(fingerprint: str) -> bool:
+    """Si el archivo ya tiene guardados sus resúmenes (sin leerlos: el de alcance pesa varios MB)."""
+    return os.path.exists(_sketch_path(fingerprint)) and os.path.exists(_reach_path(fingerprint))
+
+
+def ingest(fingerprint: str, df: pd.DataFrame) -> None:
+    """Resúmenes de un archivo al ingerirlo: más vendidos y alcance de clientes."""
+    ensure_sketches(fingerprint, df)
+    ensure_reach_sketches(fingerprint, df)
+
+
+def remember_source(storage_key: str, fingerprint: str) -> None:
+    """Recuerda la huella de contenido de un archivo guardado, para no descargarlo solo para rankear."""
+    if storage_key:
+        _write_atomic(_ref_path(storage_key), fingerprint)
+
+
+def fingerprint_for(storage_key: str) -> Optional[str]:
+    try:
+        with open(_ref_path(storage_key), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+# =============================
+# Ranking entre archivos
+# =============================
+
+def _format_top(top: pd.DataFrame, kind: str) -> pd.DataFrame:
+    key, label = SKETCH_KINDS[kind]
+    return top.rename(columns={'clave': key, 'etiqueta': label})
+
+
+def approximate_top_across(sketches: List[Dict[str, TopKSketch]], kind: str = 'articulos',
+                           n: int = 10) -> Dict[str, object]:
+    """
+    Top-n aproximado combinando los resúmenes de varios archivos.
+    Devuelve {'top', 'exacto_garantizado', 'error_maximo', 'archivos'}: 'error_maximo' es la
+    mayor diferencia entre cota superior e inferior del top y también acota cualquier clave ausente.
+    """
+    merged = TopKSketch.merge(s[kind] for s in sketches if kind in s)
+    top = merged.top(n)
+    return {
+        'top': _format_top(top, kind),
+        'exacto_garantizado': merged.top_is_exact(n),
+        'error_maximo': max(float(top['error'].max()) if not top.empty else 0.0,
+                            merged.superior_ausentes - merged.inferior_ausentes),
+        'archivos': merged.archivos,
+    }
+
+
+def exact_top_across(dfs: List[pd.DataFrame], kind: str = 'articulos', n: int = 10) -> pd.DataFrame:
+    """Top-n exacto concatenando los archivos (modo de validación, mismo formato que el aproximado)."""
+    key, label = SKETCH_KINDS[kind]
+    partes = [_solo_ventas(df) for df in dfs if key in df.columns]
+    if not partes:
+        return _format_top(TopKSketch(capacidad=n).top(n), kind)
+    columnas = [key, 'cantidad_vendida'] + ([label] if all(label in p.columns for p in partes) else [])
+    todo = pd.concat([p[columnas] for p in partes], ignore_index=True)
+    totales = todo.groupby(key)['cantidad_vendida'].sum()
+    etiquetas = todo.groupby(key)[label].first() if label in todo.columns else None
+    sketch = TopKSketch.from_totals(totales, capacidad=len(totales) or 1, etiquetas=etiquetas)
+    return _format_top(sketch.top(n), kind)
@@ -0,0 +1,153 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from functions.result_cache import memoize_by_fingerprint
+
+FECHA = 'fecha_de_la_venta'
+
+
+@dataclass
+class MonthIndex:
+    """
+    Índice del dataset particionado por año-mes, sin reordenar ni copiar las filas.
+    Las filas del mes periodos[i] son orden[offsets[i]:offsets[i + 1]] (posiciones en el DataFrame).
+    """
+    periodos: List[str]     # 'YYYY-MM' en orden cronológico
+    orden: np.ndarray       # posiciones de fila agrupadas por mes (dentro del mes, en el orden original)
+    offsets: np.ndarray     # inicio de cada mes en `orden`, más el total al final
+    filas: int              # filas del dataset (incluye las que no tienen fecha)
+
+    def slice(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> Tuple[int, int]:
+        """Rango [i, j) de meses entre `desde` y `hasta` (inclusive, 'YYYY-MM')."""
+        i = bisect_left(self.periodos, desde) if desde else 0
+        j = bisect_right(self.periodos, hasta) if hasta else len(self.periodos)
+        return i, max(i, j)
+
+    def rows(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> np.ndarray:
+        """Posiciones de las filas de esos meses, en el orden original del dataset."""
+        i, j = self.slice(desde, hasta)
+        return np.sort(self.orden[self.offsets[i]:self.offsets[j]])
+
+    def periodo_por_fila(self, desde: Optional[str] = None, hasta: Optional[str] = None) -> np.ndarray:
+        """Etiqueta 'YYYY-MM' de cada fila devuelta por rows(desde, hasta), en el mismo orden."""
+        i, j = self.slice(desde, hasta)
+        etiquetas = np.empty(self.filas, dtype=object)
+        etiquetas[self.orden[self.offsets[i]:self.offsets[j]]] = np.repeat(
+            np.array(self.periodos[i:j], dtype=object), np.diff(self.offsets[i:j + 1])
+        )
+        return etiquetas[self.rows(desde, hasta)]
+
+
+def _month_codes(fechas: pd.Series) -> np.ndarray:
+    # año * 12 + mes - 1 por fila; NaN donde no hay fecha válida. Las fechas ya vienen
+    # parseadas desde la carga (coerce_types); to_datetime solo actúa si llegan como texto.
+    fechas = pd.to_datetime(fechas, errors='coerce', dayfirst=True)
+    return (fechas.dt.year * 12 + fechas.dt.month - 1).to_numpy(dtype='float64', na_value=np.nan)
+
+
+@memoize_by_fingerprint
+def build_month_index(df: pd.DataFrame) -> MonthIndex:
+    """Construye el índice por año-mes del dataset (una vez por dataset, memoizado por huella)."""
+    if FECHA not in df.columns:
+        return MonthIndex([], np.empty(0, dtype=np.int64), np.zeros(1, dtype=np.int64), len(df))
+
+    codigos = _month_codes(df[FECHA])
+    validas = np.flatnonzero(~np.isnan(codigos))
+    # argsort estable: dentro de cada mes las filas conservan el orden original
+    orden = validas[np.argsort(codigos[validas], kind='stable')]
+    unicos, inicios = np.unique(codigos[orden].astype(np.int64), return_index=True)
+    return MonthIndex(
+        periodos=[f"{c // 12:04d}-{c % 12 + 1:02d}" for c in unicos],
+        orden=orden,
+        offsets=np.append(inicios, len(orden)).astype(np.int64),
+        filas=len(df),
+    )
+
+
+def _partitions(df: pd.DataFrame, columns: List[str], desde: Optional[str] = None,
+                hasta: Optional[str] = None) -> pd.DataFrame:
+    # Lee solo las filas de los meses pedidos y las columnas necesarias, con su periodo
+    index = build_month_index(df)
+    parte = df[[c for c in columns if c in df.columns]].take(index.rows(desde, hasta))
+    return parte.assign(periodo=index.periodo_por_fila(desde, hasta))
+
+
+@memoize_by_fingerprint
+def monthly_rollup(df: pd.DataFrame, keys: Tuple[str, ...], solo_ventas: bool = False) -> pd.DataFrame:
+    """
+    Unidades por mes y `keys`, ordenado por periodo y luego por las claves (como groupby).
+    Se calcula una vez por dataset; las consultas de un mes leen solo su tramo.
+    """
+    keys = [k for k in keys if k in df.columns]
+    columns = keys + ['cantidad_vendida'] + (['cuenta_ventas'] if solo_ventas else [])
+    parte = _partitions(df, columns)
+    if solo_ventas and 'cuenta_ventas' in parte.columns:
+        parte = parte[parte['cuenta_ventas'] == True]
+    return parte.groupby(['periodo'] + keys)['cantidad_vendida'].sum().reset_index()
+
+
+def rollup_for_month(rollup: pd.DataFrame, periodo: str) -> pd.DataFrame:
+    """Filas de un mes del rollup (ordenado por periodo) sin recorrer los demás meses."""
+    periodos = rollup['periodo'].to_numpy()
+    inicio, fin = periodos.searchsorted(periodo, side='left'), periodos.searchsorted(periodo, side='right')
+    return rollup.iloc[inicio:fin].drop(columns='periodo').reset_index(drop=True)
+
+
+def precompute_monthly(df: pd.DataFrame) -> List[str]:
+    """
+    Al cargar el dataset: arma el índice por mes y el rollup mensual de productos.
+    Devuelve los meses disponibles ('YYYY-MM'); vacío si el archivo no trae fechas.
+    """
+    index = build_month_index(df)
+    if index.periodos and 'codigo_del_articulo' in df.columns:
+        monthly_rollup(df, ('codigo_del_articulo', 'descripcion_del_producto'))
+    return list(index.periodos)
+
+
+@memoize_by_fingerprint
+def month_over_month(df: pd.DataFrame, by: str = 'tipologia', desde: Optional[str] = None,
+                     hasta: Optional[str] = None, n: int = 10) -> pd.DataFrame:
+    """
+    Tendencia mes a mes de las n tipologías o artículos (`by`) más vendidos entre `desde` y `hasta`.
+    Solo cuenta ventas normales y solo lee las particiones de esos meses. Devuelve una fila por
+    mes y clave (los meses sin ventas quedan en 0) con la variación respecto del mes anterior.
+    """
+    keys = [by] + (['descripcion_del_producto'] if by == 'codigo_del_articulo' and 'descripcion_del_producto' in df.columns else [])
+    columns = ['periodo'] + keys + ['cantidad_vendida', 'variacion', 'Variación']
+    if by not in df.columns:
+        return pd.DataFrame(columns=columns)
+
+    parte = _partitions(df, keys + ['cantidad_vendida', 'cuenta_ventas'], desde, hasta)
+    if 'cuenta_ventas' in parte.columns:
+        parte = parte[parte['cuenta_ventas'] == True]
+    por_mes = parte.groupby(['periodo'] + keys)['cantidad_vendida'].sum()
+    if por_mes.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Las n claves con más unidades en todo el rango
+    totales = por_mes.groupby(level=by).sum().sort_values(ascending=False, kind='stable')
+    top = totales.index[:n]
+    por_mes = por_mes[por_mes.index.get_level_values(by).isin(top)]
+
+    # Grilla completa mes × clave para que la variación sea contra el mes calendario anterior
+    index = build_month_index(df)
+    i, j = index.slice(desde, hasta)
+    meses = pd.period_range(index.periodos[i], index.periodos[j - 1], freq='M').strftime('%Y-%m').rename('periodo')
+    tabla = por_mes.unstack('periodo').reindex(columns=meses).fillna(0)
+    anterior = tabla.shift(1, axis=1)
+    variacion = ((tabla - anterior) / anterior.abs() * 100).where(anterior != 0)
+
+    result = (
+        tabla.stack(future_stack=True).rename('cantidad_vendida').to_frame()
+        .join(variacion.stack(future_stack=True).rename('variacion'))
+        .reset_index()
+    )
+    # Orden: claves por total del rango, luego cronológico
+    result['_rank'] = result[by].map({k: r for r, k in enumerate(top)})
+    result = result.sort_values(['_rank', 'periodo'], kind='stable').reset_index(drop=True)
+    result['Variación'] = result['variacion'].apply(lambda x: "—" if pd.isna(x) else f"{x:+.1f}%")
+    return result[columns]
@@ -1,4 +1,6 @@
 import pandas as pd
+from functions.result_cache import memoize_by_fingerprint
+from utils.tracing import traced
 
 typology_dict = {
     '0': 'accesorios',
@@ -20,6 +22,7 @@ genero_dict = {
     '3': 'niños'
 }
 
+@traced()
 def add_typology_column(df: pd.DataFrame) -> pd.DataFrame:
     """
     Añade columnas 'tipologia', 'genero', 'categoria_especial' y 'cuenta_ventas' 
@@ -111,105 +114,95 @@ def add_typology_column(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
-def top_selling_typologies(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
-    """
-    Devuelve las n tipologías más vendidas (solo cuenta ventas normales).
-    """
+@memoize_by_fingerprint
+def _ranked_typologies(df: pd.DataFrame) -> pd.DataFrame:
+    # Ranking completo memoizado por dataset; top_selling_typologies solo recorta
     if 'tipologia' not in df.columns:
         df = add_typology_column(df)
     
     # Filtrar solo las ventas que cuentan
     df_ventas = df[df['cuenta_ventas'] == True]
     result = df_ventas.groupby('tipologia')['cantidad_vendida'].sum().reset_index()
-    return result.sort_values('cantidad_vendida', ascending=False).head(n)
+    return result.sort_values('cantidad_vendida', ascending=False, kind='stable')
+
+def top_selling_typologies(df: pd.DataFrame, n: int = 5) -> pd.DataFrame:
+    """
+    Devuelve las n tipologías más vendidas (solo cuenta ventas normales).
+    """
+    return _ranked_typologies(df).head(n)
+
+# categoria_especial -> clave del resumen. Cualquier otra categoría que aparezca
+# (distinta de ventas_normales) se agrega al resumen con su propio nombre.
+SPECIAL_CATEGORY_KEYS = {
+    'cierre': 'cierres',
+    'ch': 'ch',
+    'sorteo': 'sorteos',
+    'perfuminas': 'perfuminas',
+    'otros_codigos': 'otros_codigos'
+}
+
+# Categorías cuyo detalle se agrupa solo por código (sin descripción)
+_DETAIL_BY_CODE_ONLY = {'cierre', 'sorteo', 'perfuminas'}
+
+def _empty_category(detail_cols: list) -> dict:
+    return {'cantidad': 0, 'unidades': 0, 'detalle': pd.DataFrame(columns=detail_cols + ['cantidad_vendida'])}
 
+@memoize_by_fingerprint
 def get_special_categories_summary(df: pd.DataFrame) -> dict:
     """
-    Devuelve un resumen de todas las categorías especiales.
+    Devuelve un resumen de todas las categorías especiales (cantidad de registros, unidades y detalle
+    por artículo) a partir de una sola agrupación por categoría y artículo.
     """
+    summary = {}
+    for categoria, key in SPECIAL_CATEGORY_KEYS.items():
+        detail_cols = ['codigo_del_articulo']
+        if categoria not in _DETAIL_BY_CODE_ONLY:
+            detail_cols.append('descripcion_del_producto')
+        summary[key] = _empty_category(detail_cols)
+
     if df.empty:
-        # Crear estructura vacía si no hay datos
-        empty_summary = {
-            'cierres': {'cantidad': 0, 'unidades': 0, 'detalle': pd.DataFrame()},
-            'ch': {'cantidad': 0, 'unidades': 0, 'detalle': pd.DataFrame()},
-            'sorteos': {'cantidad': 0, 'unidades': 0, 'detalle': pd.DataFrame()},
-            'perfuminas': {'cantidad': 0, 'unidades': 0, 'detalle': pd.DataFrame()},
-            'otros_codigos': {'cantidad': 0, 'unidades': 0, 'detalle': pd.DataFrame()}
-        }
-        return empty_summary
-    
+        return summary
+
     if 'categoria_especial' not in df.columns:
         df = add_typology_column(df)
-    
-    summary = {}
-    
-    # Cierres
-    cierres = df[df['categoria_especial'] == 'cierre']
-    if not cierres.empty:
-        detalle_cierres = cierres.groupby('codigo_del_articulo')['cantidad_vendida'].sum().reset_index()
-    else:
-        detalle_cierres = pd.DataFrame(columns=['codigo_del_articulo', 'cantidad_vendida'])
-    
-    summary['cierres'] = {
-        'cantidad': len(cierres),
-        'unidades': cierres['cantidad_vendida'].sum() if not cierres.empty else 0,
-        'detalle': detalle_cierres
-    }
-    
-    # CH
-    ch_items = df[df['categoria_especial'] == 'ch']
-    if not ch_items.empty:
-        detalle_ch = ch_items.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
-    else:
-        detalle_ch = pd.DataFrame(columns=['codigo_del_articulo', 'descripcion_del_producto', 'cantidad_vendida'])
-    
-    summary['ch'] = {
-        'cantidad': len(ch_items),
-        'unidades': ch_items['cantidad_vendida'].sum() if not ch_items.empty else 0,
-        'detalle': detalle_ch
-    }
-    
-    # Sorteos
-    sorteos = df[df['categoria_especial'] == 'sorteo']
-    if not sorteos.empty:
-        detalle_sorteos = sorteos.groupby('codigo_del_articulo')['cantidad_vendida'].sum().reset_index()
-    else:
-        detalle_sorteos = pd.DataFrame(columns=['codigo_del_articulo', 'cantidad_vendida'])
-    
-    summary['sorteos'] = {
-        'cantidad': len(sorteos),
-        'unidades': sorteos['cantidad_vendida'].sum() if not sorteos.empty else 0,
-        'detalle': detalle_sorteos
-    }
-    
-    # Perfuminas
-    perfuminas = df[df['categoria_especial'] == 'perfuminas']
-    if not perfuminas.empty:
-        detalle_perfuminas = perfuminas.groupby('codigo_del_articulo')['cantidad_vendida'].sum().reset_index()
-    else:
-        detalle_perfuminas = pd.DataFrame(columns=['codigo_del_articulo', 'cantidad_vendida'])
-    
-    summary['perfuminas'] = {
-        'cantidad': len(perfuminas),
-        'unidades': perfuminas['cantidad_vendida'].sum() if not perfuminas.empty else 0,
-        'detalle': detalle_perfuminas
-    }
-    
-    # Otros códigos
-    otros = df[df['categoria_especial'] == 'otros_codigos']
-    if not otros.empty:
-        detalle_otros = otros.groupby(['codigo_del_articulo', 'descripcion_del_producto'])['cantidad_vendida'].sum().reset_index()
-    else:
-        detalle_otros = pd.DataFrame(columns=['codigo_del_articulo', 'descripcion_del_producto', 'cantidad_vendida'])
-    
-    summary['otros_codigos'] = {
-        'cantidad': len(otros),
-        'unidades': otros['cantidad_vendida'].sum() if not otros.empty else 0,
-        'detalle': detalle_otros
-    }
-    
+
+    especiales = df[df['categoria_especial'] != 'ventas_normales']
+    if especiales.empty:
+        return summary
+
+    group_cols = ['categoria_especial', 'codigo_del_articulo']
+    has_descripcion = 'descripcion_del_producto' in especiales.columns
+    if has_descripcion:
+        group_cols.append('descripcion_del_producto')
+
+    # Única pasada: registros y unidades por categoría y artículo. dropna=False: las filas sin código
+    # o sin descripción cuentan en los registros y unidades de su categoría, aunque no en el detalle
+    grouped = especiales.groupby(group_cols, dropna=False).agg(
+        registros=('cantidad_vendida', 'size'),
+        cantidad_vendida=('cantidad_vendida', 'sum')
+    ).reset_index()
+
+    for categoria, detalle in grouped.groupby('categoria_especial', sort=False):
+        key = SPECIAL_CATEGORY_KEYS.get(categoria, categoria)
+        detalle = detalle.drop(columns=['categoria_especial'])
+        registros = int(detalle['registros'].sum())
+        unidades = detalle['cantidad_vendida'].sum()
+
+        if categoria in _DETAIL_BY_CODE_ONLY or not has_descripcion:
+            detalle = detalle.groupby('codigo_del_articulo')['cantidad_vendida'].sum().reset_index()
+        else:
+            detalle = detalle.dropna(subset=['codigo_del_articulo', 'descripcion_del_producto'])
+            detalle = detalle[['codigo_del_articulo', 'descripcion_del_producto', 'cantidad_vendida']].reset_index(drop=True)
+
+        summary[key] = {
+            'cantidad': registros,
+            'unidades': unidades,
+            'detalle': detalle
+        }
+
     return summary
 
+@memoize_by_fingerprint
 def get_sales_by_gender(df: pd.DataFrame) -> pd.DataFrame:
     """
     Devuelve las ventas agrupadas por género (solo ventas normales).
@@ -220,4 +213,4 @@ def get_sales_by_gender(df: pd.DataFrame) -> pd.DataFrame:
     # Filtrar solo las ventas que cuentan
     df_ventas = df[df['cuenta_ventas'] == True]
     result = df_ventas.groupby('genero')['cantidad_vendida'].sum().reset_index()
-    return result.sort_values('cantidad_vendida', ascending=False) 
\ No newline at end of file
+    return result.sort_values('cantidad_vendida', ascending=False, kind='stable') 
\ No newline at end of file
@@ -0,0 +1,104 @@
+# services/storage_local.py
+# Sustituto de storage_supabase en disco, con la misma interfaz: desarrollo sin red y pruebas de carga.
+# Se activa con [storage] backend = "local" (o RECOPILACION_STORAGE_BACKEND=local).
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from services.storage_supabase import _ext_from_name
+from utils import metrics
+from utils.settings import get_setting
+
+_META_FILE = "files.json"
+_meta_lock = threading.Lock()
+
+
+def _base_dir() -> str:
+    path = get_setting("storage", "local_dir") or os.path.join(tempfile.gettempdir(), "recopilacion_storage")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _latency() -> None:
+    # Demora artificial por operación (ms) para emular la ida y vuelta a Supabase
+    ms = float(get_setting("storage", "local_latency_ms", 0) or 0)
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def _read_meta() -> List[Dict[str, Any]]:
+    try:
+        with open(os.path.join(_base_dir(), _META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def upload_excel(file_bytes: bytes, original_name: str) -> Optional[str]:
+    """Guarda el binario en el directorio local y devuelve storage_key único, o None si falla."""
+    try:
+        key = f"{uuid.uuid4()}.{_ext_from_name(original_name)}"
+        with metrics.STORAGE_SECONDS.time(operacion="upload_excel"):
+            _latency()
+            path = os.path.join(_base_dir(), key)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(file_bytes)
+            os.replace(f"{path}.tmp", path)
+        return key
+    except OSError:
+        metrics.STORAGE_ERRORS.inc(operacion="upload_excel")
+        return None
+
+
+def download_excel(storage_key: str) -> Optional[bytes]:
+    try:
+        with metrics.STORAGE_SECONDS.time(operacion="download_excel"):
+            _latency()
+            with open(os.path.join(_base_dir(), os.path.basename(storage_key)), "rb") as f:
+                return f.read()
+    except OSError:
+        metrics.STORAGE_ERRORS.inc(operacion="download_excel")
+        return None
+
+
+def signed_url(storage_key: str, expires_in: int = 3600) -> Optional[str]:
+    path = os.path.join(_base_dir(), os.path.basename(storage_key))
+    return Path(path).as_uri() if os.path.exists(path) else None
+
+
+def insert_meta(file_type: str, original_name: str, storage_key: str) -> bool:
+    try:
+        with metrics.STORAGE_SECONDS.time(operacion="insert_meta"):
+            _latency()
+            with _meta_lock:
+                rows = _read_meta()
+                rows.append({
+                    "id": len(rows) + 1,
+                    "file_type": file_type,
+                    "original_name": original_name,
+                    "storage_key": storage_key,
+                    "uploaded_at": datetime.now(timezone.utc).isoformat(),
+                })
+                path = os.path.join(_base_dir(), _META_FILE)
+                with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+                    json.dump(rows, f, ensure_ascii=False)
+                os.replace(f"{path}.tmp", path)
+        return True
+    except OSError:
+        metrics.STORAGE_ERRORS.inc(operacion="insert_meta")
+        return False
+
+
+def list_files(file_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    with metrics.STORAGE_SECONDS.time(operacion="list_files"):
+        _latency()
+        rows = _read_meta()
+    if file_type:
+        rows = [r for r in rows if r.get("file_type") == file_type]
+    return sorted(rows, key=lambda r: r.get("uploaded_at", ""), reverse=True)
@@ -1,18 +1,33 @@
 # services/storage_supabase.py
 import uuid, io
-from typing import List, Dict, Any, Optional
+import threading
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple
 import streamlit as st
-from supabase import create_client, Client
 
+from utils import metrics
 
-def _client() -> Optional[Client]:
+if TYPE_CHECKING:
+    from supabase import Client
+
+# El SDK de supabase tarda en importarse: se carga y se crea el cliente recién en el primer uso,
+# y el cliente se reutiliza mientras no cambien la url ni la clave
+_cliente: Optional[Tuple[Tuple[str, str], "Client"]] = None
+_cliente_lock = threading.Lock()
+
+
+def _client() -> Optional["Client"]:
+    global _cliente
     try:
         cfg = st.secrets.get("supabase", {})
         url = cfg.get("url")
         key = cfg.get("anon_key")
         if not url or not key or not isinstance(url, str) or not url.startswith("http"):
             return None
-        return create_client(url, key)
+        with _cliente_lock:
+            if _cliente is None or _cliente[0] != (url, key):
+                from supabase import create_client
+                _cliente = ((url, key), create_client(url, key))
+            return _cliente[1]
     except Exception:
         return None
 
@@ -55,13 +70,15 @@ def upload_excel(file_bytes: bytes, original_name: str) -> Optional[str]:
         ext = _ext_from_name(original_name)
         key = f"{uuid.uuid4()}.{ext}"
         content_type = _guess_content_type(original_name)
-        sb.storage.from_(bucket).upload(
-            key,
-            file_bytes,
-            {"content-type": content_type}
-        )
+        with metrics.STORAGE_SECONDS.time(operacion="upload_excel"):
+            sb.storage.from_(bucket).upload(
+                key,
+                file_bytes,
+                {"content-type": content_type}
+            )
         return key
     except Exception:
+        metrics.STORAGE_ERRORS.inc(operacion="upload_excel")
         return None
 
 
@@ -71,8 +88,10 @@ def download_excel(storage_key: str) -> Optional[bytes]:
     if sb is None or bucket is None:
         return None
     try:
-        return sb.storage.from_(bucket).download(storage_key)
+        with metrics.STORAGE_SECONDS.time(operacion="download_excel"):
+            return sb.storage.from_(bucket).download(storage_key)
     except Exception:
+        metrics.STORAGE_ERRORS.inc(operacion="download_excel")
         return None
 
 
@@ -82,9 +101,11 @@ def signed_url(storage_key: str, expires_in: int = 3600) -> Optional[str]:
     if sb is None or bucket is None:
         return None
     try:
-        res = sb.storage.from_(bucket).create_signed_url(storage_key, expires_in)
+        with metrics.STORAGE_SECONDS.time(operacion="signed_url"):
+            res = sb.storage.from_(bucket).create_signed_url(storage_key, expires_in)
         return res.get("signedURL") if isinstance(res, dict) else None
     except Exception:
+        metrics.STORAGE_ERRORS.inc(operacion="signed_url")
         return None
 
 
@@ -93,13 +114,15 @@ def insert_meta(file_type: str, original_name: str, storage_key: str) -> bool:
     if sb is None:
         return False
     try:
-        sb.table("files").insert({
-            "file_type": file_type,
-            "original_name": original_name,
-            "storage_key": storage_key
-        }).execute()
+        with metrics.STORAGE_SECONDS.time(operacion="insert_meta"):
+            sb.table("files").insert({
+                "file_type": file_type,
+                "original_name": original_name,
+                "storage_key": storage_key
+            }).execute()
         return True
     except Exception:
+        metrics.STORAGE_ERRORS.inc(operacion="insert_meta")
         return False
 
 
@@ -111,7 +134,9 @@ def list_files(file_type: Optional[str] = None) -> List[Dict[str, Any]]:
         q = sb.table("files").select("*").order("uploaded_at", desc=True)
         if file_type:
             q = q.eq("file_type", file_type)
-        data = q.execute().data
+        with metrics.STORAGE_SECONDS.time(operacion="list_files"):
+            data = q.execute().data
         return data or []
     except Exception:
+        metrics.STORAGE_ERRORS.inc(operacion="list_files")
         return []
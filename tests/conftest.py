@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los tests importan los módulos del repo como los benchmarks: desde la raíz, sin instalar el paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+"""Errores del cliente en la API HTTP se responden con 4xx, no con 500."""
+import http.client
+import json
+import threading
+
+import pytest
+
+from api import make_server
+
+
+@pytest.fixture
+def port():
+    server = make_server(port=0, quiet=True)
+    hilo = threading.Thread(target=server.serve_forever, daemon=True)
+    hilo.start()
+    yield server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("largo", ["abc", "-5"])
+def test_content_length_invalido_responde_400(port, largo):
+    conexion = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conexion.putrequest("POST", "/datasets")
+    conexion.putheader("Content-Length", largo)
+    conexion.endheaders()
+    respuesta = conexion.getresponse()
+    assert respuesta.status == 400
+    assert "Content-Length" in json.loads(respuesta.read())['error']
+    conexion.close()
+
+
+def test_health(port):
+    conexion = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    conexion.request("GET", "/health")
+    respuesta = conexion.getresponse()
+    assert respuesta.status == 200
+    assert json.loads(respuesta.read())['status'] == 'ok'
+    conexion.close()
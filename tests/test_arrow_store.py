@@ -0,0 +1,47 @@
+"""El almacén Arrow abre los datasets sin copiar las columnas numéricas ni las de texto."""
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from benchmarks.synthetic import synthetic_sales
+from functions import arrow_store
+from functions.result_cache import estimate_bytes
+
+TEXTO = ['cliente', 'nombre_cliente', 'localidad', 'codigo_del_articulo', 'descripcion_del_producto']
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(arrow_store, "store_dir", lambda: str(tmp_path))
+    return tmp_path
+
+
+def _buffers(serie: pd.Series) -> list:
+    chunked = pa.chunked_array(serie.array._pa_array)
+    return [b for chunk in chunked.chunks for b in chunk.buffers() if b is not None]
+
+
+def test_text_columns_wrap_the_mapped_file(store):
+    df = synthetic_sales(2000, clientes=100, articulos=80)
+    arrow_store.write_dataset("huella", df)
+    abierto = arrow_store.open_dataset("huella")
+
+    for columna in TEXTO:
+        assert isinstance(abierto[columna].dtype, pd.StringDtype)
+        assert abierto[columna].dtype.storage != "python"
+        # Buffers de solo lectura tomados del mapa (una copia sería un buffer propio, modificable):
+        # el kernel comparte esas páginas entre todos los procesos que abren el archivo
+        buffers = _buffers(abierto[columna])
+        assert buffers and not any(b.is_mutable for b in buffers)
+
+    # Mismos valores que el dataset escrito, con NaN como faltante igual que un dataset recién parseado
+    pd.testing.assert_frame_equal(abierto, df, check_dtype=False)
+
+
+def test_mapped_text_does_not_count_in_the_budget(store):
+    df = synthetic_sales(2000, clientes=100, articulos=80)
+    arrow_store.write_dataset("huella", df)
+    abierto = arrow_store.open_dataset("huella")
+    solo_heap = abierto.drop(columns=TEXTO + ['cantidad_vendida', 'total'])
+    assert estimate_bytes(abierto) == estimate_bytes(solo_heap)
+
@@ -0,0 +1,35 @@
+import pytest
+
+from benchmarks.synthetic import synthetic_sales
+from functions import data_repo, sketches
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_repo.arrow_store, "store_dir", lambda: str(tmp_path))
+    monkeypatch.setattr(data_repo.arrow_store, "maybe_cleanup", lambda *a, **k: None)
+    return tmp_path
+
+
+def test_store_hit_does_not_reload_sketches(store, monkeypatch):
+    df = synthetic_sales(500, clientes=50, articulos=40)
+    data_repo.load_prepared("huella", lambda: df.assign(cuenta_ventas=True))
+    assert sketches.has_sketches("huella")
+
+    llamadas = []
+    monkeypatch.setattr(sketches, "ingest", lambda *args: llamadas.append(args))
+    preparado = data_repo.load_prepared("huella", lambda: pytest.fail("no debería volver a cargar"))
+    assert len(preparado['df']) == len(df)
+    assert llamadas == []
+
+
+def test_store_hit_rebuilds_missing_sketches(store):
+    df = synthetic_sales(500, clientes=50, articulos=40)
+    data_repo.load_prepared("huella", lambda: df.assign(cuenta_ventas=True))
+    # La limpieza del almacén puede borrar los resúmenes y dejar el dataset
+    (store / "huella.reach.npz").unlink()
+    (store / "huella.sketches.json").unlink()
+    assert not sketches.has_sketches("huella")
+    data_repo.load_prepared("huella", lambda: pytest.fail("no debería volver a cargar"))
+    assert sketches.has_sketches("huella")
+    assert isinstance(sketches.load_reach_sketches("huella"), dict)
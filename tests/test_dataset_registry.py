@@ -0,0 +1,40 @@
+"""Registro de datasets compartido: referencias por sesión y desalojo dentro del presupuesto."""
+import numpy as np
+import pandas as pd
+
+from functions.dataset_registry import DatasetRegistry
+
+
+def _dataset(filas: int = 1000) -> pd.DataFrame:
+    return pd.DataFrame({'cantidad_vendida': np.ones(filas)})
+
+
+def test_session_refs_pin_datasets():
+    tamaño = int(_dataset().memory_usage(index=True, deep=True).sum())
+    registry = DatasetRegistry(max_bytes=tamaño)
+    registry.acquire("a", "sesion", _dataset)
+    registry.acquire("b", "otra", _dataset)
+    # Los dos tienen referencias vivas: el presupuesto se excede hasta que se liberen
+    assert registry.stats()['entradas'] == 2
+    registry.release("a", "sesion")
+    assert registry.stats()['entradas'] == 1
+    assert registry.get("b") is not None
+
+
+def test_acquire_without_session_does_not_pin():
+    tamaño = int(_dataset().memory_usage(index=True, deep=True).sum())
+    registry = DatasetRegistry(max_bytes=2 * tamaño)
+    for huella in ("a", "b", "c"):
+        assert registry.acquire(huella, None, _dataset) is not None
+    stats = registry.stats()
+    assert stats['referencias'] == 0
+    assert stats['bytes'] <= registry.max_bytes
+    assert registry.get("a") is None and registry.get("c") is not None
+
+
+def test_acquire_without_session_shares_and_keeps_refs():
+    registry = DatasetRegistry()
+    df = registry.acquire("a", "sesion", _dataset)
+    assert registry.acquire("a", None, lambda: None) is df
+    assert registry.held_by("sesion") == ["a"]
+    assert registry.stats()['hits'] == 1
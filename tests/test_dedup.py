@@ -0,0 +1,140 @@
+"""Consolidación sin filas repetidas: solo se quitan las repetidas entre archivos del mismo ámbito."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_sales
+from functions import dedup
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(dedup.arrow_store, "store_dir", lambda: str(tmp_path))
+    return tmp_path
+
+
+def _articulos_mes(unidades):
+    # Como parse_articulos_mes: sin fecha ni local por fila
+    return pd.DataFrame({
+        'codigo_del_articulo': ['A1', 'A2', 'A3'],
+        'descripcion_del_producto': ['Remera', 'Buzo', 'Campera'],
+        'cantidad_vendida': unidades,
+        'cuenta_ventas': True,
+    })
+
+
+def _venta_local():
+    # Como parse_locales: con fecha pero sin local por fila
+    return pd.DataFrame({
+        'fecha_de_la_venta': pd.to_datetime(['2025-03-01', '2025-03-01']),
+        'codigo_del_articulo': ['A1', 'A2'],
+        'cantidad_vendida': [2.0, 1.0],
+        'total': [100.0, 50.0],
+        'cuenta_ventas': True,
+    })
+
+
+def _fuente(fp, file_type, nombre, df):
+    return fp, dedup.source_scope(file_type, nombre, fp), lambda: df
+
+
+def test_source_scope():
+    assert dedup.source_scope('articulos_mes', 'articulos_junio2025.xlsx', 'f') == 'articulos_mes:2025-06'
+    assert dedup.source_scope('articulos_mes', 'articulos_mes.xlsx', 'f') == 'archivo:f'
+    assert dedup.source_scope('locales:55', 'ventas.xlsx', 'f') == 'locales:55'
+    assert dedup.source_scope('locales', 'ventas.xlsx', 'f') == 'archivo:f'
+    assert dedup.source_scope('temporada', 'temporada.xlsx', 'f') == 'temporada'
+
+
+def test_row_keys_depend_on_scope_and_occurrence():
+    df = pd.concat([_articulos_mes([5, 3, 7])] * 2, ignore_index=True)
+    claves = dedup.row_keys(df, scope='articulos_mes:2025-01')
+    # La misma fila dos veces en un archivo son dos ventas
+    assert len(np.unique(claves)) == len(df)
+    assert np.array_equal(claves, dedup.row_keys(df, scope='articulos_mes:2025-01'))
+    assert not np.isin(claves, dedup.row_keys(df, scope='articulos_mes:2025-02')).any()
+
+
+def test_months_are_not_duplicates():
+    enero, febrero = _articulos_mes([5, 3, 7]), _articulos_mes([5, 4, 7])
+    _, df, stats = dedup.consolidate([
+        _fuente('enero', 'articulos_mes', 'articulos_enero_2025.xlsx', enero),
+        _fuente('febrero', 'articulos_mes', 'articulos_febrero_2025.xlsx', febrero),
+    ])
+    assert stats['duplicadas'] == 0
+    assert df['cantidad_vendida'].sum() == enero['cantidad_vendida'].sum() + febrero['cantidad_vendida'].sum()
+
+
+def test_same_month_uploaded_twice_is_deduplicated():
+    enero = _articulos_mes([5, 3, 7])
+    _, df, stats = dedup.consolidate([
+        _fuente('enero', 'articulos_mes', 'articulos_enero_2025.xlsx', enero),
+        _fuente('enero_bis', 'articulos_mes', 'articulos_2025-01.xlsx', enero.copy()),
+    ])
+    assert stats['duplicadas'] == len(enero)
+    assert len(df) == len(enero)
+
+
+def test_month_unknown_only_drops_identical_uploads():
+    enero = _articulos_mes([5, 3, 7])
+    _, _, stats = dedup.consolidate([
+        _fuente('a', 'articulos_mes', 'articulos_mes.xlsx', enero),
+        _fuente('b', 'articulos_mes', 'articulos_mes_2.xlsx', enero.copy()),
+    ])
+    assert stats['duplicadas'] == 0
+
+
+def test_stores_are_not_duplicates():
+    _, df, stats = dedup.consolidate([
+        _fuente('l55', 'locales:55', 'ventas_local_55.xlsx', _venta_local()),
+        _fuente('l49', 'locales:49', 'ventas_local_49.xlsx', _venta_local()),
+    ])
+    assert stats['duplicadas'] == 0
+    assert len(df) == 4
+
+
+def test_overlapping_exports_of_a_store_are_deduplicated():
+    venta = _venta_local()
+    _, df, stats = dedup.consolidate([
+        _fuente('marzo', 'locales:55', 'ventas_local_55.xlsx', venta),
+        _fuente('marzo_bis', 'locales:55', 'ventas_local_55_bis.xlsx', pd.concat([venta, venta.iloc[:1]], ignore_index=True)),
+    ])
+    # La segunda exportación repite las dos ventas y trae una tercera idéntica a la primera
+    assert stats['duplicadas'] == 2
+    assert len(df) == 3
+
+
+def test_saved_prefix_is_reused():
+    df1 = synthetic_sales(300, seed=1).assign(cuenta_ventas=True)
+    df2 = synthetic_sales(200, seed=2).assign(cuenta_ventas=True)
+    fuentes = [_fuente('t1', 'temporada', 't1.xlsx', df1)]
+    clave_1, _, stats = dedup.consolidate(fuentes)
+    assert stats['hasheadas'] == len(df1)
+
+    fuentes.append(_fuente('t2', 'temporada', 't2.xlsx', df2))
+    clave_2, df, stats = dedup.consolidate(fuentes)
+    assert stats['hasheadas'] == len(df2)
+    assert clave_2 != clave_1
+    assert len(df) == len(df1) + len(df2) - stats['duplicadas']
+
+    _, _, stats = dedup.consolidate(fuentes)
+    assert stats['hasheadas'] == 0
+
+
+def test_partial_consolidation_does_not_take_the_full_key():
+    df1 = synthetic_sales(300, seed=1).assign(cuenta_ventas=True)
+    df2 = synthetic_sales(200, seed=2).assign(cuenta_ventas=True)
+    completo = [_fuente('t1', 'temporada', 't1.xlsx', df1), _fuente('t2', 'temporada', 't2.xlsx', df2)]
+    roto = [completo[0], ('t2', completo[1][1], lambda: None)]
+
+    clave_parcial, df, stats = dedup.consolidate(roto)
+    assert stats['archivos'] == 1
+    assert len(df) == len(df1)
+    assert clave_parcial == dedup.consolidate(completo[:1])[0]
+
+    clave_completa, df, stats = dedup.consolidate(completo)
+    assert clave_completa != clave_parcial
+    assert stats['archivos'] == 2
+    # Reutiliza el estado guardado del primer archivo (el parcial no se guardó)
+    assert stats['hasheadas'] == len(df2)
+    assert len(df) == len(df1) + len(df2) - stats['duplicadas']
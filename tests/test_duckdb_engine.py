@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+pytest.importorskip("duckdb")
+
+from benchmarks.synthetic import synthetic_sales  # noqa: E402
+from functions import arrow_store  # noqa: E402
+from functions.backends import PANDAS_ANALYSES  # noqa: E402
+from functions.duckdb_engine import DuckDBCatalog, SQL_ANALYSES, clients_in_every_locale, units_by_typology_across  # noqa: E402
+from functions.typology_analysis import add_typology_column  # noqa: E402
+
+
+def _local(cantidades, **columnas) -> pd.DataFrame:
+    return pd.DataFrame({'codigo_del_articulo': [f"A{i}" for i in range(len(cantidades))],
+                         'cantidad_vendida': cantidades, **columnas})
+
+
+def test_across_queries_on_empty_catalog():
+    catalog = DuckDBCatalog()
+    assert clients_in_every_locale(catalog).empty
+    assert units_by_typology_across(catalog).empty
+
+
+def test_clients_in_every_locale_without_client_column():
+    # Los archivos de locales no traen cliente: antes fallaba al compilar la consulta
+    catalog = DuckDBCatalog()
+    catalog.register_dataframe(_local([1.0, 2.0]), 'local 55.xlsx', {'file_type': 'locales:55'})
+    catalog.register_dataframe(_local([3.0]), 'local centenario.xlsx', {'file_type': 'locales:centenario'})
+    resultado = clients_in_every_locale(catalog)
+    assert resultado.empty
+    assert list(resultado.columns) == ['cliente', 'locales', 'cantidad_vendida']
+
+
+def test_clients_in_every_locale():
+    catalog = DuckDBCatalog()
+    catalog.register_dataframe(_local([1.0, 2.0], cliente=['C1', 'C2']), 'local 55.xlsx', {'file_type': 'locales:55'})
+    catalog.register_dataframe(_local([3.0, 4.0], cliente=['C1', 'C3']), 'local 5.xlsx', {'file_type': 'locales:5'})
+    resultado = clients_in_every_locale(catalog)
+    assert list(resultado['cliente']) == ['C1']
+    assert resultado['cantidad_vendida'].item() == 4.0
+
+
+# =============================
+# Paridad de SQL_ANALYSES con las funciones de pandas
+# =============================
+
+@pytest.fixture(scope="module")
+def ventas() -> pd.DataFrame:
+    df = add_typology_column(synthetic_sales(5000, clientes=300, articulos=200, seed=5))
+    rng = np.random.default_rng(11)
+    df['cuenta_ventas'] &= rng.random(len(df)) > 0.1
+    # Un 10% de filas sin cliente: cuentan en el total de client_share_of_sales
+    df.loc[rng.random(len(df)) < 0.10, 'cliente'] = np.nan
+    df.loc[rng.random(len(df)) < 0.02, 'nombre_cliente'] = np.nan
+    df.loc[rng.random(len(df)) < 0.01, 'codigo_del_articulo'] = np.nan
+    return df
+
+
+def _assert_sql_parity(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    catalog = DuckDBCatalog()
+    tabla = catalog.register_dataframe(df, 'temporada.xlsx', {'file_type': 'temporada'})
+    esperado = PANDAS_ANALYSES[name](df)
+    pd.testing.assert_frame_equal(
+        esperado.reset_index(drop=True), SQL_ANALYSES[name](catalog, tabla).reset_index(drop=True), check_dtype=False,
+    )
+    return esperado
+
+
+def test_sql_analyses_match_pandas_analyses():
+    assert set(SQL_ANALYSES) == set(PANDAS_ANALYSES)
+
+
+@pytest.mark.parametrize("name", sorted(SQL_ANALYSES))
+def test_sql_parity(ventas, name):
+    assert not _assert_sql_parity(name, ventas).empty
+
+
+@pytest.mark.parametrize("name", sorted(SQL_ANALYSES))
+def test_sql_parity_store_columns(ventas, name):
+    _assert_sql_parity(name, arrow_store.table_to_pandas(pa.Table.from_pandas(ventas, preserve_index=False)))
+
+
+@pytest.mark.parametrize("name", ['top_selling_products', 'client_share_of_sales', 'client_returns_count'])
+def test_sql_parity_without_cuenta_ventas_column(ventas, name):
+    _assert_sql_parity(name, ventas.drop(columns='cuenta_ventas'))
+
+
+def test_client_share_total_includes_rows_without_client(ventas):
+    resultado = _assert_sql_parity('client_share_of_sales', ventas)
+    contadas = ventas[ventas['cuenta_ventas']]
+    esperado = 100 * resultado['cantidad_vendida'] / contadas['cantidad_vendida'].sum()
+    assert list(resultado['Porcentaje']) == [f"{x:.1f}%" for x in esperado]
+
+
+def test_sql_parity_no_returns(ventas):
+    assert _assert_sql_parity('client_returns_count', ventas[ventas['cantidad_vendida'] > 0]).empty
+
+
+def test_store_dataset_is_registered_without_copying(tmp_path, monkeypatch, ventas):
+    monkeypatch.setattr(arrow_store, "store_dir", lambda: str(tmp_path))
+    arrow_store.write_dataset("huella", ventas)
+    catalog = DuckDBCatalog()
+    tabla = catalog.register_dataframe(arrow_store.open_dataset("huella"), 'temporada.xlsx')
+    source = catalog._sources[tabla]
+    for columna in ['cliente', 'descripcion_del_producto', 'cantidad_vendida']:
+        buffers = [b for chunk in source.column(columna).chunks for b in chunk.buffers() if b is not None]
+        # Buffers de solo lectura del archivo mapeado, no una copia
+        assert buffers and not any(b.is_mutable for b in buffers)
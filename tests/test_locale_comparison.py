@@ -0,0 +1,47 @@
+"""Comparación entre locales: los reruns con los mismos datasets no vuelven a armar el frame combinado."""
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_sales
+from functions import locale_comparison
+from functions.result_cache import result_cache, set_fingerprint
+from functions.typology_analysis import add_typology_column
+
+
+@pytest.fixture
+def datasets():
+    result_cache.clear()
+    return {
+        local: set_fingerprint(add_typology_column(synthetic_sales(2000, clientes=100, articulos=80, seed=i)), f"huella_{local}")
+        for i, local in enumerate(['centro', 'norte', 'sur'])
+    }
+
+
+def _assert_same(a: dict, b: dict) -> None:
+    assert a.keys() == b.keys()
+    for clave in a:
+        pd.testing.assert_frame_equal(a[clave], b[clave])
+
+
+def test_same_result_as_comparing_the_tagged_frame(datasets):
+    esperado = locale_comparison.compare_locales(locale_comparison.tag_locales(datasets), 5)
+    _assert_same(locale_comparison.compare_locale_datasets(datasets, 5), esperado)
+    productos = esperado['productos']
+    assert productos.groupby('local', observed=True)['Ranking'].max().tolist() == [5, 5, 5]
+
+
+def test_changing_n_does_not_concatenate_again(datasets, monkeypatch):
+    primera = locale_comparison.compare_locale_datasets(datasets, 10)
+    monkeypatch.setattr(locale_comparison, "tag_locales", lambda *a: pytest.fail("no debería volver a concatenar"))
+    for n in (10, 3, 25):
+        resultado = locale_comparison.compare_locale_datasets(datasets, n)
+        _assert_same({k: v for k, v in resultado.items() if k != 'productos'},
+                     {k: v for k, v in primera.items() if k != 'productos'})
+        assert (resultado['productos']['Ranking'] <= n).all()
+
+
+def test_datasets_without_fingerprint_are_compared(datasets):
+    sin_huella = {local: df.copy() for local, df in datasets.items()}
+    assert locale_comparison.locales_fingerprint(sin_huella) is None
+    _assert_same(locale_comparison.compare_locale_datasets(sin_huella, 5),
+                 locale_comparison.compare_locale_datasets(datasets, 5))
@@ -0,0 +1,83 @@
+"""El endpoint /metrics expone lo que registran el almacenamiento y el parseo, en formato Prometheus."""
+import re
+import urllib.error
+import urllib.request
+
+import pytest
+
+from benchmarks.synthetic import FILE_NAMES, raw_frame, workbook_bytes
+from functions.data_repo import DataRepository
+from services import storage_local
+from utils import metrics
+
+_LINEA = re.compile(r'^(?P<nombre>[a-z_]+)(?:\{(?P<etiquetas>[^}]*)\})? (?P<valor>\S+)$')
+
+
+def _scrape(port: int) -> dict:
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as respuesta:
+        assert respuesta.headers["Content-Type"] == metrics.CONTENT_TYPE
+        texto = respuesta.read().decode("utf-8")
+    muestras = {}
+    for linea in texto.splitlines():
+        if linea.startswith("#") or not linea:
+            continue
+        m = _LINEA.match(linea)
+        assert m, f"línea mal formada: {linea!r}"
+        etiquetas = tuple(re.findall(r'(\w+)="([^"]*)"', m['etiquetas'] or ""))
+        muestras[(m['nombre'], etiquetas)] = float(m['valor'])
+    return muestras
+
+
+@pytest.fixture
+def port():
+    port = metrics.start_server(0)
+    yield port
+    metrics.stop_server()
+
+
+def _buckets(muestras: dict, nombre: str, etiqueta: tuple) -> list:
+    filas = [(dict(k[1])['le'], v) for k, v in muestras.items() if k[0] == f"{nombre}_bucket" and etiqueta in k[1]]
+    return sorted(filas, key=lambda f: float(f[0].replace('+Inf', 'inf')))
+
+
+def test_storage_error_and_parse_are_scraped(port, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_local, "_base_dir", lambda: str(tmp_path))
+    antes = _scrape(port)
+
+    assert storage_local.download_excel("no-existe.xlsx") is None
+    filas = 300
+    DataRepository().load_from_supabase_bytes(FILE_NAMES['temporada'], workbook_bytes(raw_frame('temporada', filas)))
+    despues = _scrape(port)
+
+    def delta(clave):
+        return despues.get(clave, 0) - antes.get(clave, 0)
+
+    operacion = ('operacion', 'download_excel')
+    formato = ('formato', 'temporada')
+    assert delta(('recopilacion_storage_errors_total', (operacion,))) == 1
+    assert delta(('recopilacion_storage_seconds_count', (operacion,))) == 1
+    assert delta(('recopilacion_rows_parsed_total', (formato,))) == filas
+    assert delta(('recopilacion_parse_seconds_count', (formato,))) == 1
+    assert despues[('recopilacion_parse_seconds_sum', (formato,))] > 0
+
+    for nombre, etiqueta in [('recopilacion_storage_seconds', operacion), ('recopilacion_parse_seconds', formato)]:
+        buckets = _buckets(despues, nombre, etiqueta)
+        # Un bucket por límite más +Inf, acumulados y con +Inf igual a la cantidad de observaciones
+        assert [le for le, _ in buckets] == [metrics._format_value(b) for b in metrics.DEFAULT_BUCKETS] + ['+Inf']
+        conteos = [v for _, v in buckets]
+        assert conteos == sorted(conteos)
+        assert conteos[-1] == despues[(f"{nombre}_count", (etiqueta,))]
+        assert delta((f"{nombre}_bucket", (etiqueta, ('le', '+Inf')))) == 1
+
+
+def test_cache_metrics_are_collected_on_scrape(port):
+    muestras = _scrape(port)
+    for nombre in ('recopilacion_cache_hits_total', 'recopilacion_cache_entries', 'recopilacion_cache_bytes'):
+        assert (nombre, (('cache', 'datasets'),)) in muestras
+        assert (nombre, (('cache', 'resultados'),)) in muestras
+
+
+def test_unknown_path_is_404(port):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(f"http://127.0.0.1:{port}/otra", timeout=5)
+    assert error.value.code == 404
@@ -0,0 +1,81 @@
+"""Los análisis por bloques deben dar lo mismo que en memoria, también cuando vuelcan a disco."""
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from benchmarks.synthetic import synthetic_sales
+from functions import out_of_core
+from functions.backends import PANDAS_ANALYSES
+from functions.out_of_core import CHUNKED_ANALYSES, ChunkedDataset
+from functions.typology_analysis import add_typology_column
+
+
+def _chunked(df: pd.DataFrame, directory: str, chunk_rows: int) -> ChunkedDataset:
+    dataset = ChunkedDataset(directory=directory, columns=list(df.columns), filas=len(df))
+    for i, start in enumerate(range(0, len(df), chunk_rows)):
+        part = os.path.join(directory, f"part-{i:05d}.parquet")
+        pq.write_table(pa.Table.from_pandas(df.iloc[start:start + chunk_rows], preserve_index=False), part)
+        dataset.parts.append(part)
+    return dataset
+
+
+@pytest.fixture(scope="module")
+def ventas() -> pd.DataFrame:
+    df = add_typology_column(synthetic_sales(6000, clientes=800, articulos=400, seed=5))
+    rng = np.random.default_rng(2)
+    df.loc[rng.random(len(df)) < 0.05, 'nombre_cliente'] = np.nan
+    return df
+
+
+@pytest.fixture(scope="module")
+def clientes_numericos(ventas) -> pd.DataFrame:
+    # Códigos de cliente numéricos: un bloque sin nulos queda int64 y los demás float64 (mismas claves)
+    df = ventas.assign(cliente=ventas['cliente'].str[1:].astype('int64').astype(object))
+    df.loc[df.index[1500:], 'cliente'] = df['cliente'].iloc[1500:].astype(float)
+    df.loc[df.index[2000::97], 'cliente'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("name", sorted(CHUNKED_ANALYSES))
+@pytest.mark.parametrize("spill_rows", [out_of_core.DEFAULT_SPILL_ROWS, 50])
+def test_chunked_matches_in_memory(ventas, tmp_path, name, spill_rows):
+    dataset = _chunked(ventas, str(tmp_path), 700)
+    pd.testing.assert_frame_equal(
+        PANDAS_ANALYSES[name](ventas).reset_index(drop=True),
+        CHUNKED_ANALYSES[name](dataset, spill_rows=spill_rows).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize("name", ['client_share_of_sales', 'client_returns_count'])
+def test_spill_partitions_with_mixed_key_dtypes(clientes_numericos, tmp_path, name):
+    dataset = _chunked(clientes_numericos, str(tmp_path), 500)
+    pd.testing.assert_frame_equal(
+        PANDAS_ANALYSES[name](clientes_numericos).reset_index(drop=True),
+        CHUNKED_ANALYSES[name](dataset, spill_rows=50).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+def test_spill_files_are_merged_one_partition_at_a_time(ventas, tmp_path, monkeypatch):
+    leidas = []
+    read_parquet = pd.read_parquet
+
+    def registrar(path, *args, **kwargs):
+        leidas.append(os.path.basename(path))
+        return read_parquet(path, *args, **kwargs)
+
+    monkeypatch.setattr(out_of_core.pd, "read_parquet", registrar)
+    monkeypatch.setattr(out_of_core, "_work_dir", lambda prefix: str(tmp_path / prefix))
+    os.makedirs(tmp_path / "spill_")
+    dataset = _chunked(ventas, str(tmp_path), 700)
+    CHUNKED_ANALYSES['client_share_of_sales'](dataset, spill_rows=50)
+    # Todos los volcados se leyeron, agrupados por partición, y el directorio se borró
+    particiones = [nombre.rsplit('-', 1)[1] for nombre in leidas]
+    assert len(set(particiones)) > 1
+    assert particiones == sorted(particiones)
+    assert not os.path.exists(tmp_path / "spill_")
@@ -0,0 +1,100 @@
+"""
+Paridad del backend de Polars con las funciones de pandas: mismo esquema, orden, índice y valores,
+con claves nulas, devoluciones y filas que no cuentan como venta (cuenta_ventas=False).
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+pytest.importorskip("polars")
+
+from benchmarks.synthetic import synthetic_sales  # noqa: E402
+from functions import arrow_store  # noqa: E402
+from functions.backends import PANDAS_ANALYSES  # noqa: E402
+from functions.polars_backend import POLARS_ANALYSES  # noqa: E402
+from functions.typology_analysis import add_typology_column  # noqa: E402
+
+ANALISIS = sorted(PANDAS_ANALYSES)
+
+
+def _assert_parity(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    esperado = PANDAS_ANALYSES[name](df)
+    pd.testing.assert_frame_equal(esperado, POLARS_ANALYSES[name](df), check_dtype=False)
+    return esperado
+
+
+@pytest.fixture(scope="module")
+def ventas() -> pd.DataFrame:
+    df = add_typology_column(synthetic_sales(5000, clientes=300, articulos=200, seed=3))
+    rng = np.random.default_rng(7)
+    # Además de las categorías especiales que marca add_typology_column
+    df['cuenta_ventas'] &= rng.random(len(df)) > 0.1
+    # Claves nulas: clientes sin nombre, filas sin cliente y artículos sin código
+    df.loc[rng.random(len(df)) < 0.02, 'nombre_cliente'] = np.nan
+    df.loc[rng.random(len(df)) < 0.01, 'cliente'] = np.nan
+    df.loc[rng.random(len(df)) < 0.01, 'codigo_del_articulo'] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("name", ANALISIS)
+def test_parity_numpy_columns(ventas, name):
+    assert not _assert_parity(name, ventas).empty
+
+
+@pytest.mark.parametrize("name", ANALISIS)
+def test_parity_arrow_columns(ventas, name):
+    # Columnas como las abre el almacén Arrow (numéricas ArrowDtype, texto como StringDtype sobre Arrow)
+    arrow = arrow_store.table_to_pandas(pa.Table.from_pandas(ventas, preserve_index=False))
+    _assert_parity(name, arrow)
+
+
+@pytest.mark.parametrize("name", ['top_selling_products', 'client_share_of_sales', 'client_returns_count'])
+def test_parity_without_cuenta_ventas_column(ventas, name):
+    # Los análisis por tipología y género siempre reciben la columna (la agrega add_typology_column)
+    _assert_parity(name, ventas.drop(columns='cuenta_ventas'))
+
+
+@pytest.mark.parametrize("name", ANALISIS)
+def test_rows_not_counted_as_sales_are_ignored(ventas, name):
+    if name == 'client_returns_count':
+        pytest.skip("las devoluciones cuentan todas las filas, tengan o no cuenta_ventas")
+    solo_ventas = ventas[ventas['cuenta_ventas']]
+    pd.testing.assert_frame_equal(
+        POLARS_ANALYSES[name](ventas).reset_index(drop=True),
+        POLARS_ANALYSES[name](solo_ventas).reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize("name", ANALISIS)
+def test_parity_nothing_counts_as_sale(ventas, name):
+    _assert_parity(name, ventas.assign(cuenta_ventas=False))
+
+
+def test_null_client_keys_are_dropped(ventas):
+    for name in ('client_share_of_sales', 'client_returns_count'):
+        resultado = _assert_parity(name, ventas)
+        assert resultado['cliente'].notna().all()
+
+
+def test_returns_without_sales():
+    df = pd.DataFrame({
+        'cliente': ['A', 'A', 'B', 'C', np.nan],
+        'nombre_cliente': [np.nan, 'Ana', 'Beto', 'Caro', 'Nadie'],
+        'localidad': ['X', 'X', 'Y', 'Z', 'Z'],
+        'codigo_del_articulo': ['1', '1', '2', '3', '3'],
+        'descripcion_del_producto': ['a', 'a', 'b', 'c', 'c'],
+        'cantidad_vendida': [5.0, -2.0, -3.0, 4.0, -1.0],
+        'cuenta_ventas': [True, True, True, False, True],
+    })
+    resultado = _assert_parity('client_returns_count', df)
+    # B solo devolvió (total vendido 0) y la devolución sin cliente no aparece
+    assert sorted(resultado['cliente']) == ['A', 'B']
+    assert resultado.loc[resultado['cliente'] == 'B', 'total_vendido'].item() == 0
+    assert resultado.loc[resultado['cliente'] == 'A', 'nombre_cliente'].item() == 'Ana'
+
+
+def test_no_returns(ventas):
+    resultado = _assert_parity('client_returns_count', ventas[ventas['cantidad_vendida'] > 0])
+    assert resultado.empty
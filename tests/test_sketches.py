@@ -0,0 +1,116 @@
+"""
+Resúmenes combinables entre archivos: las cotas de TopKSketch contienen siempre el total exacto,
+un top garantizado coincide con el exacto y los HyperLogLog de alcance combinan como la unión.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_sales
+from functions import sketches
+from functions.typology_analysis import add_typology_column
+
+
+@pytest.fixture(scope="module")
+def archivos():
+    # Archivos con clientes y artículos en común (mismo catálogo) y devoluciones
+    return [
+        add_typology_column(synthetic_sales(3000, clientes=400, articulos=300, seed=0).iloc[i * 1000:(i + 1) * 1000])
+        for i in range(3)
+    ] + [add_typology_column(synthetic_sales(1500, clientes=400, articulos=300, seed=8))]
+
+
+def _exactos(dfs, kind):
+    key = sketches.SKETCH_KINDS[kind][0]
+    top = sketches.exact_top_across(dfs, kind, n=10**6)
+    return top.set_index(key)['cantidad_vendida']
+
+
+@pytest.mark.parametrize("kind", sorted(sketches.SKETCH_KINDS))
+@pytest.mark.parametrize("capacidad", [20, 100, 10**6])
+def test_merge_bounds_contain_exact_totals(archivos, kind, capacidad):
+    merged = sketches.TopKSketch.merge(sketches.build_file_sketches(df, capacidad)[kind] for df in archivos)
+    exactos = _exactos(archivos, kind)
+    assert merged.archivos == len(archivos)
+    assert merged.total == pytest.approx(exactos.sum())
+    for clave, total in exactos.items():
+        if clave in merged.superior:
+            assert merged.inferior[clave] - 1e-9 <= total <= merged.superior[clave] + 1e-9
+        else:
+            # Una clave descartada queda acotada por las cotas de las ausentes
+            assert merged.inferior_ausentes - 1e-9 <= total <= merged.superior_ausentes + 1e-9
+
+
+def test_merge_does_not_depend_on_order(archivos):
+    resumenes = [sketches.build_file_sketches(df, 50)['articulos'] for df in archivos]
+    a = sketches.TopKSketch.merge(resumenes)
+    b = sketches.TopKSketch.merge(resumenes[::-1])
+    assert a.superior.keys() == b.superior.keys()
+    for clave in a.superior:
+        assert a.superior[clave] == pytest.approx(b.superior[clave])
+        assert a.inferior[clave] == pytest.approx(b.inferior[clave])
+    assert a.superior_ausentes == pytest.approx(b.superior_ausentes)
+
+
+@pytest.mark.parametrize("kind", sorted(sketches.SKETCH_KINDS))
+@pytest.mark.parametrize("capacidad", [5, 30, 100, 10**6])
+def test_guaranteed_top_matches_exact_top(archivos, kind, capacidad):
+    key = sketches.SKETCH_KINDS[kind][0]
+    resumenes = [sketches.build_file_sketches(df, capacidad) for df in archivos]
+    aproximado = sketches.approximate_top_across(resumenes, kind, 10)
+    exacto = sketches.exact_top_across(archivos, kind, 10)
+    if capacidad >= 10**6:
+        # Sin claves descartadas el resumen no tiene error
+        assert aproximado['exacto_garantizado']
+        assert aproximado['error_maximo'] == 0
+        pd.testing.assert_frame_equal(aproximado['top'].drop(columns=['cota_inferior', 'error']), exacto.drop(columns=['cota_inferior', 'error']))
+    if aproximado['exacto_garantizado']:
+        assert list(aproximado['top'][key]) == list(exacto[key])
+    # El error informado acota la diferencia con el total exacto de cada clave del top
+    exactos = _exactos(archivos, kind)
+    diferencia = (aproximado['top'].set_index(key)['cantidad_vendida'] - exactos.reindex(aproximado['top'][key])).abs()
+    assert (diferencia <= aproximado['error_maximo'] + 1e-9).all()
+
+
+def test_top_is_exact_single_file(archivos):
+    resumen = sketches.build_file_sketches(archivos[0], 10**6)['articulos']
+    assert resumen.top_is_exact(10)
+    assert resumen.top_is_exact(len(resumen.superior) + 5)
+
+
+def test_json_round_trip(archivos):
+    resumenes = [sketches.build_file_sketches(df, 40)['clientes'] for df in archivos]
+    merged = sketches.TopKSketch.merge(resumenes)
+    for resumen in resumenes + [merged]:
+        copia = sketches.TopKSketch.from_dict(json.loads(json.dumps(resumen.to_dict())))
+        assert copia == resumen
+        pd.testing.assert_frame_equal(copia.top(15), resumen.top(15))
+
+
+@pytest.mark.parametrize("dim", sorted(sketches.REACH_DIMENSIONS))
+def test_reach_merge_is_the_union(archivos, dim):
+    todo = pd.concat(archivos, ignore_index=True)
+    unido = sketches.build_reach_sketches(todo)[dim]
+    merged = sketches.ReachSketch.merge(sketches.build_reach_sketches(df)[dim] for df in archivos)
+    # El máximo registro a registro es exactamente el HyperLogLog de la unión
+    assert list(merged.claves) == list(unido.claves)
+    assert np.array_equal(merged.registros, unido.registros)
+    # Combinar un resumen consigo mismo no cuenta dos veces a los clientes
+    solo = sketches.build_reach_sketches(archivos[0])[dim]
+    assert np.array_equal(sketches.ReachSketch.merge([solo, solo]).registros, solo.registros)
+
+
+@pytest.mark.parametrize("dim", sorted(sketches.REACH_DIMENSIONS))
+def test_reach_estimate_close_to_exact(archivos, dim):
+    columnas = sketches.REACH_DIMENSIONS[dim]
+    aproximado = sketches.approximate_reach([sketches.build_reach_sketches(df) for df in archivos], dim)
+    exacto = sketches.exact_reach(archivos, dim)
+    comparado = exacto.merge(aproximado, on=columnas, suffixes=('_exacto', '_aprox'), validate='one_to_one')
+    assert len(comparado) == len(exacto) == len(aproximado)
+    # Cuatro errores típicos (más uno por el redondeo) cubren holgadamente la dispersión del estimador
+    error = sketches.ReachSketch(sketches.DEFAULT_PRECISION, np.array([]), np.zeros((0, 1))).error_relativo
+    tolerancia = 4 * error * comparado['clientes_exacto'] + 1
+    assert ((comparado['clientes_aprox'] - comparado['clientes_exacto']).abs() <= tolerancia).all()
+    assert (comparado['margen_aprox'] >= 0).all()
@@ -0,0 +1,58 @@
+"""Resumen de categorías especiales: las filas con claves nulas cuentan en registros y unidades."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_sales
+from functions.typology_analysis import (
+    SPECIAL_CATEGORY_KEYS, _DETAIL_BY_CODE_ONLY, add_typology_column, get_special_categories_summary,
+)
+
+
+def _resumen_por_categoria(df: pd.DataFrame) -> dict:
+    # Referencia: una categoría por vez, como el resumen antes de la agrupación única
+    resumen = {}
+    for categoria, key in SPECIAL_CATEGORY_KEYS.items():
+        filas = df[df['categoria_especial'] == categoria]
+        keys = ['codigo_del_articulo'] if categoria in _DETAIL_BY_CODE_ONLY else ['codigo_del_articulo', 'descripcion_del_producto']
+        resumen[key] = {
+            'cantidad': len(filas),
+            'unidades': filas['cantidad_vendida'].sum() if not filas.empty else 0,
+            'detalle': filas.groupby(keys)['cantidad_vendida'].sum().reset_index(),
+        }
+    return resumen
+
+
+@pytest.fixture(scope="module")
+def ventas() -> pd.DataFrame:
+    df = add_typology_column(synthetic_sales(5000, clientes=200, articulos=300, seed=4))
+    rng = np.random.default_rng(9)
+    df.loc[rng.random(len(df)) < 0.2, 'descripcion_del_producto'] = np.nan
+    df.loc[rng.random(len(df)) < 0.02, 'codigo_del_articulo'] = np.nan
+    return df
+
+
+def test_summary_matches_per_category_reference(ventas):
+    resumen = get_special_categories_summary(ventas)
+    esperado = _resumen_por_categoria(ventas)
+    for key, categoria in esperado.items():
+        assert resumen[key]['cantidad'] == categoria['cantidad'], key
+        assert resumen[key]['unidades'] == pytest.approx(categoria['unidades']), key
+        pd.testing.assert_frame_equal(resumen[key]['detalle'], categoria['detalle'], check_dtype=False)
+
+
+def test_rows_without_description_count():
+    df = pd.DataFrame({
+        'codigo_del_articulo': ['CIERRE', 'CIERRE', 'CH10', 'CH10', 'ZX9', 'ZX9'],
+        'descripcion_del_producto': ['Cierre', np.nan, 'Chal', np.nan, np.nan, np.nan],
+        'cantidad_vendida': [1.0, 2.0, 3.0, 4.0, 5.0, 1.0],
+    })
+    df = add_typology_column(df)
+    resumen = get_special_categories_summary(df)
+    categorias = df.groupby('categoria_especial')['cantidad_vendida'].agg(['size', 'sum'])
+    for categoria, (registros, unidades) in categorias.iterrows():
+        if categoria == 'ventas_normales':
+            continue
+        key = SPECIAL_CATEGORY_KEYS.get(categoria, categoria)
+        assert resumen[key]['cantidad'] == registros
+        assert resumen[key]['unidades'] == unidades
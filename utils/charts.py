@@ -0,0 +1,160 @@
+# utils/charts.py
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from functions.result_cache import dataset_key, result_cache
+from utils.settings import get_setting
+from utils.tracing import span
+
+# Límites por defecto de lo que se manda al navegador (se pueden cambiar en la sección [charts])
+DEFAULT_MAX_SLICES = 12         # porciones de una torta, contando "Otros"
+DEFAULT_MAX_CATEGORIES = 30     # barras de un gráfico de barras
+DEFAULT_MAX_POINTS = 2000       # puntos por serie de un gráfico de líneas
+
+OTROS = "Otros"
+
+
+@dataclass
+class PreparedChart:
+    """Figura lista para mostrar, con lo que pesa y lo que costó armarla."""
+    figure: Any
+    json_bytes: int      # tamaño del JSON de Plotly que recibe el navegador
+    build_ms: float
+    filas: int           # filas de datos recibidas
+    puntos: int          # filas que quedaron en el gráfico
+
+    @property
+    def nbytes(self) -> int:
+        # Para el presupuesto de la cache de resultados
+        return self.json_bytes
+
+
+def _px():
+    # plotly.express se importa con el primer gráfico, no al arrancar la app
+    import plotly.express as px
+    return px
+
+
+def _limit(key: str, default: int) -> int:
+    return int(get_setting("charts", key, default))
+
+
+def collapse_tail(df: pd.DataFrame, names: str, values: str, max_slices: Optional[int] = None) -> pd.DataFrame:
+    """
+    Deja las max_slices - 1 categorías con más `values` y suma el resto en una fila "Otros".
+    Sin cola que agrupar devuelve el mismo DataFrame.
+    """
+    max_slices = max_slices or _limit("max_slices", DEFAULT_MAX_SLICES)
+    if len(df) <= max_slices:
+        return df
+    orden = df[values].to_numpy(dtype='float64', na_value=0).argsort(kind='stable')[::-1]
+    top = df.iloc[np.sort(orden[:max_slices - 1])][[names, values]]
+    resto = df[values].iloc[orden[max_slices - 1:]].sum()
+    otros = pd.DataFrame({names: [f"{OTROS} ({len(df) - len(top):,})"], values: [resto]})
+    return pd.concat([top.astype({names: object}), otros], ignore_index=True)
+
+
+def cap_categories(df: pd.DataFrame, y: str, max_categories: Optional[int] = None) -> pd.DataFrame:
+    """Las max_categories filas con mayor `y`, en el orden en que venían."""
+    max_categories = max_categories or _limit("max_categories", DEFAULT_MAX_CATEGORIES)
+    if len(df) <= max_categories:
+        return df
+    orden = df[y].to_numpy(dtype='float64', na_value=0).argsort(kind='stable')[::-1]
+    return df.iloc[np.sort(orden[:max_categories])]
+
+
+def downsample(df: pd.DataFrame, y: str, color: Optional[str] = None, max_points: Optional[int] = None) -> pd.DataFrame:
+    """
+    Reduce cada serie (una por valor de `color`) a unos max_points puntos. Por tramo se conservan
+    el mínimo y el máximo, así los picos no desaparecen del gráfico; el primer y el último punto siempre quedan.
+    """
+    max_points = max_points or _limit("max_points", DEFAULT_MAX_POINTS)
+    grupos = df.groupby(color, sort=False).indices.values() if color else [np.arange(len(df))]
+    posiciones = []
+    for filas in grupos:
+        if len(filas) <= max_points:
+            posiciones.append(filas)
+            continue
+        valores = df[y].to_numpy(dtype='float64', na_value=np.nan)[filas]
+        tramos = np.array_split(np.arange(len(filas)), max(1, max_points // 2))
+        elegidas = {0, len(filas) - 1}
+        for tramo in tramos:
+            v = valores[tramo]
+            if np.isnan(v).all():
+                continue
+            elegidas.update((tramo[np.nanargmin(v)], tramo[np.nanargmax(v)]))
+        posiciones.append(filas[sorted(elegidas)])
+    if sum(len(p) for p in posiciones) == len(df):
+        return df
+    return df.iloc[np.sort(np.concatenate(posiciones))]
+
+
+def chart_key(df: pd.DataFrame, *params: Any) -> Optional[tuple]:
+    """Clave de cache de un gráfico de ese dataset; None si el DataFrame no tiene huella (p. ej. filtrado)."""
+    return dataset_key(df, *params)
+
+
+def _prepare(tipo: str, key: Optional[tuple], filas: int, build: Callable[[], Any]) -> PreparedChart:
+    # Con clave (huella del dataset + parámetros) la figura armada se reutiliza desde la cache
+    with span("grafico", tipo=tipo, filas=filas) as registro:
+        if key is not None:
+            cached = result_cache.get(('charts',) + key)
+            if cached is not result_cache._MISSING:
+                if registro is not None:
+                    registro.atributos['cache'] = "hit"
+                return cached
+        start = time.perf_counter()
+        figure, puntos = build()
+        chart = PreparedChart(figure, len(figure.to_json()), (time.perf_counter() - start) * 1000, filas, puntos)
+        if key is not None:
+            result_cache.put(('charts',) + key, chart)
+        return chart
+
+
+def pie(df: pd.DataFrame, names: str, values: str, title: str, key: Optional[tuple] = None,
+        max_slices: Optional[int] = None) -> PreparedChart:
+    """Torta con la cola larga agrupada en "Otros"."""
+    def build():
+        data = collapse_tail(df, names, values, max_slices)
+        return _px().pie(data, names=names, values=values, title=title), len(data)
+    return _prepare('pie', None if key is None else ('pie', names, values, title, max_slices) + key, len(df), build)
+
+
+def bar(df: pd.DataFrame, x: str, y: str, title: str, key: Optional[tuple] = None,
+        max_categories: Optional[int] = None, tickangle: Optional[int] = None, **kwargs) -> PreparedChart:
+    """Barras limitadas a las categorías con mayor `y`."""
+    def build():
+        data = cap_categories(df, y, max_categories)
+        figure = _px().bar(data, x=x, y=y, title=title, **kwargs)
+        if tickangle is not None:
+            figure.update_xaxes(tickangle=tickangle)
+        return figure, len(data)
+    params = ('bar', x, y, title, max_categories, tickangle, tuple(sorted(kwargs.items())))
+    return _prepare('bar', None if key is None else params + key, len(df), build)
+
+
+def line(df: pd.DataFrame, x: str, y: str, title: str, color: Optional[str] = None, key: Optional[tuple] = None,
+         max_points: Optional[int] = None, **kwargs) -> PreparedChart:
+    """Líneas con cada serie reducida a max_points puntos."""
+    def build():
+        data = downsample(df, y, color, max_points)
+        return _px().line(data, x=x, y=y, color=color, title=title, **kwargs), len(data)
+    params = ('line', x, y, color, title, max_points, tuple(sorted(kwargs.items())))
+    return _prepare('line', None if key is None else params + key, len(df), build)
+
+
+def show(chart: PreparedChart, debug: bool = False) -> None:
+    """Muestra la figura; en modo debug informa el tamaño del JSON y los tiempos."""
+    start = time.perf_counter()
+    st.plotly_chart(chart.figure, use_container_width=True)
+    if debug:
+        render_ms = (time.perf_counter() - start) * 1000
+        st.caption(
+            f"Gráfico: {chart.json_bytes / 1024:,.1f} KB · {chart.puntos:,} de {chart.filas:,} filas · "
+            f"armado {chart.build_ms:.0f} ms · envío {render_ms:.0f} ms"
+        )
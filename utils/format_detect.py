@@ -65,6 +65,28 @@ def detect_from_filename(filename: str) -> str:
     return ""
 
 
+_MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7, "agosto": 8,
+    "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+}
+
+
+def month_from_filename(filename: str) -> str:
+    """Mes 'AAAA-MM' que indica el nombre del archivo (junio2025, 2025-06, 06_2025), o '' si no lo indica."""
+    name = _norm(filename)
+    m = re.search(r"(?<!\d)((?:19|20)\d{2})[-_ ]?(0[1-9]|1[0-2])(?!\d)", name)
+    if m:
+        return f"{m.group(1)}-{m.group(2)}"
+    m = re.search(r"(?<!\d)(0?[1-9]|1[0-2])[-_ ]((?:19|20)\d{2})(?!\d)", name)
+    if m:
+        return f"{m.group(2)}-{int(m.group(1)):02d}"
+    anio = re.search(r"(?<!\d)(?:19|20)\d{2}(?!\d)", name)
+    for palabra, numero in _MONTHS.items():
+        if palabra in name and anio:
+            return f"{anio.group(0)}-{numero:02d}"
+    return ""
+
+
 def detect_format_smart(df: pd.DataFrame, filename: str | None) -> str:
     """Combina heurística por nombre con detección por columnas."""
     by_name = detect_from_filename(filename or "")
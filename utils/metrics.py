@@ -0,0 +1,249 @@
+# utils/metrics.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.settings import get_setting
+
+# Límites (segundos) de los histogramas de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    tipo = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, recibió {tuple(labels)}")
+        return tuple((k, str(labels[k])) for k in self.labelnames)
+
+    def samples(self) -> List[Tuple[str, Labels, float]]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lineas = [f"# HELP {self.name} {_escape(self.help)}", f"# TYPE {self.name} {self.tipo}"]
+        lineas += [f"{nombre}{_format_labels(labels)} {_format_value(valor)}" for nombre, labels, valor in self.samples()]
+        return "\n".join(lineas)
+
+
+class Counter(_Metric):
+    """Contador que solo crece (llamadas, errores, filas)."""
+    tipo = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, valor) for key, valor in sorted(self._values.items())]
+
+
+class Histogram(_Metric):
+    """Distribución de duraciones en segundos, acumulada por tramos (buckets) como la espera Prometheus."""
+    tipo = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[Labels, list] = {}    # etiquetas -> [conteos por bucket, suma, cantidad]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            serie = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, limite in enumerate(self.buckets):
+                if value <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += value
+            serie[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observa lo que tarda el bloque (también si termina con una excepción)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            serie = self._values.get(self._key(labels))
+            return serie[2] if serie else 0
+
+    def samples(self):
+        filas = []
+        with self._lock:
+            for key, (conteos, suma, cantidad) in sorted(self._values.items()):
+                acumulado = 0
+                for limite, n in zip(self.buckets, conteos):
+                    acumulado += n
+                    filas.append((f"{self.name}_bucket", key + (("le", _format_value(limite)),), acumulado))
+                filas.append((f"{self.name}_sum", key, suma))
+                filas.append((f"{self.name}_count", key, cantidad))
+        return filas
+
+
+class Collected(_Metric):
+    """
+    Métrica que se lee recién al scrapear, desde una función que devuelve {etiquetas: valor}.
+    Sirve para exponer contadores y tamaños que ya llevan otros módulos (caches, registro de datasets).
+    """
+
+    def __init__(self, name: str, help: str, tipo: str, collect: Callable[[], Dict[Labels, float]]):
+        super().__init__(name, help)
+        self.tipo = tipo
+        self._collect = collect
+
+    def samples(self):
+        return [(self.name, key, valor) for key, valor in sorted(self._collect().items())]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Todas las métricas en el formato de texto de Prometheus."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STORAGE_SECONDS = REGISTRY.register(Histogram(
+    "recopilacion_storage_seconds", "Duración de las llamadas a Supabase", ["operacion"]))
+STORAGE_ERRORS = REGISTRY.register(Counter(
+    "recopilacion_storage_errors_total", "Llamadas a Supabase que fallaron", ["operacion"]))
+PARSE_SECONDS = REGISTRY.register(Histogram(
+    "recopilacion_parse_seconds", "Duración del parseo de un archivo por formato", ["formato"]))
+ROWS_PARSED = REGISTRY.register(Counter(
+    "recopilacion_rows_parsed_total", "Filas parseadas por formato", ["formato"]))
+
+
+def _cache_stats() -> Dict[str, dict]:
+    # Se importan al scrapear: así este módulo no depende de functions al importarse
+    from functions.dataset_registry import dataset_registry
+    from functions.result_cache import result_cache
+    return {'resultados': result_cache.stats(), 'datasets': dataset_registry.stats()}
+
+
+def _por_cache(campo: str) -> Callable[[], Dict[Labels, float]]:
+    return lambda: {(("cache", nombre),): stats[campo] for nombre, stats in _cache_stats().items()}
+
+
+REGISTRY.register(Collected("recopilacion_cache_hits_total", "Consultas a la cache resueltas sin recalcular", "counter", _por_cache('hits')))
+REGISTRY.register(Collected("recopilacion_cache_misses_total", "Consultas a la cache que hubo que calcular o cargar", "counter", _por_cache('misses')))
+REGISTRY.register(Collected("recopilacion_cache_evictions_total", "Entradas desalojadas por el presupuesto de memoria", "counter", _por_cache('evictions')))
+REGISTRY.register(Collected("recopilacion_cache_entries", "Entradas en la cache", "gauge", _por_cache('entradas')))
+REGISTRY.register(Collected("recopilacion_cache_bytes", "Bytes estimados retenidos por la cache (en 'datasets', los datasets residentes)", "gauge", _por_cache('bytes')))
+
+
+def _handler_class():
+    # http.server se importa recién al levantar el endpoint (no suma al arranque de la app)
+    from http.server import BaseHTTPRequestHandler
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            cuerpo = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(cuerpo)))
+            self.end_headers()
+            self.wfile.write(cuerpo)
+
+        def log_message(self, format, *args):
+            # Los scrapes periódicos no ensucian el log de la app
+            pass
+
+    return _Handler
+
+
+_server: Optional[Any] = None
+_server_lock = threading.Lock()
+
+
+def start_server(port: int, host: str = "127.0.0.1") -> int:
+    """
+    Sirve /metrics en un hilo de fondo (una vez por proceso) y devuelve el puerto donde quedó
+    escuchando (con port=0 lo elige el sistema).
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            from http.server import ThreadingHTTPServer
+            _server = ThreadingHTTPServer((host, port), _handler_class())
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server.server_address[1]
+
+
+def stop_server() -> None:
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.shutdown()
+            _server.server_close()
+            _server = None
+
+
+def maybe_start_server() -> Optional[int]:
+    """
+    Levanta el endpoint si el despliegue configuró metrics.port (p. ej. RECOPILACION_METRICS_PORT=9108).
+    Si el puerto está ocupado (otro proceso de la app) no lo levanta y devuelve None.
+    """
+    port = get_setting("metrics", "port", None)
+    if port in (None, ""):
+        return None
+    try:
+        return start_server(int(port), str(get_setting("metrics", "host", "127.0.0.1")))
+    except OSError:
+        return None
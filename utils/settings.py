@@ -0,0 +1,22 @@
+# utils/settings.py
+import os
+from typing import Any
+
+
+def get_setting(section: str, key: str, default: Any = None) -> Any:
+    """
+    Lee una opción de despliegue. Prioridad: variable de entorno RECOPILACION_<SECCION>_<CLAVE>,
+    luego st.secrets[seccion][clave], luego el valor por defecto.
+    """
+    env_name = f"RECOPILACION_{section}_{key}".upper()
+    if env_name in os.environ:
+        return os.environ[env_name]
+    try:
+        import streamlit as st
+        cfg = st.secrets.get(section, {})
+        value = cfg.get(key)
+        if value is not None:
+            return value
+    except Exception:
+        pass
+    return default
@@ -0,0 +1,123 @@
+# utils/tables.py
+import tempfile
+from typing import IO, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from functions.result_cache import result_cache
+from utils.settings import get_setting
+
+# Filas por página: lo único que se manda al navegador en cada rerun
+DEFAULT_PAGE_SIZE = 50
+# Filas por tramo al escribir el CSV de descarga
+CSV_CHUNK_ROWS = 100_000
+
+SIN_ORDEN = "(orden del análisis)"
+
+
+def _text_columns(df: pd.DataFrame) -> list:
+    return [
+        c for c in df.columns
+        if pd.api.types.is_object_dtype(df[c]) or pd.api.types.is_string_dtype(df[c])
+        or isinstance(df[c].dtype, pd.CategoricalDtype)
+    ]
+
+
+def search_mask(df: pd.DataFrame, query: str) -> np.ndarray:
+    """Filas donde alguna columna de texto contiene `query` (sin distinguir mayúsculas)."""
+    mask = np.zeros(len(df), dtype=bool)
+    for c in _text_columns(df):
+        mask |= df[c].astype(str).str.contains(query, case=False, regex=False, na=False).to_numpy(dtype=bool)
+    return mask
+
+
+def view_positions(df: pd.DataFrame, buscar: str = "", orden: Optional[str] = None, ascendente: bool = True,
+                   cache_key: Optional[tuple] = None) -> np.ndarray:
+    """
+    Posiciones de las filas que se ven con esa búsqueda y ese orden. Con `cache_key` (resultado de un
+    dataset con huella) se guardan en la cache de resultados: cambiar de página no vuelve a buscar ni ordenar.
+    """
+    buscar = buscar.strip()
+    key = None if cache_key is None else ('tables',) + cache_key + (buscar.lower(), orden, ascendente)
+    if key is not None:
+        cached = result_cache.get(key)
+        if cached is not result_cache._MISSING:
+            return cached
+
+    posiciones = np.flatnonzero(search_mask(df, buscar)) if buscar else np.arange(len(df))
+    if orden is not None and orden in df.columns:
+        valores = df[orden].iloc[posiciones].reset_index(drop=True)
+        posiciones = posiciones[valores.sort_values(ascending=ascendente, kind='stable', na_position='last').index.to_numpy()]
+    if key is not None:
+        result_cache.put(key, posiciones)
+    return posiciones
+
+
+def iter_csv(df: pd.DataFrame, chunk_rows: int = CSV_CHUNK_ROWS) -> Iterator[bytes]:
+    """CSV por tramos ya codificados (UTF-8 con BOM, para que Excel respete los acentos)."""
+    yield '\ufeff'.encode('utf-8')
+    for inicio in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[inicio:inicio + chunk_rows].to_csv(index=False, header=inicio == 0).encode('utf-8')
+
+
+def to_csv_file(df: pd.DataFrame, chunk_rows: int = CSV_CHUNK_ROWS) -> IO[bytes]:
+    """
+    CSV completo escrito tramo a tramo en un archivo temporal, listo para leer desde el principio.
+    En memoria solo hay un tramo por vez; el archivo se borra al cerrarlo.
+    """
+    # Sin buffer: es un io.RawIOBase, que download_button acepta (cada escritura ya es un tramo grande)
+    archivo = tempfile.TemporaryFile(buffering=0)
+    for tramo in iter_csv(df, chunk_rows):
+        archivo.write(tramo)
+    archivo.seek(0)
+    return archivo
+
+
+def paged_table(df: pd.DataFrame, key: str, cache_key: Optional[tuple] = None,
+                page_size: Optional[int] = None, file_name: str = "resultado.csv") -> None:
+    """
+    Tabla de resultados paginada: el resultado completo queda en el servidor y al navegador solo
+    llega la página visible. Búsqueda y orden se resuelven del lado del servidor, y la descarga
+    genera el CSV completo recién cuando se pide. Los resultados chicos se muestran enteros.
+    """
+    page_size = page_size or int(get_setting("tables", "page_size", DEFAULT_PAGE_SIZE))
+    if len(df) <= page_size:
+        st.dataframe(df)
+        return
+
+    col1, col2, col3 = st.columns([2, 2, 1])
+    with col1:
+        buscar = st.text_input("Buscar en la tabla", key=f"{key}_buscar", placeholder="Texto a buscar")
+    with col2:
+        orden = st.selectbox("Ordenar por", [SIN_ORDEN] + [str(c) for c in df.columns], key=f"{key}_orden")
+    with col3:
+        ascendente = st.radio("Sentido", ["Desc", "Asc"], key=f"{key}_sentido", horizontal=True) == "Asc"
+
+    columnas = {str(c): c for c in df.columns}
+    posiciones = view_positions(df, buscar, columnas.get(orden), ascendente, cache_key)
+    paginas = max(1, -(-len(posiciones) // page_size))
+    vista = (buscar.strip().lower(), orden, ascendente, len(df))
+    if st.session_state.get(f"{key}_vista") != vista or st.session_state.get(f"{key}_pagina", 1) > paginas:
+        # Otra búsqueda u otro orden: se vuelve a la primera página
+        st.session_state[f"{key}_pagina"] = 1
+        st.session_state[f"{key}_vista"] = vista
+    pagina = st.number_input("Página", min_value=1, max_value=paginas, step=1, key=f"{key}_pagina")
+
+    inicio = (int(pagina) - 1) * page_size
+    st.dataframe(df.iloc[posiciones[inicio:inicio + page_size]])
+    filtradas = f" (de {len(df):,} en total)" if len(posiciones) != len(df) else ""
+    st.caption(
+        f"Página {int(pagina):,} de {paginas:,} · filas {min(inicio + 1, len(posiciones)):,}–"
+        f"{min(inicio + page_size, len(posiciones)):,} de {len(posiciones):,}{filtradas}"
+    )
+    # El CSV se arma recién al hacer clic (no en cada rerun)
+    st.download_button(
+        "⬇️ Descargar resultado completo (CSV)",
+        data=lambda: to_csv_file(df.iloc[posiciones]),
+        file_name=file_name,
+        mime="text/csv",
+        key=f"{key}_descargar",
+        on_click="ignore",
+    )
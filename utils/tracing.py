@@ -0,0 +1,190 @@
+# utils/tracing.py
+import contextvars
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class Span:
+    """Una etapa medida: cuándo empezó (ms desde el inicio de la traza), cuánto tardó y cuánta memoria pidió."""
+    nombre: str
+    inicio_ms: float
+    profundidad: int
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    pico_bytes: Optional[int] = None      # None si la traza no mide memoria
+    atributos: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+
+class Trace:
+    """
+    Spans de un rerun de la app, en orden de inicio. Los spans anidados quedan con mayor
+    profundidad, así la lista se lee como una cascada (waterfall).
+    """
+
+    def __init__(self, nombre: str, memoria: bool = False):
+        self.nombre = nombre
+        self.memoria = memoria
+        self.spans: List[Span] = []
+        self.creada = time.time()
+        self._inicio = time.perf_counter()
+        self._abiertos: List[list] = []     # [span, pico absoluto visto, memoria al entrar]
+        self.total_ms: Optional[float] = None
+        if memoria:
+            _memoria_on()
+
+    def _cerrar(self) -> None:
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self._inicio) * 1000
+            if self.memoria:
+                _memoria_off()
+
+    def __del__(self):
+        # Un rerun cortado (st.stop, excepción) no llega a finish_trace: se libera tracemalloc igual
+        if self.memoria and self.total_ms is None:
+            _memoria_off()
+
+    def to_dict(self) -> dict:
+        return {
+            'nombre': self.nombre,
+            'creada': self.creada,
+            'total_ms': self.total_ms,
+            'memoria': self.memoria,
+            'spans': [asdict(s) for s in self.spans],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2, default=str)
+
+
+# Traza activa del hilo que corre el script (cada sesión de Streamlit corre en su propio hilo;
+# los hilos de fondo no heredan la traza y sus spans no se registran)
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+# tracemalloc es global al proceso: se prende mientras haya al menos una traza que mida memoria
+_memoria_lock = threading.Lock()
+_memoria_usuarios = 0
+_memoria_propia = False
+
+
+def _memoria_on() -> None:
+    global _memoria_usuarios, _memoria_propia
+    with _memoria_lock:
+        if _memoria_usuarios == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _memoria_propia = True
+        _memoria_usuarios += 1
+
+
+def _memoria_off() -> None:
+    global _memoria_usuarios, _memoria_propia
+    with _memoria_lock:
+        _memoria_usuarios = max(0, _memoria_usuarios - 1)
+        if _memoria_usuarios == 0 and _memoria_propia:
+            tracemalloc.stop()
+            _memoria_propia = False
+
+
+def start_trace(nombre: str = "rerun", memoria: bool = False) -> Trace:
+    """
+    Empieza una traza en el hilo actual; los span() que se abran hasta finish_trace() quedan en ella.
+    Con memoria=True se mide el pico de memoria de cada span con tracemalloc, que vuelve más lenta
+    la ejecución de todo el proceso mientras esté activo.
+    """
+    finish_trace()
+    trace = Trace(nombre, memoria)
+    _current.set(trace)
+    return trace
+
+
+def finish_trace() -> Optional[Trace]:
+    """Cierra la traza del hilo actual y la devuelve (None si no había)."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    _current.set(None)
+    trace._cerrar()
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(nombre: str, **atributos):
+    """
+    Mide el bloque como una etapa de la traza activa: tiempo de reloj, tiempo de CPU del hilo y,
+    si la traza mide memoria, el pico de memoria pedida por encima de la que había al entrar.
+    Sin traza activa no hace nada. Dentro del bloque, el span se puede completar con más atributos.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield None
+        return
+
+    medir_memoria = trace.memoria and tracemalloc.is_tracing()
+    if medir_memoria:
+        actual, pico = tracemalloc.get_traced_memory()
+        # El pico del span padre hasta acá se guarda antes de reiniciarlo
+        if trace._abiertos:
+            trace._abiertos[-1][1] = max(trace._abiertos[-1][1], pico)
+        tracemalloc.reset_peak()
+    else:
+        actual = 0
+    registro = Span(nombre, (time.perf_counter() - trace._inicio) * 1000, len(trace._abiertos), atributos=dict(atributos))
+    trace.spans.append(registro)
+    abierto = [registro, actual, actual]
+    trace._abiertos.append(abierto)
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield registro
+    except BaseException as e:
+        registro.error = type(e).__name__
+        raise
+    finally:
+        registro.wall_ms = (time.perf_counter() - wall) * 1000
+        registro.cpu_ms = (time.thread_time() - cpu) * 1000
+        trace._abiertos.pop()
+        if medir_memoria and tracemalloc.is_tracing():
+            pico = max(abierto[1], tracemalloc.get_traced_memory()[1])
+            registro.pico_bytes = max(0, pico - abierto[2])
+            if trace._abiertos:
+                trace._abiertos[-1][1] = max(trace._abiertos[-1][1], pico)
+
+
+def traced(nombre: Optional[str] = None) -> Callable:
+    """Decorador: cada llamada a la función es un span (con el nombre de la función por defecto)."""
+    def decorator(func: Callable) -> Callable:
+        etiqueta = nombre or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(etiqueta):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def waterfall(trace: Trace) -> List[dict]:
+    """Filas para mostrar la traza como cascada: etapa (sangrada por profundidad), inicio, duración, CPU y pico."""
+    filas = []
+    for s in trace.spans:
+        detalle = ", ".join(f"{k}={v}" for k, v in s.atributos.items())
+        filas.append({
+            'etapa': "  " * s.profundidad + s.nombre + (f" ({detalle})" if detalle else "") + (" ⚠" if s.error else ""),
+            'inicio_ms': round(s.inicio_ms, 1),
+            'duracion_ms': round(s.wall_ms, 1),
+            'cpu_ms': round(s.cpu_ms, 1),
+            'pico_mb': None if s.pico_bytes is None else round(s.pico_bytes / 2**20, 2),
+        })
+    return filas